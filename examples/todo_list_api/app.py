@@ -12,6 +12,7 @@ db = FlaskSQLAlchemyBooster()
 
 class Task(db.Model):
     _autogenerate_dict_struct_if_none_ = True
+    _fulltext_searchable_ = ['title']
 
     id = db.Column(db.Integer, primary_key=True, unique=True)
     created_on = db.Column(db.DateTime(), default=func.now())
@@ -57,7 +58,12 @@ def create_todolist_app():
 
     register_crud_routes_for_models(app, {
         Task: {
-            'url_slug': 'tasks'
+            'url_slug': 'tasks',
+            'views': {
+                'aggregate': {},
+                'stats': {},
+                'timeseries': {}
+            }
         },
         User: {
             'url_slug': 'users'
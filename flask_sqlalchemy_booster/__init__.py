@@ -8,9 +8,15 @@ from __future__ import absolute_import
 from .core import FlaskSQLAlchemyBooster, FlaskBooster
 from .model_booster import ModelBooster
 from .query_booster import QueryBooster
+from .batched_loading import BatchedLazyLoader
+from .cached_loading import CachedLazyLoader
 from .json_encoder import json_encoder
 from .json_columns import JSONEncodedStruct, MutableDict, MutableList
 from .schema_generators import generate_input_data_schema
+from .instrumentation import QueryStats, record_queries
+from .query_cache import InMemoryQueryCacheStore, set_query_cache_store
+from .loaders import loader
+from .deferred_processors import deferred
 from . import crud_api_view, responses
 from .crud_api_view import register_crud_routes_for_models
 from .interactive_shell import run_interactive_shell
\ No newline at end of file
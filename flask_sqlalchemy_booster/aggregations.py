@@ -0,0 +1,168 @@
+"""aggregations
+SQL side aggregation over the filtered rows of a model, served by the
+`aggregate` view of `register_crud_routes_for_models`.
+
+    GET /tasks/_aggregate?group=user_id&agg=count,max:created_on&orderby=count&sort=desc
+
+groups the tasks matching the request's filters by `user_id` in the
+database and returns one dict per group with the keys `user_id`, `count`
+and `max_created_on`. Aggregates are written as `fn` or `fn:column`, and
+both group keys and aggregated columns may be dotted relationship paths.
+Requests a rollup of the model (see `rollups`) can answer are served
+from its table.
+
+"""
+
+from __future__ import absolute_import
+from collections import OrderedDict
+
+from flask import request
+from sqlalchemy import func, distinct
+
+from .responses import (
+    as_json, filter_query_using_request, request_equality_filters,
+    return_joined_query_model_class_and_attr_name)
+from .rollups import matching_rollup
+
+# Query string params of the view, which are not filters
+AGGREGATE_PARAMS = ['group', 'agg']
+
+AGGREGATE_FUNCTIONS = {
+    'count': func.count,
+    'count_distinct': lambda col: func.count(distinct(col)),
+    'sum': func.sum,
+    'avg': func.avg,
+    'min': func.min,
+    'max': func.max
+}
+
+
+def aggregate_label(fn_name, key=None):
+    if key is None:
+        return fn_name
+    return "%s_%s" % (fn_name, key.replace('.', '_'))
+
+
+def parse_aggregate_specs(agg_string):
+    """Parses the `agg` query string parameter.
+
+    Examples:
+
+        >>> parse_aggregate_specs('count,max:created_on')
+        [('count', None), ('max', 'created_on')]
+
+    """
+    specs = []
+    for spec in (agg_string or 'count').split(','):
+        spec = spec.strip()
+        if not spec:
+            continue
+        fn_name, _, key = spec.partition(':')
+        if fn_name not in AGGREGATE_FUNCTIONS:
+            raise ValueError("UNKNOWN_AGGREGATE_FUNCTION: %s" % fn_name)
+        if fn_name != 'count' and not key:
+            raise ValueError("AGGREGATE_COLUMN_MISSING: %s" % fn_name)
+        specs.append((fn_name, key or None))
+    return specs
+
+
+def column_for_key(query, key):
+    """Returns the query joined as needed to reach the column named by the
+    (possibly dotted) `key`, along with the column attribute.
+    """
+    joined = return_joined_query_model_class_and_attr_name(query, key)
+    if len(joined) != 3 or joined[1] is None or \
+            joined[2] not in joined[1].column_keys():
+        raise ValueError("UNKNOWN_COLUMN: %s" % key)
+    query, model_class, attr_name = joined
+    return query, getattr(model_class, attr_name)
+
+
+def aggregate_query(query, group_keys, agg_specs):
+    """Turns `query` into one selecting the `group_keys` columns and the
+    aggregates in `agg_specs`, grouped by the former.
+
+    Returns:
+
+        tuple: The aggregate query and an ordered dict mapping each output
+            key to its labelled column expression
+    """
+    labelled = OrderedDict()
+    group_cols = []
+    for key in group_keys:
+        query, col = column_for_key(query, key)
+        group_cols.append(col)
+        labelled[key] = col.label(key)
+    for fn_name, key in agg_specs:
+        if key is None:
+            # Counting the primary key rather than `*` keeps the entity
+            # in the FROM clause once the query is reduced to aggregates
+            expr = func.count(query.model_class.primary_key())
+        else:
+            query, col = column_for_key(query, key)
+            expr = AGGREGATE_FUNCTIONS[fn_name](col)
+        label = aggregate_label(fn_name, key)
+        labelled[label] = expr.label(label)
+    query = query.order_by(None).with_entities(*list(labelled.values()))
+    if group_cols:
+        query = query.group_by(*group_cols)
+    return query, labelled
+
+
+def rollup_aggregate_query(rollup, group_keys, agg_specs, filters):
+    """Builds the equivalent of `aggregate_query` over the table of
+    `rollup`, with the request `filters` applied to it.
+    """
+    t = rollup.table
+    labelled = OrderedDict(
+        (key, t.c[key].label(key)) for key in group_keys)
+    for fn_name, key in agg_specs:
+        label = aggregate_label(fn_name, key)
+        labelled[label] = rollup.measure(fn_name, key).label(label)
+    query = rollup.model_class.session.query(
+        *list(labelled.values())).select_from(t).filter(
+        *rollup.filter_clauses(filters))
+    if group_keys:
+        query = query.group_by(*[t.c[key] for key in group_keys])
+    return query, labelled
+
+
+def process_args_and_render_aggregates(
+        q, default_group=None, default_agg=None, default_limit=None,
+        default_sort=None, default_orderby=None):
+    group_keys = [
+        k.strip() for k in (
+            request.args.get('group') or default_group or '').split(',')
+        if k.strip()]
+    agg_specs = parse_aggregate_specs(request.args.get('agg') or default_agg)
+    filters = request_equality_filters(args_to_skip=AGGREGATE_PARAMS)
+    rollup = matching_rollup(
+        q, group_keys, agg_specs, filters) if isinstance(q, type) else None
+    if rollup is not None:
+        query, labelled = rollup_aggregate_query(
+            rollup, group_keys, agg_specs, filters)
+    else:
+        query, labelled = aggregate_query(
+            filter_query_using_request(q, args_to_skip=AGGREGATE_PARAMS),
+            group_keys, agg_specs)
+
+    orderby = request.args.get('orderby') or default_orderby
+    sort = request.args.get('sort') or default_sort or 'asc'
+    if orderby:
+        if orderby not in labelled:
+            raise ValueError("UNKNOWN_ORDERBY: %s" % orderby)
+        order_col = labelled[orderby]
+        query = query.order_by(
+            order_col.desc() if sort == 'desc' else order_col.asc())
+    elif group_keys:
+        query = query.order_by(*[labelled[k] for k in group_keys])
+
+    limit = request.args.get('limit') or default_limit
+    offset = request.args.get('offset')
+    if limit:
+        query = query.limit(int(limit))
+    if offset:
+        query = query.offset(int(offset) - 1)
+
+    return as_json([
+        OrderedDict(zip(labelled.keys(), row)) for row in query.all()])
@@ -0,0 +1,184 @@
+"""aio
+Awaitable counterparts of the `QueryableMixin` operations and of the CRUD
+view constructors, for use from asyncio code and Flask's async views.
+
+    >>> from flask_sqlalchemy_booster.aio import AsyncModelOperations
+    >>> tasks = AsyncModelOperations(Task)
+    >>> task = await tasks.get(1)
+    >>> swims = await tasks.all(title="Swim")
+
+SQLAlchemy 1.3 has no asyncio engine, so the calls run the regular
+synchronous code on a bounded thread pool (`AsyncExecutor`), each inside
+its own app context and hence its own scoped session. The event loop is
+free while the queries run, so one worker process can keep as many DB
+calls in flight as the pool has threads
+(`SQLALCHEMY_BOOSTER_ASYNC_MAX_WORKERS`).
+
+Instances are returned as detached snapshots (see `snapshots`) with their
+columns loaded. Merge them into a session before touching relationships.
+
+This module requires Python 3 and is not imported by the package itself.
+
+"""
+
+from __future__ import absolute_import
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+
+from flask import current_app, copy_current_request_context
+from sqlalchemy.orm.attributes import instance_state
+
+from .snapshots import is_instance, snapshot_row
+from . import crud_api_view
+
+ASYNC_MAX_WORKERS = 32
+
+EXTENSION_KEY = 'sqlalchemy_booster_async'
+
+
+def _loaded_snapshot(value):
+    if is_instance(value):
+        state = instance_state(value)
+        if state.expired_attributes and state.session is not None:
+            # A single SELECT loads back every expired column, eg. after
+            # the commit in `create`
+            getattr(value, state.mapper.primary_key[0].key)
+        return snapshot_row(value)
+    if isinstance(value, list):
+        return [_loaded_snapshot(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_loaded_snapshot(v) for v in value)
+    return value
+
+
+class AsyncExecutor(object):
+
+    """Runs callables on a thread pool within an app context of `app`.
+
+    Args:
+
+        app (Flask): The application whose config and session are used
+
+        max_workers (int, optional): Size of the pool, defaults to the
+            `SQLALCHEMY_BOOSTER_ASYNC_MAX_WORKERS` config value
+    """
+
+    def __init__(self, app, max_workers=None):
+        self.app = app
+        self.max_workers = max_workers or app.config.get(
+            'SQLALCHEMY_BOOSTER_ASYNC_MAX_WORKERS', ASYNC_MAX_WORKERS)
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def _call_in_app_context(self, fn, args, kwargs):
+        with self.app.app_context():
+            return _loaded_snapshot(fn(*args, **kwargs))
+
+    def run(self, fn, *args, **kwargs):
+        """Returns an awaitable resolving to the result of `fn`, with ORM
+        instances in it converted to detached snapshots. To be called from
+        a coroutine, on the running event loop.
+        """
+        return asyncio.get_running_loop().run_in_executor(
+            self.pool, self._call_in_app_context, fn, args, kwargs)
+
+    def run_in_request_context(self, fn, *args, **kwargs):
+        """Like `run` but with a copy of the current request context pushed
+        on the worker, so that `fn` can read `request` and `g`.
+        """
+        return asyncio.get_running_loop().run_in_executor(
+            self.pool, functools.partial(
+                copy_current_request_context(fn), *args, **kwargs))
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
+
+
+def executor_for_app(app=None):
+    """Returns the `AsyncExecutor` of `app` (the current app by default),
+    creating it on first use.
+    """
+    if app is None:
+        app = current_app._get_current_object()
+    if EXTENSION_KEY not in app.extensions:
+        app.extensions[EXTENSION_KEY] = AsyncExecutor(app)
+    return app.extensions[EXTENSION_KEY]
+
+
+class AsyncModelOperations(object):
+
+    """Awaitable versions of the query and persistence classmethods of
+    `model_class`. Every method returns an awaitable and takes the same
+    arguments as its `QueryableMixin` counterpart.
+    """
+
+    # QueryableMixin classmethods exposed as they are
+    METHODS = [
+        'get', 'get_all', 'all', 'first', 'last', 'one', 'count',
+        'create', 'create_all', 'find_or_create', 'find_or_create_all',
+        'update_or_create', 'update_or_create_all', 'update_all',
+        'get_and_update']
+
+    def __init__(self, model_class, executor=None):
+        self.model_class = model_class
+        self._executor = executor
+
+    @property
+    def executor(self):
+        return self._executor or executor_for_app()
+
+    def __getattr__(self, name):
+        if name not in self.METHODS:
+            raise AttributeError(name)
+        method = getattr(self.model_class, name)
+
+        @functools.wraps(method)
+        def awaitable_method(*args, **kwargs):
+            return self.executor.run(method, *args, **kwargs)
+        return awaitable_method
+
+    def delete(self, keyval, key='id'):
+        model_class = self.model_class
+
+        def delete_instance():
+            instance = model_class.get(keyval, key=key)
+            if instance is not None:
+                instance.delete()
+            return instance is not None
+        return self.executor.run(delete_instance)
+
+
+def async_view(view_func, executor=None):
+    """Wraps a synchronous view so that it runs on the executor's pool with
+    the request context of the awaiting request. The returned coroutine
+    function can be routed as an async view on Flask 2.
+    """
+    @functools.wraps(view_func)
+    async def view(*args, **kwargs):
+        return await (executor or executor_for_app()).run_in_request_context(
+            view_func, *args, **kwargs)
+    return view
+
+
+def _async_view_constructor(constructor):
+    @functools.wraps(constructor)
+    def construct(*args, **kwargs):
+        executor = kwargs.pop('executor', None)
+        return async_view(constructor(*args, **kwargs), executor=executor)
+    return construct
+
+
+construct_async_index_view_function = _async_view_constructor(
+    crud_api_view.construct_index_view_function)
+construct_async_aggregate_view_function = _async_view_constructor(
+    crud_api_view.construct_aggregate_view_function)
+construct_async_get_view_function = _async_view_constructor(
+    crud_api_view.construct_get_view_function)
+construct_async_post_view_function = _async_view_constructor(
+    crud_api_view.construct_post_view_function)
+construct_async_put_view_function = _async_view_constructor(
+    crud_api_view.construct_put_view_function)
+construct_async_patch_view_function = _async_view_constructor(
+    crud_api_view.construct_patch_view_function)
+construct_async_delete_view_function = _async_view_constructor(
+    crud_api_view.construct_delete_view_function)
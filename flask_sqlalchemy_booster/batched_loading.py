@@ -0,0 +1,155 @@
+"""batched_loading
+The `batched` relationship loader strategy.
+
+    class Task(db.Model):
+        user = db.relationship("User", lazy="batched")
+
+A `batched` relationship is loaded lazily, like the default `select`
+strategy, but the first access on any instance loads it for every
+instance which came out of the same query result with a single `IN`
+query. Code iterating over a result list and touching the relationship
+(dict post processors, properties, `_ret` traversals) hence issues one
+query per relationship instead of one per instance, without having to
+know the access pattern up front.
+
+Relationships joined on a single column pair, directly or through a
+secondary table, are batched. Others, and loads from instances outside a
+query result (new or merged instances, or ones with the foreign key not
+loaded), fall back to the plain lazy load.
+
+"""
+
+from __future__ import absolute_import
+from collections import defaultdict
+import weakref
+
+from sqlalchemy.orm import attributes
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.relationships import RelationshipProperty
+from sqlalchemy.orm.session import _state_session
+from sqlalchemy.orm.strategies import LazyLoader
+from sqlalchemy.orm.util import _none_set
+
+from .utils import expanding_in_clause
+
+
+class _ResultSiblings(object):
+
+    """The states loaded by one query result, held weakly."""
+
+    def __init__(self):
+        self.state_refs = []
+
+    def add(self, state):
+        self.state_refs.append(weakref.ref(state))
+
+    def states(self):
+        return [s for s in (ref() for ref in self.state_refs) if s is not None]
+
+
+# State to the `_ResultSiblings` of the result which loaded it
+_siblings_of_state = weakref.WeakKeyDictionary()
+
+
+@RelationshipProperty.strategy_for(lazy="batched")
+class BatchedLazyLoader(LazyLoader):
+
+    def create_row_processor(
+            self, context, path, loadopt, mapper, result, adapter, populators):
+        super(BatchedLazyLoader, self).create_row_processor(
+            context, path, loadopt, mapper, result, adapter, populators)
+        siblings_key = ('booster_batched_siblings', path.path)
+        if siblings_key not in context.attributes:
+            siblings = context.attributes[siblings_key] = _ResultSiblings()
+        else:
+            siblings = context.attributes[siblings_key]
+
+        def add_sibling(state, dict_, row):
+            if _siblings_of_state.get(state) is not siblings:
+                _siblings_of_state[state] = siblings
+                siblings.add(state)
+
+        populators["new"].append((self.key, add_sibling))
+
+    def _column_pair(self):
+        prop = self.parent_property
+        if prop.secondary is not None:
+            if len(prop.synchronize_pairs) != 1 or \
+                    len(prop.secondary_synchronize_pairs) != 1:
+                return None
+            return prop.synchronize_pairs[0]
+        if len(prop.local_remote_pairs) != 1:
+            return None
+        return prop.local_remote_pairs[0]
+
+    def _local_value(self, state, local_col):
+        return state.mapper._get_state_attr_by_column(
+            state, state.dict, local_col, passive=attributes.PASSIVE_NO_FETCH)
+
+    def _batch(self, state):
+        """Returns the sibling states still to be loaded, with the value of
+        the local column of each, or None to load just `state`.
+        """
+        siblings = _siblings_of_state.get(state)
+        pair = self._column_pair()
+        if siblings is None or pair is None:
+            return None
+        local_col = pair[0]
+        batch = []
+        for sibling in siblings.states():
+            if sibling.session_id != state.session_id or sibling.key is None \
+                    or self.key in sibling.dict or \
+                    not sibling.mapper.isa(self.parent):
+                continue
+            value = self._local_value(sibling, local_col)
+            if value in _none_set:
+                if sibling is state:
+                    return None
+                continue
+            batch.append((sibling, value))
+        if len(batch) < 2 or state not in [s for s, _ in batch]:
+            return None
+        return batch
+
+    def _load_batch(self, session, batch):
+        prop = self.parent_property
+        local_col, remote_col = self._column_pair()
+        values = list(set(value for _, value in batch))
+        if prop.secondary is not None:
+            query = session.query(self.entity, remote_col).join(
+                prop.secondary, prop.secondaryjoin).filter(
+                expanding_in_clause(remote_col, values, session=session))
+            rows = query.order_by(*(prop.order_by or [])).all()
+        else:
+            remote_attr = self.mapper._columntoproperty[remote_col].key
+            query = session.query(self.entity).filter(expanding_in_clause(
+                getattr(self.entity.class_, remote_attr), values,
+                session=session))
+            rows = [(obj, getattr(obj, remote_attr))
+                    for obj in query.order_by(*(prop.order_by or [])).all()]
+        related = defaultdict(list)
+        for obj, value in rows:
+            related[value].append(obj)
+        for sibling, value in batch:
+            objs = related.get(value, [])
+            sibling_obj = sibling.obj()
+            if sibling_obj is None:
+                continue
+            if self.uselist:
+                set_committed_value(sibling_obj, self.key, objs)
+            else:
+                set_committed_value(
+                    sibling_obj, self.key, objs[0] if objs else None)
+
+    def _load_for_state(self, state, passive):
+        if state.key is None or not passive & attributes.SQL_OK or \
+                self._raise_always:
+            return super(BatchedLazyLoader, self)._load_for_state(
+                state, passive)
+        session = _state_session(state)
+        batch = self._batch(state) if session is not None else None
+        if batch is None:
+            return super(BatchedLazyLoader, self)._load_for_state(
+                state, passive)
+        self._load_batch(session, batch)
+        return attributes.ATTR_WAS_SET
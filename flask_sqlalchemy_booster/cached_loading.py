@@ -0,0 +1,81 @@
+"""cached_loading
+The lazy loader of many-to-one relationships targeting models kept in
+memory, fully (`_cache_fully_`, see `full_table_cache`) or per instance
+(`_entity_cache_ttl_`, see `entity_cache`).
+
+Such relationships, when left to the default `select` strategy, are
+switched to `CachedLazyLoader` just before their mappers get configured.
+Once the identity map has been checked, it looks the target up in the
+caches before selecting it. Loads it can't serve, to-many ones included,
+are left to the plain lazy loader.
+
+"""
+
+from __future__ import absolute_import
+
+import six
+from sqlalchemy import event
+from sqlalchemy.orm.base import _none_set
+from sqlalchemy.orm.mapper import Mapper, _mapper_registry
+from sqlalchemy.orm.relationships import RelationshipProperty
+from sqlalchemy.orm.strategies import LazyLoader
+
+from .entity_cache import cached_entity, is_entity_cached, remember_entity
+from .full_table_cache import cached_identity_lookup
+
+CACHED_LAZY_KEY = 'cached'
+
+
+def is_cached_model(model_class):
+    return bool(getattr(model_class, '_cache_fully_', False)) or \
+        is_entity_cached(model_class)
+
+
+@RelationshipProperty.strategy_for(lazy=CACHED_LAZY_KEY)
+class CachedLazyLoader(LazyLoader):
+
+    def _emit_lazyload(self, session, state, primary_key_identity, passive):
+        if primary_key_identity is None or \
+                _none_set.intersection(primary_key_identity):
+            return super(CachedLazyLoader, self)._emit_lazyload(
+                session, state, primary_key_identity, passive)
+        target_class = self.mapper.class_
+        instance = cached_identity_lookup(
+            target_class, session, primary_key_identity)
+        if instance is None and is_entity_cached(target_class):
+            instance = cached_entity(
+                target_class, session, primary_key_identity)
+        if instance is not None:
+            return instance
+        instance = super(CachedLazyLoader, self)._emit_lazyload(
+            session, state, primary_key_identity, passive)
+        if isinstance(instance, target_class):
+            remember_entity(session, instance)
+        return instance
+
+
+def _relationship_target(prop):
+    target = prop.argument
+    if isinstance(target, six.string_types):
+        registry = getattr(prop.parent.class_, '_decl_class_registry', {})
+        target = registry.get(target)
+    elif callable(target) and not isinstance(target, type):
+        try:
+            target = target()
+        except Exception:
+            return None
+    if hasattr(target, 'class_'):
+        target = target.class_
+    return target if isinstance(target, type) else None
+
+
+@event.listens_for(Mapper, 'before_configured')
+def _use_cached_lazy_loader():
+    for mapper in list(_mapper_registry):
+        if mapper.configured:
+            continue
+        for prop in mapper._props.values():
+            if isinstance(prop, RelationshipProperty) and \
+                    prop.strategy_key == (('lazy', 'select'), ) and \
+                    is_cached_model(_relationship_target(prop)):
+                prop.strategy_key = (('lazy', CACHED_LAZY_KEY), )
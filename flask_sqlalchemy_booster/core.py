@@ -6,6 +6,13 @@ from sqlalchemy.ext.declarative import declarative_base
 from .model_booster import ModelBooster
 from .query_booster import QueryBooster
 from .flask_client_booster import FlaskClientBooster
+from . import instrumentation
+from .slow_query_log import slow_query_log_from_config
+from . import query_cache
+from .index_advisor import init_index_advisor
+from .rollups import init_rollups
+from .serialization_profiler import init_serialization_profiler
+from .tracing import init_tracing, traced
 import bleach
 from werkzeug.datastructures import MultiDict
 from decimal import Decimal
@@ -58,6 +65,69 @@ class FlaskSQLAlchemyBooster(SQLAlchemy):
         super(FlaskSQLAlchemyBooster, self).__init__(*args, **kwargs)
         # self.Query = QueryBooster
 
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_BOOSTER_RECORD_QUERIES', None)
+        app.config.setdefault(
+            'SQLALCHEMY_BOOSTER_N_PLUS_ONE_THRESHOLD',
+            instrumentation.N_PLUS_ONE_THRESHOLD)
+        super(FlaskSQLAlchemyBooster, self).init_app(app)
+        if app.config.get('SQLALCHEMY_BOOSTER_QUERY_CACHE_STORE') is not None:
+            query_cache.set_query_cache_store(
+                app.config['SQLALCHEMY_BOOSTER_QUERY_CACHE_STORE'])
+
+        def start_recording_queries():
+            record = app.config['SQLALCHEMY_BOOSTER_RECORD_QUERIES']
+            if record is None:
+                record = app.debug
+            if record:
+                instrumentation.start_request_query_stats(
+                    app.config['SQLALCHEMY_BOOSTER_N_PLUS_ONE_THRESHOLD'])
+
+        def report_recorded_queries(response):
+            stats = instrumentation.get_request_query_stats()
+            if stats is not None and app.debug:
+                for fingerprint, count in stats.n_plus_one_suspects():
+                    app.logger.warning(
+                        "Possible N+1 on %s: %s executions of %s",
+                        request.endpoint, count, fingerprint)
+                instrumentation.add_query_stats_headers(response, stats)
+            return response
+
+        app.before_request(start_recording_queries)
+        app.after_request(report_recorded_queries)
+        init_index_advisor(app, lambda: self.get_engine(app))
+        init_rollups(app)
+        init_serialization_profiler(app)
+        init_tracing(app)
+
+    def get_engine(self, app=None, bind=None):
+        engine = super(FlaskSQLAlchemyBooster, self).get_engine(
+            app=app, bind=bind)
+        if not getattr(engine, '_booster_instrumented', False):
+            instrumentation.instrument_engine(engine)
+            slow_query_log = slow_query_log_from_config(self.get_app(app))
+            if slow_query_log is not None:
+                instrumentation.add_statement_observer(engine, slow_query_log)
+        return engine
+
+    def get_query_stats(self):
+        """Returns the `QueryStats` recorded for the current request"""
+        return instrumentation.get_request_query_stats()
+
+    def record_queries(self, n_plus_one_threshold=None):
+        """Context manager recording all statements executed within it.
+
+        Examples:
+
+            >>> with db.record_queries() as stats:
+            ...     client.get('/tasks?expand=user')
+            >>> stats.n_plus_one_suspects()
+            []
+
+        """
+        return instrumentation.record_queries(
+            n_plus_one_threshold=n_plus_one_threshold)
+
     def make_declarative_base(self, model, metadata=None):
         base = super(FlaskSQLAlchemyBooster, self).make_declarative_base(
             model, metadata)
@@ -117,6 +187,9 @@ class FlaskBooster(Flask):
 
         super(FlaskBooster, self).__init__(*args, **kwargs)
 
-        self.before_request_funcs.setdefault(None, []).append(json_sanitizer)
-        self.before_request_funcs.setdefault(None, []).append(args_sanitizer)
-        self.before_request_funcs.setdefault(None, []).append(form_sanitizer)
+        self.before_request_funcs.setdefault(None, []).append(
+            traced('sanitize', json_sanitizer, input='json'))
+        self.before_request_funcs.setdefault(None, []).append(
+            traced('sanitize', args_sanitizer, input='args'))
+        self.before_request_funcs.setdefault(None, []).append(
+            traced('sanitize', form_sanitizer, input='form'))
@@ -0,0 +1,238 @@
+"""cost_governor
+Scores index requests before they reach the database and enforces per
+view budgets on them.
+
+A budget is given as `cost_budget` in the `index` dict of a model (or in
+the model dict itself) when registering CRUD routes:
+
+    'tasks': {
+        'model_class': Task,
+        'index': {
+            'cost_budget': {
+                'max_cost': 5000,
+                'max_dict_struct_depth': 2,
+                'on_exceed': 'paginate'
+            }
+        }
+    }
+
+The cost of a request is
+
+    joins * join + filter_nodes * filter_node +
+        rows * (row + rels * rel + attrs * attr)
+
+where `rels`, `attrs` and the depth come from the dict struct the rows are
+serialized with (the view's merged with `_ds`, with the `attrs`, `rels`
+and `expand` params folded in), `joins` is the number of distinct
+relationship paths named by dotted filter and sort keys, `filter_nodes`
+counts the nodes of the `_f` tree and the plain filter arguments, and
+`rows` is the requested page size or limit - `unbounded_rows` when the
+request asks for neither. The weights default to `COST_WEIGHTS` and can
+be overridden with a `weights` dict in the budget.
+
+Requests above any of the `max_*` limits are rejected with a 400
+`REQUEST_COST_EXCEEDED` response, except that with `on_exceed` set to
+`paginate` a request which is over `max_cost` or `max_rows` only because
+of its row count is served paginated, with the largest page size the
+budget allows.
+
+"""
+
+from __future__ import absolute_import
+
+from flask import request
+from flask.json import _json
+from sqlalchemy.orm import class_mapper
+from toolspy import merge, all_subclasses
+import six
+
+from .full_text_search import FULL_TEXT_SEARCH_KEY
+from .responses import (
+    as_json, params_for_serialization, dict_struct_with_serialization_params,
+    _request_filter_keys, _arg_filter_key, RESTRICTED, PER_PAGE_ITEMS_COUNT)
+
+COST_WEIGHTS = {
+    'join': 50,
+    'filter_node': 5,
+    'row': 1,
+    'rel': 2,
+    'attr': 0.1
+}
+
+UNBOUNDED_ROWS = 1000
+
+REJECT = 'reject'
+PAGINATE = 'paginate'
+
+
+def dict_struct_shape(dict_struct):
+    """Returns the number of attrs, the number of rels and the rel nesting
+    depth of a dict struct.
+    """
+    attrs, rels, depth = 0, 0, 0
+    pending = [(dict_struct or {}, 0)]
+    while pending:
+        struct, level = pending.pop()
+        attrs += len(struct.get('attrs') or [])
+        depth = max(depth, level)
+        for rel_struct in (struct.get('rels') or {}).values():
+            rels += 1
+            pending.append((rel_struct or {}, level + 1))
+    return attrs, rels, depth
+
+
+def is_filter_key(model_class, key):
+    """Whether filtering `model_class` on `key` narrows the query down.
+    Keys naming nothing on the model (or its subclasses) are ignored by
+    the filtering.
+    """
+    if key == FULL_TEXT_SEARCH_KEY:
+        return True
+    name = key.split('.')[0]
+    if name in class_mapper(model_class).all_orm_descriptors.keys():
+        return True
+    return any(
+        name in subcls.column_keys() for subcls in all_subclasses(model_class))
+
+
+def filter_node_count(model_class=None):
+    """Counts the nodes of the request's `_f` tree plus its plain query
+    string filters, those `model_class` has a key for when it is given.
+    """
+    if model_class is None:
+        count = len([kw for kw in request.args
+                     if kw not in RESTRICTED and not kw.startswith('_')])
+    else:
+        count = len([kw for kw in request.args
+                     if kw not in RESTRICTED and
+                     is_filter_key(model_class, _arg_filter_key(kw))])
+    if '_f' in request.args:
+        filters = _json.loads(request.args['_f'])
+        if isinstance(filters, six.string_types):
+            filters = _json.loads(filters)
+        pending = [filters]
+        while pending:
+            f = pending.pop()
+            count += 1
+            pending.extend(f.get('f') or [])
+    return count
+
+
+def join_count():
+    """Counts the distinct relationship paths the filter and sort keys of
+    the request join through.
+    """
+    paths = set()
+    for key in _request_filter_keys():
+        rels = key.split('.')[:-1]
+        for i in range(len(rels)):
+            paths.add(tuple(rels[:i + 1]))
+    return len(paths)
+
+
+def requested_rows(default_limit=None, default_page=None,
+                   default_per_page=None, unbounded_rows=UNBOUNDED_ROWS):
+    """Returns the number of rows the request asks for and whether it is
+    paginated, mirroring `fetch_results_in_requested_format`.
+    """
+    if request.args.get('page') or default_page:
+        return int(request.args.get('per_page') or default_per_page or
+                   PER_PAGE_ITEMS_COUNT), True
+    limit = request.args.get('limit', default_limit)
+    if limit:
+        return int(limit), False
+    return unbounded_rows, False
+
+
+def request_cost(budget=None, dict_struct=None, default_limit=None,
+                 default_page=None, default_per_page=None, model_class=None):
+    """Scores the current request.
+
+    Returns:
+
+        dict: The `cost` along with the measures it was computed from and
+            the fixed and per row parts of it
+    """
+    budget = budget or {}
+    weights = merge(COST_WEIGHTS, budget.get('weights') or {})
+    params = params_for_serialization(dict_struct=dict_struct)
+    dict_struct = dict_struct_with_serialization_params(
+        params.get('dict_struct'),
+        attrs_to_serialize=params.get('attrs_to_serialize'),
+        rels_to_expand=params.get('rels_to_expand'),
+        rels_to_serialize=params.get('rels_to_serialize'))
+    attrs, rels, depth = dict_struct_shape(dict_struct)
+    rows, paginated = requested_rows(
+        default_limit=default_limit, default_page=default_page,
+        default_per_page=default_per_page,
+        unbounded_rows=budget.get('unbounded_rows', UNBOUNDED_ROWS))
+    joins = join_count()
+    filter_nodes = filter_node_count(model_class)
+    fixed_cost = joins * weights['join'] + filter_nodes * weights['filter_node']
+    row_cost = weights['row'] + rels * weights['rel'] + attrs * weights['attr']
+    return {
+        'cost': fixed_cost + rows * row_cost,
+        'fixed_cost': fixed_cost,
+        'row_cost': row_cost,
+        'rows': rows,
+        'paginated': paginated,
+        'joins': joins,
+        'filter_nodes': filter_nodes,
+        'dict_struct_attrs': attrs,
+        'dict_struct_rels': rels,
+        'dict_struct_depth': depth
+    }
+
+
+def exceeded_limits(budget, cost):
+    limits = [
+        ('max_cost', 'cost'), ('max_rows', 'rows'), ('max_joins', 'joins'),
+        ('max_filter_nodes', 'filter_nodes'),
+        ('max_dict_struct_depth', 'dict_struct_depth'),
+        ('max_dict_struct_rels', 'dict_struct_rels')]
+    return [limit for limit, measure in limits
+            if budget.get(limit) is not None and cost[measure] > budget[limit]]
+
+
+def affordable_page_size(budget, cost):
+    """Returns the largest page size within `max_cost` and `max_rows`,
+    or None if not even a single row is.
+    """
+    rows = cost['rows']
+    if budget.get('max_rows') is not None:
+        rows = min(rows, budget['max_rows'])
+    if budget.get('max_cost') is not None:
+        rows = min(rows, int(
+            (budget['max_cost'] - cost['fixed_cost']) // cost['row_cost']))
+    return rows if rows >= 1 else None
+
+
+def govern_request_cost(budget, dict_struct=None, default_limit=None,
+                        default_page=None, default_per_page=None,
+                        model_class=None):
+    """Checks the current request against `budget`.
+
+    Returns:
+
+        tuple: A rejection response or None, and a dict of pagination
+            overrides (`default_page`, `max_per_page`) to fetch the rows
+            with, empty unless the request was degraded
+    """
+    cost = request_cost(
+        budget, dict_struct=dict_struct, default_limit=default_limit,
+        default_page=default_page, default_per_page=default_per_page,
+        model_class=model_class)
+    exceeded = exceeded_limits(budget, cost)
+    if not exceeded:
+        return None, {}
+    if budget.get('on_exceed', REJECT) == PAGINATE and \
+            set(exceeded) <= set(['max_cost', 'max_rows']):
+        per_page = affordable_page_size(budget, cost)
+        if per_page is not None:
+            return None, {'default_page': 1, 'max_per_page': per_page}
+    return as_json({
+        "status": "failure",
+        "error": "REQUEST_COST_EXCEEDED",
+        "exceeded": exceeded,
+        "cost": cost
+    }, status=400, wrap=False), {}
@@ -12,6 +12,7 @@ import six.moves.urllib.request, six.moves.urllib.parse, six.moves.urllib.error
 import functools
 import csv
 import traceback
+import six
 
 from .responses import (
     as_dict, get_request_json, get_request_args,
@@ -22,6 +23,12 @@ from .responses import (
     _serializable_params, serializable_obj, as_json,
     process_args_and_fetch_rows, convert_result_to_response)
 
+from .aggregations import process_args_and_render_aggregates
+from .statistics import process_args_and_render_stats
+from .timeseries import process_args_and_render_timeseries
+from .cost_governor import govern_request_cost
+from .loaders import loader, expect_related_keys, prime_loaders
+from .deferred_processors import run_post_processor
 from .utils import remove_empty_values_in_dict, save_file_from_request, convert_to_proper_types
 
 from werkzeug.exceptions import Unauthorized
@@ -142,13 +149,22 @@ def construct_index_view_function(
         custom_response_creator=None,
         cache_timeout=None, exception_handler=None, access_checker=None,
         default_limit=None, default_sort=None, default_orderby=None,
-        default_offset=None, default_page=None, default_per_page=None):
+        default_offset=None, default_page=None, default_per_page=None,
+        layout=None, cost_budget=None):
     def index():
         try:
             if callable(access_checker):
                 allowed, message = access_checker()
                 if not allowed:
                     return error_json(401, message)
+            pagination_overrides = {}
+            if cost_budget:
+                rejection, pagination_overrides = govern_request_cost(
+                    cost_budget, dict_struct=dict_struct,
+                    default_limit=default_limit, default_page=default_page,
+                    default_per_page=default_per_page, model_class=model_class)
+                if rejection is not None:
+                    return rejection
             query_obj = model_class
             if callable(index_query_creator):
                 query_obj = index_query_creator(model_class.query)
@@ -158,13 +174,16 @@ def construct_index_view_function(
                 default_sort=default_sort,
                 default_orderby=default_orderby,
                 default_offset=default_offset,
-                default_page=default_page,
-                default_per_page=default_per_page)
+                default_page=pagination_overrides.get(
+                    'default_page', default_page),
+                default_per_page=default_per_page,
+                max_per_page=pagination_overrides.get('max_per_page'))
             if custom_response_creator:
                 response = custom_response_creator(result_rows)
                 if isinstance(response, Response):
                     return response
-            return convert_result_to_response(result_rows, dict_struct=dict_struct)
+            return convert_result_to_response(
+                result_rows, dict_struct=dict_struct, layout=layout)
 
         except Exception as e:
             if exception_handler:
@@ -189,6 +208,84 @@ def construct_index_view_function(
     return index
 
 
+def construct_aggregate_view_function(
+        model_class, index_query_creator=None, exception_handler=None,
+        access_checker=None, default_group=None, default_agg=None,
+        default_limit=None, default_sort=None, default_orderby=None):
+    def aggregate():
+        try:
+            if callable(access_checker):
+                allowed, message = access_checker()
+                if not allowed:
+                    return error_json(401, message)
+            query_obj = model_class
+            if callable(index_query_creator):
+                query_obj = index_query_creator(model_class.query)
+            return process_args_and_render_aggregates(
+                query_obj,
+                default_group=default_group,
+                default_agg=default_agg,
+                default_limit=default_limit,
+                default_sort=default_sort,
+                default_orderby=default_orderby)
+        except Exception as e:
+            if exception_handler:
+                return exception_handler(e)
+            traceback.print_exc()
+            return error_json(400, six.text_type(e))
+
+    return aggregate
+
+
+def construct_stats_view_function(
+        model_class, index_query_creator=None, exception_handler=None,
+        access_checker=None, default_col=None, default_fn=None):
+    def stats():
+        try:
+            if callable(access_checker):
+                allowed, message = access_checker()
+                if not allowed:
+                    return error_json(401, message)
+            query_obj = model_class
+            if callable(index_query_creator):
+                query_obj = index_query_creator(model_class.query)
+            return process_args_and_render_stats(
+                query_obj, default_col=default_col, default_fn=default_fn)
+        except Exception as e:
+            if exception_handler:
+                return exception_handler(e)
+            traceback.print_exc()
+            return error_json(400, six.text_type(e))
+
+    return stats
+
+
+def construct_timeseries_view_function(
+        model_class, index_query_creator=None, exception_handler=None,
+        access_checker=None, default_col=None, default_bucket=None,
+        default_tz=None, default_agg=None):
+    def timeseries():
+        try:
+            if callable(access_checker):
+                allowed, message = access_checker()
+                if not allowed:
+                    return error_json(401, message)
+            query_obj = model_class
+            if callable(index_query_creator):
+                query_obj = index_query_creator(model_class.query)
+            return process_args_and_render_timeseries(
+                query_obj, default_col=default_col,
+                default_bucket=default_bucket, default_tz=default_tz,
+                default_agg=default_agg)
+        except Exception as e:
+            if exception_handler:
+                return exception_handler(e)
+            traceback.print_exc()
+            return error_json(400, six.text_type(e))
+
+    return timeseries
+
+
 def construct_post_view_function(
         model_class, schema, registration_dict, pre_processors=None,
         post_processors=None,
@@ -249,7 +346,8 @@ def construct_post_view_function(
                         if callable(processor):
                             processed_resources = []
                             for resource, datum in zip(resources, input_data):
-                                processed_resource = processor(resource, datum)
+                                processed_resource = run_post_processor(
+                                    processor, resource, datum)
                                 if processed_resource is not None:
                                     processed_resources.append(
                                         processed_resource)
@@ -297,8 +395,8 @@ def construct_post_view_function(
                 if post_processors is not None:
                     for processor in post_processors:
                         if callable(processor):
-                            processed_obj = processor(
-                                obj, input_data,
+                            processed_obj = run_post_processor(
+                                processor, obj, input_data,
                                 raw_input_data=raw_input_data)
                             if processed_obj is not None:
                                 obj = processed_obj
@@ -388,8 +486,8 @@ def construct_put_view_function(
             if post_processors is not None:
                 for processor in post_processors:
                     if callable(processor):
-                        processed_updated_obj = processor(
-                            updated_obj, input_data,
+                        processed_updated_obj = run_post_processor(
+                            processor, updated_obj, input_data,
                             pre_modification_data=pre_modification_data,
                             raw_input_data=raw_input_data)
                         if processed_updated_obj is not None:
@@ -471,7 +569,8 @@ def construct_patch_view_function(model_class, schema, pre_processors=None,
             if post_processors is not None:
                 for processor in post_processors:
                     if callable(processor):
-                        processed_updated_obj = processor(updated_obj, request_json)
+                        processed_updated_obj = run_post_processor(
+                            processor, updated_obj, request_json)
                         if processed_updated_obj is not None:
                             updated_obj = processed_updated_obj
             return render_json_obj_with_requested_structure(updated_obj, dict_struct=dict_struct)
@@ -528,7 +627,7 @@ def construct_delete_view_function(
             if post_processors is not None:
                 for processor in post_processors:
                     if callable(processor):
-                        processor(obj_data)
+                        run_post_processor(processor, obj_data)
 
             if rel_obj_requested_in_return is not None:
                 cls_of_rel_obj_requested_in_return = type(
@@ -649,15 +748,19 @@ def construct_batch_save_view_function(
 
         pre_modification_data = existing_instance.todict(
             dict_struct={"rels": {}}) if existing_instance else None
-        obj = existing_instance.update(
-            **input_row) if existing_instance else model_class.create(**input_row)
+        if existing_instance:
+            obj = existing_instance.update(**input_row)
+        else:
+            obj = model_class.create(**input_row)
+            # The loaders may hold a miss for it from the earlier rows
+            prime_loaders(obj)
         if not skip_post_processors:
             post_processors = post_processors_for_put if existing_instance else post_processors_for_post
             if post_processors is not None:
                 for processor in post_processors:
                     if callable(processor):
-                        processed_obj = processor(
-                            obj, input_row,
+                        processed_obj = run_post_processor(
+                            processor, obj, input_row,
                             pre_modification_data=pre_modification_data,
                             raw_input_data=raw_input_row)
                         if processed_obj is not None:
@@ -705,6 +808,16 @@ def construct_batch_save_view_function(
                             input_row[primary_key_name] = getattr(
                                 existing_instances[idx], primary_key_name)
 
+        # Per row hooks looking up instances through `loader` get them
+        # from one query per model
+        instances_loader = loader(model_class, key=primary_key_name)
+        for existing_instance in existing_instances:
+            if existing_instance is not None:
+                instances_loader.prime(
+                    getattr(existing_instance, primary_key_name),
+                    existing_instance)
+        expect_related_keys(model_class, input_data)
+
         if callable(access_checker):
             allowed, message = access_checker()
             if not allowed:
@@ -959,13 +1072,77 @@ def register_crud_routes_for_models(
                 default_orderby=index_dict.get('default_orderby'),
                 default_offset=index_dict.get('default_offset'),
                 default_page=index_dict.get('default_page'),
-                default_per_page=index_dict.get('default_per_page'))
+                default_per_page=index_dict.get('default_per_page'),
+                layout=index_dict.get('layout') or _model_dict.get('layout'),
+                cost_budget=index_dict.get(
+                    'cost_budget') or _model_dict.get('cost_budget'))
             index_url = index_dict.get('url', None) or "/%s" % base_url
             app_or_bp.route(
                 index_url, methods=['GET'], endpoint='index_%s' % resource_name)(
                 index_func)
             views[_model_name]['index'] = {'url': index_url}
 
+        # Not part of all_operations - registered only when named in the
+        # permitted operations or configured in the views dict of the model
+        if 'aggregate' in permitted_actions or 'aggregate' in view_dict_for_model:
+            aggregate_dict = view_dict_for_model.get('aggregate', {})
+            aggregate_func = aggregate_dict.get('view_func', None) or construct_aggregate_view_function(
+                _model,
+                index_query_creator=aggregate_dict.get(
+                    'query_constructor') or default_query_constructor,
+                exception_handler=exception_handler,
+                access_checker=aggregate_dict.get(
+                    'access_checker') or default_access_checker,
+                default_group=aggregate_dict.get('default_group'),
+                default_agg=aggregate_dict.get('default_agg'),
+                default_limit=aggregate_dict.get('default_limit'),
+                default_sort=aggregate_dict.get('default_sort'),
+                default_orderby=aggregate_dict.get('default_orderby'))
+            aggregate_url = aggregate_dict.get(
+                'url', None) or "/%s/_aggregate" % base_url
+            app_or_bp.route(
+                aggregate_url, methods=['GET'], endpoint='aggregate_%s' % resource_name)(
+                aggregate_func)
+            views[_model_name]['aggregate'] = {'url': aggregate_url}
+
+        if 'stats' in permitted_actions or 'stats' in view_dict_for_model:
+            stats_dict = view_dict_for_model.get('stats', {})
+            stats_func = stats_dict.get('view_func', None) or construct_stats_view_function(
+                _model,
+                index_query_creator=stats_dict.get(
+                    'query_constructor') or default_query_constructor,
+                exception_handler=exception_handler,
+                access_checker=stats_dict.get(
+                    'access_checker') or default_access_checker,
+                default_col=stats_dict.get('default_col'),
+                default_fn=stats_dict.get('default_fn'))
+            stats_url = stats_dict.get(
+                'url', None) or "/%s/_stats" % base_url
+            app_or_bp.route(
+                stats_url, methods=['GET'], endpoint='stats_%s' % resource_name)(
+                stats_func)
+            views[_model_name]['stats'] = {'url': stats_url}
+
+        if 'timeseries' in permitted_actions or 'timeseries' in view_dict_for_model:
+            timeseries_dict = view_dict_for_model.get('timeseries', {})
+            timeseries_func = timeseries_dict.get('view_func', None) or construct_timeseries_view_function(
+                _model,
+                index_query_creator=timeseries_dict.get(
+                    'query_constructor') or default_query_constructor,
+                exception_handler=exception_handler,
+                access_checker=timeseries_dict.get(
+                    'access_checker') or default_access_checker,
+                default_col=timeseries_dict.get('default_col'),
+                default_bucket=timeseries_dict.get('default_bucket'),
+                default_tz=timeseries_dict.get('default_tz'),
+                default_agg=timeseries_dict.get('default_agg'))
+            timeseries_url = timeseries_dict.get(
+                'url', None) or "/%s/_timeseries" % base_url
+            app_or_bp.route(
+                timeseries_url, methods=['GET'],
+                endpoint='timeseries_%s' % resource_name)(timeseries_func)
+            views[_model_name]['timeseries'] = {'url': timeseries_url}
+
         if 'get' in permitted_actions:
             get_dict = view_dict_for_model.get('get', {})
             if 'enable_caching' in get_dict:
@@ -0,0 +1,208 @@
+"""deferred_processors
+Post processors run after the response has been sent.
+
+    @deferred
+    def write_audit_log(task, data, **kwargs):
+        AuditLog.create(entity='task', entity_id=task.id, data=data)
+
+    register_crud_routes_for_models(app, {
+        Task: {'views': {'post': {'post_processors': [write_audit_log]}}}})
+
+A post processor marked with `deferred` is not called by the view.
+The call is queued and, once the response has been handed over to the
+client (`response.call_on_close`), run on a bounded thread pool of the
+app, inside its own app context and hence its own session. Instances
+among the arguments are passed as references and loaded again in that
+session; everything else is deep copied at queueing time. The return
+value of a deferred processor is ignored.
+
+Failures are logged with `app.logger` and counted. `deferred_processor_metrics`
+returns the counts and timings. The pool size is
+`SQLALCHEMY_BOOSTER_DEFERRED_MAX_WORKERS`. When more than
+`SQLALCHEMY_BOOSTER_DEFERRED_MAX_PENDING` calls are waiting, further calls run
+in the closing request's own thread instead, still after the response.
+
+"""
+
+from __future__ import absolute_import
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+import threading
+import time
+
+from flask import (
+    current_app, g, has_app_context, has_request_context, after_this_request)
+from sqlalchemy.orm import object_mapper
+
+from .snapshots import is_instance
+
+DEFERRED_MAX_WORKERS = 4
+DEFERRED_MAX_PENDING = 1000
+
+EXTENSION_KEY = 'sqlalchemy_booster_deferred'
+
+
+def deferred(processor):
+    """Marks a post processor to be run after the response is sent."""
+    processor._booster_deferred_ = True
+    return processor
+
+
+def is_deferred(processor):
+    return getattr(processor, '_booster_deferred_', False)
+
+
+class _InstanceReference(object):
+
+    def __init__(self, instance):
+        mapper = object_mapper(instance)
+        self.model_class = mapper.class_
+        self.identity = mapper.primary_key_from_instance(instance)
+
+    def load(self):
+        return self.model_class.query.get(self.identity)
+
+
+def _detached_argument(value):
+    if is_instance(value):
+        return _InstanceReference(value)
+    if isinstance(value, list):
+        return [_detached_argument(v) for v in value]
+    return deepcopy(value)
+
+
+def _attached_argument(value):
+    if isinstance(value, _InstanceReference):
+        return value.load()
+    if isinstance(value, list):
+        return [_attached_argument(v) for v in value]
+    return value
+
+
+class DeferredProcessorRunner(object):
+
+    """Runs deferred processor calls on a thread pool within an app
+    context of `app`, keeping counts and timings of them.
+    """
+
+    def __init__(self, app, max_workers=None, max_pending=None):
+        self.app = app
+        self.max_workers = max_workers or app.config.get(
+            'SQLALCHEMY_BOOSTER_DEFERRED_MAX_WORKERS', DEFERRED_MAX_WORKERS)
+        self.max_pending = max_pending or app.config.get(
+            'SQLALCHEMY_BOOSTER_DEFERRED_MAX_PENDING', DEFERRED_MAX_PENDING)
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._lock = threading.Lock()
+        self._futures = set()
+        self.counts = {
+            'queued': 0, 'succeeded': 0, 'failed': 0, 'ran_inline': 0}
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def _run(self, processor, args, kwargs):
+        start = time.time()
+        with self.app.app_context():
+            try:
+                processor(*_attached_argument(list(args)), **{
+                    k: _attached_argument(v) for k, v in kwargs.items()})
+                outcome = 'succeeded'
+            except Exception:
+                # The session is rolled back as the app context is torn down
+                outcome = 'failed'
+                self.app.logger.exception(
+                    "Deferred processor %s failed",
+                    getattr(processor, '__name__', processor))
+        elapsed = time.time() - start
+        with self._lock:
+            self.counts[outcome] += 1
+            self.total_time += elapsed
+            self.max_time = max(self.max_time, elapsed)
+
+    def submit(self, processor, args, kwargs):
+        with self._lock:
+            self.counts['queued'] += 1
+            pending = len(self._futures)
+        if pending >= self.max_pending:
+            with self._lock:
+                self.counts['ran_inline'] += 1
+            self._run(processor, args, kwargs)
+            return
+        future = self.pool.submit(self._run, processor, args, kwargs)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._discard)
+
+    def _discard(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def wait(self, timeout=None):
+        """Blocks until the calls submitted so far have run."""
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.result(timeout=timeout)
+
+    def metrics(self):
+        with self._lock:
+            completed = self.counts['succeeded'] + self.counts['failed']
+            return dict(
+                self.counts, pending=len(self._futures),
+                total_time=self.total_time, max_time=self.max_time,
+                mean_time=self.total_time / completed if completed else 0.0)
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
+
+
+def runner_for_app(app=None):
+    if app is None:
+        app = current_app._get_current_object()
+    if EXTENSION_KEY not in app.extensions:
+        app.extensions[EXTENSION_KEY] = DeferredProcessorRunner(app)
+    return app.extensions[EXTENSION_KEY]
+
+
+def deferred_processor_metrics(app=None):
+    return runner_for_app(app).metrics()
+
+
+def _submit_on_close(response):
+    calls = g.pop('_booster_deferred_calls', [])
+    runner = runner_for_app()
+
+    def submit_calls():
+        for processor, args, kwargs in calls:
+            runner.submit(processor, args, kwargs)
+
+    response.call_on_close(submit_calls)
+    return response
+
+
+def defer_processor_call(processor, *args, **kwargs):
+    """Queues a call of `processor` to be run once the current response
+    is sent, or right away on the pool outside a request. Without an app
+    context it is simply called.
+    """
+    if not has_app_context():
+        processor(*args, **kwargs)
+        return
+    args = _detached_argument(list(args))
+    kwargs = {k: _detached_argument(v) for k, v in kwargs.items()}
+    if not has_request_context():
+        runner_for_app().submit(processor, args, kwargs)
+        return
+    if '_booster_deferred_calls' not in g:
+        g._booster_deferred_calls = []
+        after_this_request(_submit_on_close)
+    g._booster_deferred_calls.append((processor, args, kwargs))
+
+
+def run_post_processor(processor, *args, **kwargs):
+    """Calls a post processor, or queues the call if it is `deferred`, in
+    which case None is returned.
+    """
+    if is_deferred(processor):
+        defer_processor_call(processor, *args, **kwargs)
+        return None
+    return processor(*args, **kwargs)
@@ -0,0 +1,159 @@
+"""entity_cache
+A cache of single instances by primary key, shared across sessions.
+
+    class User(db.Model):
+        _entity_cache_ttl_ = 300
+
+`User.get(pk)` (and hence the single object GET view) and the lazy loads
+of many-to-one relationships targeting `User` look the instance up in the
+session's identity map, then in the cache, and only then select it from
+the database, in which case a snapshot of it (see `snapshots`) is stored
+for `_entity_cache_ttl_` seconds. A hit is merged into the session
+without any SQL.
+
+Entries live in the query cache's store (see `query_cache`). Flushing an
+instance deletes its entry, and so does the commit which follows, since
+other sessions may have cached the row in between. A bulk `update` or
+`delete` on the table drops all its entries at once by moving the table
+to a new generation of keys. Instances are not cached from a session
+which has written to their table before it commits or rolls back.
+
+"""
+
+from __future__ import absolute_import
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, class_mapper
+from sqlalchemy.orm.attributes import instance_state
+
+from .query_cache import get_query_cache_store
+from .snapshots import snapshot_instance
+from .utils import cast_as_column_type
+
+ENTITY_KEY_PREFIX = 'booster:entity:'
+ENTITY_GENERATION_KEY_PREFIX = 'booster:entity_generation:'
+
+
+def entity_cache_ttl(model_class):
+    return getattr(model_class, '_entity_cache_ttl_', None)
+
+
+def is_entity_cached(model_class):
+    return entity_cache_ttl(model_class) is not None
+
+
+def _table_name(model_class):
+    return class_mapper(model_class).base_mapper.local_table.fullname
+
+
+def entity_cache_key(model_class, identity):
+    table_name = _table_name(model_class)
+    generation = get_query_cache_store().get(
+        ENTITY_GENERATION_KEY_PREFIX + table_name) or 0
+    return "%s%s:%s:%s" % (
+        ENTITY_KEY_PREFIX, table_name, generation,
+        ",".join(repr(v) for v in identity))
+
+
+def _identity_of(model_class, keyval):
+    mapper = class_mapper(model_class)
+    pk_attr = getattr(
+        model_class, mapper.get_property_by_column(mapper.primary_key[0]).key)
+    return (cast_as_column_type(keyval, pk_attr), )
+
+
+def _written_tables(session):
+    return session.info.setdefault('booster_entity_cache_writes', set())
+
+
+def _may_store(session, instance):
+    state = instance_state(instance)
+    return state.key is not None and not state.modified and \
+        _table_name(type(instance)) not in _written_tables(session)
+
+
+def remember_entity(session, instance):
+    """Stores a snapshot of `instance` if it is clean."""
+    if instance is None or not is_entity_cached(type(instance)) or \
+            not _may_store(session, instance):
+        return
+    identity = instance_state(instance).key[1]
+    get_query_cache_store().set(
+        entity_cache_key(type(instance), identity),
+        snapshot_instance(instance), ttl=entity_cache_ttl(type(instance)))
+
+
+def cached_entity(model_class, session, identity):
+    """The instance of `model_class` with the primary key `identity` from
+    the session's identity map or the cache, or None.
+    """
+    instance = session.identity_map.get(
+        class_mapper(model_class).identity_key_from_primary_key(
+            list(identity)))
+    if instance is not None:
+        return instance
+    snapshot = get_query_cache_store().get(
+        entity_cache_key(model_class, identity))
+    if snapshot is None or not isinstance(snapshot, model_class):
+        return None
+    return session.merge(snapshot, load=False)
+
+
+def get_entity(model_class, keyval):
+    """Fetches the instance with the primary key `keyval`, through the
+    entity cache.
+    """
+    session = model_class.session
+    identity = _identity_of(model_class, keyval)
+    instance = cached_entity(model_class, session, identity)
+    if instance is None:
+        instance = model_class.query.get(keyval)
+        remember_entity(session, instance)
+    return instance
+
+
+def _forget_instances(session, instances):
+    store = get_query_cache_store()
+    for instance in instances:
+        state = instance_state(instance)
+        if state.key is None or not is_entity_cached(type(instance)):
+            continue
+        cache_key = entity_cache_key(type(instance), state.key[1])
+        store.delete(cache_key)
+        session.info.setdefault(
+            'booster_flushed_entity_keys', set()).add(cache_key)
+        _written_tables(session).add(_table_name(type(instance)))
+
+
+@event.listens_for(Session, 'after_flush')
+def _forget_flushed_entities(session, flush_context):
+    _forget_instances(
+        session, list(session.new) + list(session.dirty) +
+        list(session.deleted))
+
+
+def _forget_bulk_updated_entities(context):
+    mapper = getattr(context, 'mapper', None)
+    if mapper is not None and is_entity_cached(mapper.class_):
+        table_name = _table_name(mapper.class_)
+        get_query_cache_store().incr(
+            ENTITY_GENERATION_KEY_PREFIX + table_name)
+        _written_tables(context.session).add(table_name)
+
+
+event.listen(Session, 'after_bulk_update', _forget_bulk_updated_entities)
+event.listen(Session, 'after_bulk_delete', _forget_bulk_updated_entities)
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_committed_entities(session):
+    store = get_query_cache_store()
+    for cache_key in session.info.pop('booster_flushed_entity_keys', ()):
+        store.delete(cache_key)
+    session.info.pop('booster_entity_cache_writes', None)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back_writes(session):
+    session.info.pop('booster_flushed_entity_keys', None)
+    session.info.pop('booster_entity_cache_writes', None)
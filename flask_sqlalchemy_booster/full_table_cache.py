@@ -0,0 +1,243 @@
+"""full_table_cache
+In-memory copies of small, rarely written tables.
+
+    class Country(db.Model):
+        _cache_fully_ = True
+
+The first lookup of a fully cached model loads all its rows, as
+snapshots (see `snapshots`), into a process wide, read-only index. From
+then on `Model.get`, `Model.get_all`, `Model.first(key=value, ...)` and
+the lazy loads of many-to-one relationships targeting the model (and
+hence association proxies through them) are served from it, the
+snapshots being merged into the caller's session without SQL.
+`warm_full_table_caches` loads every such model up front.
+
+A session which has written to the model's table (or holds new, changed
+or deleted instances of it) reads the table itself until it commits or
+rolls back. A commit touching the table drops its copy, which is loaded
+again on the next lookup. Writes made by other processes are not seen
+until then, hence the model is meant to be one which doesn't change
+while the app runs. Lookups missing the copy fall back to the database.
+Models with inheritance are not cached.
+
+"""
+
+from __future__ import absolute_import
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, class_mapper, make_transient_to_detached
+from sqlalchemy.orm.attributes import instance_state, set_committed_value
+from sqlalchemy.orm.mapper import _mapper_registry
+
+from .utils import cast_as_column_type
+
+# Model class to its `FullTableCache`
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class FullTableCache(object):
+
+    """The rows of `model_class` as snapshots, indexed by primary key
+    and, on demand, by other columns.
+    """
+
+    def __init__(self, model_class):
+        self.model_class = model_class
+        self.mapper = class_mapper(model_class)
+        self._lock = threading.Lock()
+        self._snapshots = None
+        self._indexes = {}
+
+    @property
+    def loaded(self):
+        return self._snapshots is not None
+
+    def load(self, session):
+        """Reads all the rows of the table, without flushing `session`."""
+        props = list(self.mapper.column_attrs)
+        rows = session.query(*[
+            getattr(self.model_class, prop.key) for prop in props]).autoflush(
+            False).order_by(*self.mapper.primary_key).all()
+        snapshots = []
+        for row in rows:
+            snapshot = self.mapper.class_manager.new_instance()
+            for prop, value in zip(props, row):
+                set_committed_value(snapshot, prop.key, value)
+            make_transient_to_detached(snapshot)
+            snapshots.append(snapshot)
+        with self._lock:
+            self._snapshots = snapshots
+            self._indexes = {}
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshots = None
+            self._indexes = {}
+
+    def snapshots(self):
+        return self._snapshots or []
+
+    def index(self, key):
+        """The snapshots by their value of the column attribute `key`, the
+        first one (by primary key) for duplicate values.
+        """
+        index = self._indexes.get(key)
+        if index is None:
+            # Under the lock, so that a concurrent load or invalidate can't
+            # leave an index of the previous snapshots behind
+            with self._lock:
+                index = {}
+                for snapshot in self._snapshots or []:
+                    index.setdefault(
+                        instance_state(snapshot).dict.get(key), snapshot)
+                self._indexes[key] = index
+        return index
+
+
+def is_fully_cached(model_class):
+    if not getattr(model_class, '_cache_fully_', False):
+        return False
+    mapper = class_mapper(model_class)
+    return mapper.inherits is None and mapper.polymorphic_on is None
+
+
+def full_table_cache(model_class):
+    with _caches_lock:
+        if model_class not in _caches:
+            _caches[model_class] = FullTableCache(model_class)
+        return _caches[model_class]
+
+
+def _written_classes(session):
+    return session.info.setdefault('booster_fully_cached_writes', set())
+
+
+def session_has_changes_to(session, model_class):
+    if model_class in _written_classes(session):
+        return True
+    return any(
+        isinstance(instance, model_class)
+        for instances in (session.new, session.dirty, session.deleted)
+        for instance in instances)
+
+
+def usable_cache(model_class, session):
+    """Returns the loaded cache of `model_class` if `session` may read
+    from it, or None.
+    """
+    if session is None or not is_fully_cached(model_class) or \
+            session_has_changes_to(session, model_class):
+        return None
+    cache = full_table_cache(model_class)
+    if not cache.loaded:
+        cache.load(session)
+    return cache
+
+
+def attach_snapshot(session, snapshot):
+    """Returns the session's instance for `snapshot`, merging it in when
+    the session doesn't have one yet.
+    """
+    if snapshot is None:
+        return None
+    existing = session.identity_map.get(instance_state(snapshot).key)
+    if existing is not None:
+        return existing
+    return session.merge(snapshot, load=False)
+
+
+def cached_lookup(model_class, keyvals, key=None):
+    """Looks up the instances of `model_class` whose column attribute
+    `key` (the primary key by default) has the values `keyvals`. Returns
+    None when they can't be served from the cache.
+    """
+    session = model_class.session
+    cache = usable_cache(model_class, session)
+    if cache is None:
+        return None
+    key = key or model_class.primary_key_name()
+    if key not in cache.mapper.column_attrs:
+        return None
+    attr = getattr(model_class, key)
+    index = cache.index(key)
+    snapshots = [index.get(cast_as_column_type(v, attr)) for v in keyvals]
+    if None in snapshots:
+        # Misses may be rows written after the cache was loaded
+        return None
+    return [attach_snapshot(session, s) for s in snapshots]
+
+
+def cached_first(model_class, **kwargs):
+    """The first instance, by primary key, whose column attributes equal
+    `kwargs`, or None when it can't be served from the cache.
+    """
+    session = model_class.session
+    cache = usable_cache(model_class, session)
+    if cache is None or not all(
+            k in cache.mapper.column_attrs for k in kwargs):
+        return None
+    wanted = [
+        (k, cast_as_column_type(v, getattr(model_class, k)))
+        for k, v in kwargs.items()]
+    for snapshot in cache.snapshots():
+        values = instance_state(snapshot).dict
+        if all(values.get(k) == v for k, v in wanted):
+            return attach_snapshot(session, snapshot)
+    return None
+
+
+def warm_full_table_caches(session):
+    """Loads the copies of all fully cached models."""
+    for mapper in list(_mapper_registry):
+        if is_fully_cached(mapper.class_):
+            full_table_cache(mapper.class_).load(session)
+
+
+def cached_identity_lookup(model_class, session, identity):
+    """The instance of `model_class` with the primary key `identity`, or
+    None when it can't be served from the cache.
+    """
+    if len(identity) != 1:
+        return None
+    cache = usable_cache(model_class, session)
+    if cache is None:
+        return None
+    pk_key = cache.mapper.get_property_by_column(
+        cache.mapper.primary_key[0]).key
+    return attach_snapshot(session, cache.index(pk_key).get(identity[0]))
+
+
+def _note_written_classes(session, instances):
+    for instance in instances:
+        if is_fully_cached(type(instance)):
+            _written_classes(session).add(type(instance))
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_flushed_writes(session, flush_context):
+    _note_written_classes(
+        session, list(session.new) + list(session.dirty) +
+        list(session.deleted))
+
+
+def _note_bulk_writes(context):
+    mapper = getattr(context, 'mapper', None)
+    if mapper is not None and is_fully_cached(mapper.class_):
+        _written_classes(context.session).add(mapper.class_)
+
+
+event.listen(Session, 'after_bulk_update', _note_bulk_writes)
+event.listen(Session, 'after_bulk_delete', _note_bulk_writes)
+
+
+@event.listens_for(Session, 'after_commit')
+def _drop_written_caches(session):
+    for model_class in session.info.pop('booster_fully_cached_writes', ()):
+        full_table_cache(model_class).invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_written_classes(session):
+    session.info.pop('booster_fully_cached_writes', None)
@@ -0,0 +1,222 @@
+"""full_text_search
+Full-text filtering for columns declared in a model's
+`_fulltext_searchable_` list.
+
+On SQLite the booster keeps an FTS5 virtual table named `<table>_fts`
+in sync with the model through mapper events, with the primary key as
+the rowid. On Postgres the search runs against a `to_tsvector` expression
+of the columns, backed by a GIN expression index. Other dialects fall back
+to an `ilike` scan.
+
+The filter language exposes it as the `@@` operator, on either a
+searchable column (`title@@=swim`) or on the pseudo key `_search` which
+spans all searchable columns (`_search@@=swim`). `orderby=_relevance`
+orders the results by match quality.
+
+"""
+
+from __future__ import absolute_import
+import re
+
+from sqlalchemy import event, DDL, func, or_, and_, select, literal_column, bindparam
+from sqlalchemy.orm import class_mapper
+from sqlalchemy.sql import table, column
+
+FULL_TEXT_SEARCH_KEY = '_search'
+RELEVANCE_ORDERBY_KEY = '_relevance'
+POSTGRES_TEXT_SEARCH_CONFIG = 'english'
+
+_TOKEN_RE = re.compile(r'\w+\*?', re.UNICODE)
+
+
+def searchable_columns(model_cls):
+    return list(getattr(model_cls, '_fulltext_searchable_', None) or [])
+
+
+def fts_table_name(model_cls):
+    return "%s_fts" % model_cls.__table__.name
+
+
+def _fts_table(model_cls):
+    return table(
+        fts_table_name(model_cls),
+        column('rowid'), column('rank'),
+        *[column(c) for c in searchable_columns(model_cls)])
+
+
+def _tokens(terms):
+    return _TOKEN_RE.findall(terms or '')
+
+
+def fts5_match_expression(terms, columns=None):
+    """Converts free text typed by a client into a safe FTS5 query, where
+    every word must match. A trailing `*` on a word makes it a prefix match.
+
+    Examples:
+
+        >>> fts5_match_expression('swim fast*', columns=['title'])
+        '{title} : ("swim" "fast"*)'
+
+    """
+    phrases = " ".join(
+        '"%s"*' % t[:-1] if t.endswith('*') else '"%s"' % t
+        for t in _tokens(terms))
+    if columns:
+        return "{%s} : (%s)" % (" ".join(columns), phrases)
+    return phrases
+
+
+def _postgres_document(model_cls, columns):
+    document = None
+    for col_name in columns:
+        col = func.coalesce(model_cls.__table__.c[col_name], '')
+        document = col if document is None else document.op('||')(' ').op('||')(col)
+    return func.to_tsvector(POSTGRES_TEXT_SEARCH_CONFIG, document)
+
+
+def _postgres_query(terms):
+    return func.plainto_tsquery(
+        POSTGRES_TEXT_SEARCH_CONFIG, " ".join(t.rstrip('*') for t in _tokens(terms)))
+
+
+def full_text_criterion(model_cls, terms, columns=None, dialect_name=None):
+    """Returns the filter criterion selecting instances of `model_cls`
+    matching `terms` on `columns` (all searchable columns if None).
+    """
+    columns = columns or searchable_columns(model_cls)
+    if len(_tokens(terms)) == 0:
+        return None
+    if dialect_name == 'sqlite':
+        fts = _fts_table(model_cls)
+        return model_cls.primary_key().in_(
+            select([fts.c.rowid]).where(
+                literal_column(fts.name).op('MATCH')(
+                    bindparam(None, fts5_match_expression(terms, columns)))))
+    if dialect_name == 'postgresql':
+        return _postgres_document(model_cls, columns).op('@@')(
+            _postgres_query(terms))
+    return and_(*[
+        or_(*[getattr(model_cls, c).ilike("%{0}%".format(t.rstrip('*')))
+              for c in columns])
+        for t in _tokens(terms)])
+
+
+def relevance_order_by(model_cls, searches, dialect_name=None, descending=True):
+    """Returns an order by clause ranking instances on how well they match
+    the full-text `searches` - a list of `(terms, columns)` tuples recorded
+    on the query while filtering. Descending order puts the best match first.
+    """
+    terms = " ".join(t for t, _ in searches)
+    columns = []
+    for _, cols in searches:
+        for c in (cols or searchable_columns(model_cls)):
+            if c not in columns:
+                columns.append(c)
+    if dialect_name == 'sqlite':
+        fts = _fts_table(model_cls)
+        # bm25 based rank is lower for better matches
+        rank = select([fts.c.rank]).where(
+            fts.c.rowid == model_cls.primary_key()).where(
+            literal_column(fts.name).op('MATCH')(
+                bindparam(None, fts5_match_expression(terms, columns)))).as_scalar()
+        return rank.asc() if descending else rank.desc()
+    if dialect_name == 'postgresql':
+        rank = func.ts_rank(
+            _postgres_document(model_cls, columns), _postgres_query(terms))
+        return rank.desc() if descending else rank.asc()
+    return None
+
+
+def _column_values(connection, target, col_names):
+    """Reads the column values of a just flushed instance from its state,
+    selecting those not present (eg. expired server defaults) through
+    the flush's connection rather than triggering a load on the session.
+    """
+    state_dict = target.__dict__
+    values = {c: state_dict[c] for c in col_names if c in state_dict}
+    missing = [c for c in col_names if c not in values]
+    if missing:
+        tbl = type(target).__table__
+        row = connection.execute(
+            select([tbl.c[c] for c in missing]).where(
+                tbl.c[type(target).primary_key_name()] == target.primary_key_value())
+        ).first()
+        if row is not None:
+            values.update(zip(missing, row))
+    return values
+
+
+def _index_instance(connection, target):
+    model_cls = type(target)
+    col_names = searchable_columns(model_cls)
+    fts = _fts_table(model_cls)
+    values = _column_values(connection, target, col_names)
+    values['rowid'] = target.primary_key_value()
+    connection.execute(fts.insert().values(**values))
+
+
+def _unindex_instance(connection, target):
+    fts = _fts_table(type(target))
+    connection.execute(
+        fts.delete().where(fts.c.rowid == target.primary_key_value()))
+
+
+def _after_insert(mapper, connection, target):
+    if connection.dialect.name == 'sqlite':
+        _index_instance(connection, target)
+
+
+def _after_update(mapper, connection, target):
+    if connection.dialect.name != 'sqlite':
+        return
+    state = target._sa_instance_state
+    if any(state.attrs[c].history.has_changes()
+           for c in searchable_columns(type(target))):
+        _unindex_instance(connection, target)
+        _index_instance(connection, target)
+
+
+def _after_delete(mapper, connection, target):
+    if connection.dialect.name == 'sqlite':
+        _unindex_instance(connection, target)
+
+
+def setup_full_text_search(mapper, model_cls):
+    """Registers the DDL and mapper events maintaining the full-text index
+    of `model_cls`. Called when a `ModelBooster` subclass declaring
+    `_fulltext_searchable_` is mapped.
+    """
+    columns = searchable_columns(model_cls)
+    tbl = model_cls.__table__
+    fts_name = fts_table_name(model_cls)
+    event.listen(tbl, 'after_create', DDL(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(%s)" % (
+            fts_name, ", ".join(columns))).execute_if(dialect='sqlite'))
+    event.listen(tbl, 'before_drop', DDL(
+        "DROP TABLE IF EXISTS %s" % fts_name).execute_if(dialect='sqlite'))
+    event.listen(tbl, 'after_create', DDL(
+        "CREATE INDEX IF NOT EXISTS ix_%s ON %s USING gin (to_tsvector('%s', %s))" % (
+            fts_name, tbl.name, POSTGRES_TEXT_SEARCH_CONFIG,
+            " || ' ' || ".join("coalesce(%s, '')" % c for c in columns))
+    ).execute_if(dialect='postgresql'))
+    event.listen(mapper, 'after_insert', _after_insert, propagate=True)
+    event.listen(mapper, 'after_update', _after_update, propagate=True)
+    event.listen(mapper, 'after_delete', _after_delete, propagate=True)
+
+
+def rebuild_full_text_index(model_cls, session):
+    """Repopulates the SQLite FTS5 table of `model_cls` from the rows in its
+    table. Needed once when full-text search is enabled on a table which
+    already has data.
+    """
+    connection = session.connection(mapper=class_mapper(model_cls))
+    if connection.dialect.name != 'sqlite':
+        return
+    tbl = model_cls.__table__
+    fts = _fts_table(model_cls)
+    columns = searchable_columns(model_cls)
+    connection.execute(fts.delete())
+    connection.execute(fts.insert().from_select(
+        ['rowid'] + columns,
+        select([tbl.c[model_cls.primary_key_name()]] + [tbl.c[c] for c in columns])))
+    session.commit()
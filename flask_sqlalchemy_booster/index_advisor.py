@@ -0,0 +1,308 @@
+"""index_advisor
+Suggests indexes from the filters and sort keys clients actually use.
+
+With `SQLALCHEMY_BOOSTER_RECORD_INDEX_USAGE` enabled, every request
+served through the filter language notes, per table, the columns it
+compared for equality (`=`, `in`, `is null`), the columns it compared as
+ranges (`<`, `>`, `between`, `^` ...) and the column it sorted on -
+including those reached through dotted relationship keys. At the end of
+the request that combination is counted as one query shape of the table.
+
+`index_report` turns the shapes into candidate indexes (equality columns
+first, by frequency, then a range column, then the sort column), drops
+those already served by a prefix of an existing index and returns the
+remaining ones with their `CREATE INDEX` DDL. `flask booster-index-report`
+prints it.
+
+Usage is kept in memory and, if `SQLALCHEMY_BOOSTER_INDEX_USAGE_FILE` is
+set, added to that JSON file every `SQLALCHEMY_BOOSTER_INDEX_USAGE_FLUSH_EVERY`
+requests and at exit, so that the counts of several processes accumulate.
+
+"""
+
+from __future__ import absolute_import
+from collections import Counter, OrderedDict
+import atexit
+import json
+import os
+import threading
+
+import click
+from flask import g, has_request_context
+from sqlalchemy import inspect
+
+# Full-text matches (`@@`) are served by the full-text index, not a B-tree
+EQUALITY_OPERATORS = ['=', 'in', 'is null', 'is not null']
+RANGE_OPERATORS = ['>', '<', '>=', '<=', 'between', '^']
+
+INDEX_USAGE_FLUSH_EVERY = 100
+
+
+def _shape_key(table_name, eq_cols, range_cols, sort_col):
+    return "%s|%s|%s|%s" % (
+        table_name, ",".join(sorted(eq_cols)), ",".join(sorted(range_cols)),
+        sort_col or '')
+
+
+def _parse_shape_key(shape_key):
+    table_name, eq_cols, range_cols, sort_col = shape_key.split('|')
+    return (table_name, [c for c in eq_cols.split(',') if c],
+            [c for c in range_cols.split(',') if c], sort_col or None)
+
+
+class IndexUsageRecorder(object):
+
+    """Counts query shapes per table. Thread safe."""
+
+    def __init__(self):
+        self.shapes = Counter()
+        self._unflushed = Counter()
+        self._requests_since_flush = 0
+        self._lock = threading.Lock()
+
+    def add(self, shape_key, count=1):
+        with self._lock:
+            self.shapes[shape_key] += count
+            self._unflushed[shape_key] += count
+
+    def request_finished(self):
+        with self._lock:
+            self._requests_since_flush += 1
+
+    def requests_since_flush(self):
+        return self._requests_since_flush
+
+    def flush_to_file(self, path):
+        """Adds the counts recorded since the last flush to the counts in
+        the JSON file at `path`.
+        """
+        with self._lock:
+            unflushed, self._unflushed = self._unflushed, Counter()
+            self._requests_since_flush = 0
+        if not unflushed:
+            return
+        stored = Counter(load_usage_file(path))
+        stored.update(unflushed)
+        tmp_path = "%s.tmp" % path
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(stored), f, indent=1, sort_keys=True)
+        os.rename(tmp_path, path)
+
+    def clear(self):
+        with self._lock:
+            self.shapes.clear()
+            self._unflushed.clear()
+            self._requests_since_flush = 0
+
+
+index_usage = IndexUsageRecorder()
+
+
+def load_usage_file(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def start_request_index_usage():
+    g._booster_index_usage = OrderedDict()
+
+
+def _request_usage_for(model_class):
+    if not has_request_context():
+        return None
+    usage = g.get('_booster_index_usage')
+    if usage is None or not hasattr(model_class, '__table__'):
+        return None
+    return usage.setdefault(model_class.__table__.fullname, {
+        'eq': set(), 'range': set(), 'sort': None})
+
+
+def note_filter(model_class, attr_name, op):
+    table_usage = _request_usage_for(model_class)
+    if table_usage is None or attr_name not in model_class.__table__.columns:
+        return
+    if op in EQUALITY_OPERATORS:
+        table_usage['eq'].add(attr_name)
+    elif op in RANGE_OPERATORS:
+        table_usage['range'].add(attr_name)
+
+
+def note_sort(model_class, attr_name):
+    table_usage = _request_usage_for(model_class)
+    if table_usage is not None and attr_name in model_class.__table__.columns:
+        table_usage['sort'] = attr_name
+
+
+def finish_request_index_usage(recorder=None):
+    """Counts the shapes noted during the request into `recorder`."""
+    recorder = recorder or index_usage
+    usage = g.pop('_booster_index_usage', None) or {}
+    for table_name, table_usage in usage.items():
+        recorder.add(_shape_key(
+            table_name, table_usage['eq'], table_usage['range'],
+            table_usage['sort']))
+    recorder.request_finished()
+
+
+def candidate_columns(eq_cols, range_cols, sort_col, column_frequency):
+    """Orders the columns of a composite index for one query shape:
+    equality columns (most used first), then one range column, then the
+    sort column, which only helps when it is the range column or there is
+    none.
+    """
+    columns = sorted(eq_cols, key=lambda c: (-column_frequency[c], c))
+    if range_cols:
+        range_col = sorted(
+            range_cols, key=lambda c: (-column_frequency[c], c))[0]
+        columns.append(range_col)
+        if sort_col and sort_col != range_col:
+            sort_col = None
+    if sort_col and sort_col not in columns:
+        columns.append(sort_col)
+    return columns
+
+
+def existing_indexes(engine, table_name):
+    """Returns the column lists of the indexes, unique constraints and
+    primary key of a table, as reflected from the database.
+    """
+    inspector = inspect(engine)
+    schema = None
+    if '.' in table_name:
+        schema, table_name = table_name.split('.', 1)
+    indexes = [
+        i['column_names'] for i in inspector.get_indexes(table_name, schema=schema)]
+    indexes += [
+        u['column_names']
+        for u in inspector.get_unique_constraints(table_name, schema=schema)]
+    pk = inspector.get_pk_constraint(table_name, schema=schema)
+    if pk and pk.get('constrained_columns'):
+        indexes.append(pk['constrained_columns'])
+    return indexes
+
+
+def is_served_by(columns, indexes, eq_count=0):
+    """Whether one of `indexes` leads with `columns`. The first
+    `eq_count` columns, compared with equality, may come in any order.
+    """
+    eq_cols = set(columns[:eq_count])
+    return any(
+        set(index[:eq_count]) == eq_cols and
+        index[eq_count:len(columns)] == columns[eq_count:]
+        for index in indexes)
+
+
+def index_ddl(table_name, columns):
+    return "CREATE INDEX ix_%s_%s ON %s (%s)" % (
+        table_name.replace('.', '_'), "_".join(columns), table_name,
+        ", ".join(columns))
+
+
+def index_report(engine, shapes=None):
+    """Compares the recorded query shapes against the indexes in the
+    database behind `engine`.
+
+    Args:
+
+        engine: SQLAlchemy engine to reflect the existing indexes from
+
+        shapes (dict, optional): Shape key to count mapping, defaults to
+            the usage recorded by this process
+
+    Returns:
+
+        list of dict: One entry per table with its `columns` usage counts
+            and the `suggestions` - each with `columns`, `uses` and `ddl` -
+            most used first
+    """
+    shapes = index_usage.shapes if shapes is None else shapes
+    tables = OrderedDict()
+    for shape_key, count in sorted(shapes.items()):
+        table_name, eq_cols, range_cols, sort_col = _parse_shape_key(shape_key)
+        table = tables.setdefault(table_name, {
+            'shapes': [], 'columns': Counter()})
+        table['shapes'].append((eq_cols, range_cols, sort_col, count))
+        for col in set(eq_cols + range_cols + ([sort_col] if sort_col else [])):
+            table['columns'][col] += count
+
+    report = []
+    for table_name, table in tables.items():
+        indexes = existing_indexes(engine, table_name)
+        suggestions = OrderedDict()
+        for eq_cols, range_cols, sort_col, count in table['shapes']:
+            columns = candidate_columns(
+                eq_cols, range_cols, sort_col, table['columns'])
+            if not columns or is_served_by(
+                    columns, indexes, eq_count=len(eq_cols)):
+                continue
+            key = tuple(columns)
+            if key not in suggestions:
+                suggestions[key] = {
+                    'columns': columns, 'uses': 0,
+                    'ddl': index_ddl(table_name, columns)}
+            suggestions[key]['uses'] += count
+        # A suggestion which is a prefix of a longer one is served by it
+        for key in sorted(suggestions, key=len):
+            longer = [other for other in suggestions
+                      if len(other) > len(key) and other[:len(key)] == key]
+            if longer:
+                suggestions[longer[0]]['uses'] += suggestions.pop(key)['uses']
+        report.append({
+            'table': table_name,
+            'columns': dict(table['columns']),
+            'existing_indexes': indexes,
+            'suggestions': sorted(
+                suggestions.values(), key=lambda s: -s['uses'])
+        })
+    return report
+
+
+def format_index_report(report):
+    lines = []
+    for table in report:
+        lines.append("Table %s" % table['table'])
+        lines.append("  Column usage: %s" % ", ".join(
+            "%s (%s)" % (c, n) for c, n in sorted(
+                table['columns'].items(), key=lambda cn: -cn[1])))
+        if not table['suggestions']:
+            lines.append("  Existing indexes cover the recorded usage")
+        for suggestion in table['suggestions']:
+            lines.append("  %s;  -- %s uses" % (
+                suggestion['ddl'], suggestion['uses']))
+    return "\n".join(lines)
+
+
+def init_index_advisor(app, get_engine):
+    """Registers the request hooks and the `booster-index-report` command
+    on `app`. `get_engine` returns the engine to reflect indexes from.
+    """
+    usage_file = app.config.get('SQLALCHEMY_BOOSTER_INDEX_USAGE_FILE')
+    flush_every = app.config.get(
+        'SQLALCHEMY_BOOSTER_INDEX_USAGE_FLUSH_EVERY', INDEX_USAGE_FLUSH_EVERY)
+
+    if app.config.get('SQLALCHEMY_BOOSTER_RECORD_INDEX_USAGE'):
+        def start_noting_index_usage():
+            start_request_index_usage()
+
+        def count_index_usage(response):
+            finish_request_index_usage()
+            if usage_file and index_usage.requests_since_flush() >= flush_every:
+                index_usage.flush_to_file(usage_file)
+            return response
+
+        app.before_request(start_noting_index_usage)
+        app.after_request(count_index_usage)
+        if usage_file:
+            atexit.register(index_usage.flush_to_file, usage_file)
+
+    @app.cli.command('booster-index-report')
+    def print_index_report():
+        """Prints indexes suggested by the recorded filter and sort usage."""
+        if usage_file:
+            index_usage.flush_to_file(usage_file)
+            shapes = load_usage_file(usage_file)
+        else:
+            shapes = index_usage.shapes
+        click.echo(format_index_report(index_report(get_engine(), shapes)))
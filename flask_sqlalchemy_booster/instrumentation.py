@@ -0,0 +1,223 @@
+"""instrumentation
+Per-request SQL statement recording and N+1 detection.
+
+`FlaskSQLAlchemyBooster` attaches `before_cursor_execute` and
+`after_cursor_execute` listeners to every engine it creates. Each executed
+statement is timed, normalized into a fingerprint and recorded into every
+active `QueryStats` recorder - the one bound to the current request (when
+enabled through config) and any opened explicitly with `record_queries`.
+
+"""
+
+from __future__ import absolute_import
+from contextlib import contextmanager
+from collections import OrderedDict
+import re
+import threading
+import time
+
+from flask import g, has_app_context
+from sqlalchemy import event
+
+N_PLUS_ONE_THRESHOLD = 5
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_BIND_PARAM_RE = re.compile(r"%\(\w+\)s|%s|:\w+|\?")
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+_local = threading.local()
+
+
+def fingerprint_statement(statement):
+    """Normalizes a SQL statement so that executions differing only in
+    their literal values or bound parameters share the same fingerprint.
+
+    Examples:
+
+        >>> fingerprint_statement("SELECT * FROM task WHERE id IN (?, ?, ?)")
+        'SELECT * FROM task WHERE id IN (?)'
+
+    """
+    fingerprint = _STRING_LITERAL_RE.sub('?', statement)
+    fingerprint = _BIND_PARAM_RE.sub('?', fingerprint)
+    fingerprint = _NUMBER_LITERAL_RE.sub('?', fingerprint)
+    fingerprint = _PLACEHOLDER_LIST_RE.sub('(?)', fingerprint)
+    return _WHITESPACE_RE.sub(' ', fingerprint).strip()
+
+
+class QueryStats(object):
+
+    """Accumulates the statements executed while it is active.
+
+    Attributes:
+
+        statements (list of dict): One entry per executed statement with
+            the keys `statement`, `fingerprint`, `parameters` and `duration`
+            (in seconds)
+
+        n_plus_one_threshold (int): A fingerprint executed more than this
+            many times is reported as a probable N+1 pattern
+
+    """
+
+    def __init__(self, n_plus_one_threshold=None):
+        self.statements = []
+        self.n_plus_one_threshold = (
+            N_PLUS_ONE_THRESHOLD if n_plus_one_threshold is None
+            else n_plus_one_threshold)
+
+    def record(self, statement, parameters, duration):
+        self.statements.append({
+            "statement": statement,
+            "fingerprint": fingerprint_statement(statement),
+            "parameters": parameters,
+            "duration": duration
+        })
+
+    @property
+    def statement_count(self):
+        return len(self.statements)
+
+    @property
+    def total_time(self):
+        return sum(s['duration'] for s in self.statements)
+
+    def fingerprint_counts(self):
+        counts = OrderedDict()
+        for s in self.statements:
+            counts[s['fingerprint']] = counts.get(s['fingerprint'], 0) + 1
+        return counts
+
+    def n_plus_one_suspects(self):
+        return [
+            (fingerprint, count)
+            for fingerprint, count in self.fingerprint_counts().items()
+            if count > self.n_plus_one_threshold]
+
+    def summary(self):
+        fingerprints = OrderedDict()
+        for s in self.statements:
+            fp = fingerprints.setdefault(
+                s['fingerprint'], {"count": 0, "total_time": 0.0})
+            fp['count'] += 1
+            fp['total_time'] += s['duration']
+        return {
+            "statement_count": self.statement_count,
+            "total_time": self.total_time,
+            "fingerprints": fingerprints,
+            "n_plus_one_suspects": self.n_plus_one_suspects()
+        }
+
+
+def _explicit_recorders():
+    if not hasattr(_local, 'recorders'):
+        _local.recorders = []
+    return _local.recorders
+
+
+def active_query_stats():
+    """Returns the list of `QueryStats` objects which should receive the
+    statements executed on the current thread.
+    """
+    recorders = list(_explicit_recorders())
+    if has_app_context():
+        request_stats = g.get('_booster_query_stats')
+        if request_stats is not None:
+            recorders.append(request_stats)
+    return recorders
+
+
+def get_request_query_stats():
+    """Returns the `QueryStats` bound to the current request, or None if
+    per-request recording is not enabled.
+    """
+    if has_app_context():
+        return g.get('_booster_query_stats')
+    return None
+
+
+def start_request_query_stats(n_plus_one_threshold=None):
+    g._booster_query_stats = QueryStats(
+        n_plus_one_threshold=n_plus_one_threshold)
+    return g._booster_query_stats
+
+
+@contextmanager
+def record_queries(n_plus_one_threshold=None):
+    """Records every statement executed on the current thread within the
+    block, irrespective of whether a request is active.
+
+    Examples:
+
+        >>> with record_queries() as stats:
+        ...     Task.all()
+        >>> stats.statement_count
+        1
+
+    """
+    stats = QueryStats(n_plus_one_threshold=n_plus_one_threshold)
+    recorders = _explicit_recorders()
+    recorders.append(stats)
+    try:
+        yield stats
+    finally:
+        recorders.remove(stats)
+
+
+def thread_statement_count():
+    """The number of statements executed so far on the current thread, on
+    instrumented engines.
+    """
+    return getattr(_local, 'statement_count', 0)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_booster_query_start_time', []).append(time.time())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get('_booster_query_start_time')
+    if not start_times:
+        return
+    duration = time.time() - start_times.pop(-1)
+    _local.statement_count = thread_statement_count() + 1
+    for stats in active_query_stats():
+        stats.record(statement, parameters, duration)
+    for observer in getattr(conn.engine, '_booster_statement_observers', []):
+        observer(conn, cursor, statement, parameters, context, executemany, duration)
+
+
+def instrument_engine(engine):
+    """Attaches the statement recording listeners to `engine`. Calling it
+    more than once on the same engine is a no-op.
+    """
+    if getattr(engine, '_booster_instrumented', False):
+        return engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    engine._booster_instrumented = True
+    engine._booster_statement_observers = []
+    return engine
+
+
+def add_statement_observer(engine, observer):
+    """Registers a callable invoked after every statement executed on
+    `engine` with the arguments of `after_cursor_execute` followed by the
+    duration of the statement in seconds.
+    """
+    instrument_engine(engine)
+    if observer not in engine._booster_statement_observers:
+        engine._booster_statement_observers.append(observer)
+
+
+def add_query_stats_headers(response, stats):
+    response.headers['X-SQL-Statement-Count'] = str(stats.statement_count)
+    response.headers['X-SQL-Total-Time-Ms'] = "%.3f" % (stats.total_time * 1000)
+    suspects = stats.n_plus_one_suspects()
+    if suspects:
+        response.headers['X-SQL-N-Plus-One'] = "; ".join(
+            "%sx %s" % (count, fingerprint[:200])
+            for fingerprint, count in suspects)
+    return response
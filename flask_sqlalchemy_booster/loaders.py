@@ -0,0 +1,116 @@
+"""loaders
+Request scoped, batched lookups of instances by key.
+
+Hooks such as access checkers, pre and post processors and permitted
+object getters run once per row, and a `Model.get` in each of them costs
+one query per row. They can instead use
+
+    >>> loader(User).load(data['user_id'])
+
+which serves instances from a cache kept for the rest of the request and,
+on a miss, fetches all the keys announced so far with `expect` along with
+the missing one using a single `get_all`. The batch save view announces
+the foreign keys of all its input rows before processing the first one,
+so the per row lookups of the hooks it calls cost one query per model.
+The instances it creates are primed in the loaders, so that the hooks of
+later rows find them.
+
+"""
+
+from __future__ import absolute_import
+
+from flask import g, has_app_context
+from sqlalchemy.orm import class_mapper
+from sqlalchemy.orm.interfaces import MANYTOONE
+
+
+class KeyedLoader(object):
+
+    """Looks up instances of `model_class` by the column `key`, caching
+    the results, misses included.
+    """
+
+    def __init__(self, model_class, key='id'):
+        self.model_class = model_class
+        self.key = key
+        self._instances = {}
+        self._expected = []
+
+    def expect(self, *keyvals):
+        """Announces keys to be loaded with the next fetch."""
+        for keyval in keyvals:
+            if keyval is not None and keyval not in self._instances and \
+                    keyval not in self._expected:
+                self._expected.append(keyval)
+
+    def prime(self, keyval, instance):
+        """Caches an instance already at hand."""
+        self._instances[keyval] = instance
+
+    def dispatch(self):
+        """Fetches all the expected keys with one query."""
+        keyvals, self._expected = self._expected, []
+        if keyvals:
+            instances = self.model_class.get_all(keyvals, key=self.key)
+            self._instances.update(zip(keyvals, instances))
+
+    def load(self, keyval):
+        if keyval is None:
+            return None
+        if keyval not in self._instances:
+            self.expect(keyval)
+            self.dispatch()
+        return self._instances.get(keyval)
+
+    def load_many(self, keyvals):
+        self.expect(*keyvals)
+        if self._expected:
+            self.dispatch()
+        return [self._instances.get(keyval) for keyval in keyvals]
+
+    def clear(self, keyval=None):
+        if keyval is None:
+            self._instances.clear()
+        else:
+            self._instances.pop(keyval, None)
+
+
+def loader(model_class, key='id'):
+    """Returns the `KeyedLoader` of `model_class` and `key` for the current
+    request (or app context). Outside a context the loader is not shared.
+    """
+    if not has_app_context():
+        return KeyedLoader(model_class, key=key)
+    loaders = g.setdefault('_booster_loaders', {})
+    if (model_class, key) not in loaders:
+        loaders[(model_class, key)] = KeyedLoader(model_class, key=key)
+    return loaders[(model_class, key)]
+
+
+def prime_loaders(instance):
+    """Caches `instance`, eg. one just created, in the loaders of its class
+    set up for the current request, replacing the misses they may have
+    cached for its keys.
+    """
+    if not has_app_context():
+        return
+    for (model_class, key), keyed_loader in g.get(
+            '_booster_loaders', {}).items():
+        if isinstance(instance, model_class):
+            keyed_loader.prime(getattr(instance, key), instance)
+
+
+def expect_related_keys(model_class, rows):
+    """Announces, to the loader of the target of every many-to-one
+    relationship of `model_class`, the foreign key values found in the
+    input dicts `rows`.
+    """
+    mapper = class_mapper(model_class)
+    for rel in mapper.relationships:
+        if rel.direction is not MANYTOONE or len(rel.local_remote_pairs) != 1:
+            continue
+        local_col, remote_col = rel.local_remote_pairs[0]
+        local_key = mapper.get_property_by_column(local_col).key
+        remote_key = rel.mapper.get_property_by_column(remote_col).key
+        loader(rel.mapper.class_, key=remote_key).expect(*[
+            row.get(local_key) for row in rows if isinstance(row, dict)])
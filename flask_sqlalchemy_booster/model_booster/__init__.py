@@ -2,11 +2,16 @@ from __future__ import absolute_import
 from flask_sqlalchemy import Model
 from sqlalchemy.ext.associationproxy import AssociationProxy, AssociationProxyInstance
 from sqlalchemy.orm import class_mapper
+from sqlalchemy import event
 from toolspy import all_subclasses
 from ..query_booster import QueryBooster
 from .queryable_mixin import QueryableMixin
 from .dictizable_mixin import DictizableMixin
 from ..utils import get_rel_from_key, get_rel_class_from_key, attr_is_a_property
+from ..full_text_search import setup_full_text_search
+from ..prefix_search import setup_prefix_search
+from ..trigram_search import setup_trigram_search
+from ..rollups import setup_rollups
 from sqlalchemy.ext.hybrid import hybrid_property
 import six
 
@@ -17,6 +22,18 @@ class ModelBooster(Model, QueryableMixin, DictizableMixin):
 
     query_class = QueryBooster
 
+    _fulltext_searchable_ = None
+
+    _prefix_searchable_ = None
+
+    _trigram_searchable_ = None
+
+    _cache_fully_ = None
+
+    _entity_cache_ttl_ = None
+
+    _rollups_ = None
+
     def serial_key(self, key):
         return self.__modified_keys__.get(key, key)
 
@@ -186,3 +203,14 @@ class ModelBooster(Model, QueryableMixin, DictizableMixin):
                 subcls.append(sc)
         return subcls
 
+
+@event.listens_for(ModelBooster, 'instrument_class', propagate=True)
+def _setup_model_extensions(mapper, cls):
+    if cls.__dict__.get('_fulltext_searchable_'):
+        setup_full_text_search(mapper, cls)
+    if cls.__dict__.get('_prefix_searchable_'):
+        setup_prefix_search(mapper, cls)
+    if cls.__dict__.get('_trigram_searchable_'):
+        setup_trigram_search(mapper, cls)
+    if cls.__dict__.get('_rollups_'):
+        setup_rollups(mapper, cls)
@@ -15,13 +15,82 @@ from schemalite.core import func_and_desc
 from sqlalchemy.orm import class_mapper
 from sqlalchemy.dialects.mysql import MEDIUMTEXT
 from past.builtins import long
+from contextlib import contextmanager
+import threading
 
 from ..json_columns import JSONEncodedStruct
 from ..json_encoder import json_encoder
+from ..serialization_profiler import current_serialization_profiler, measured
 from ..utils import is_list_like, is_dict_like
 import six
 from six.moves import zip
 
+_memo_local = threading.local()
+
+
+class SerializationMemo(object):
+
+    """Serialized dicts of related instances, keyed by the identity of the
+    instance and the fingerprint of the sub struct it was serialized with.
+    Instances and structs are referenced from the memo so that their ids
+    cannot be reused while it is alive.
+    """
+
+    def __init__(self):
+        self._dicts = {}
+        self._fingerprints = {}
+
+    def fingerprint(self, dict_struct):
+        if dict_struct is None:
+            return None
+        key = id(dict_struct)
+        if key not in self._fingerprints:
+            self._fingerprints[key] = (dict_struct, json.dumps(
+                dict_struct, sort_keys=True, default=str))
+        return self._fingerprints[key][1]
+
+    def serialized(self, instance, dict_struct):
+        key = (id(instance), self.fingerprint(dict_struct))
+        if key not in self._dicts:
+            self._dicts[key] = (
+                instance, instance.todict_using_struct(dict_struct=dict_struct))
+        return self._dicts[key][1]
+
+
+def current_serialization_memo():
+    return getattr(_memo_local, 'memo', None)
+
+
+@contextmanager
+def serialization_memo():
+    """Shares the serialized dicts of related instances across every
+    `todict_using_struct` call made within the block, so that a related
+    instance referenced by many rows is converted once. Nested blocks use
+    the outermost memo.
+    """
+    if current_serialization_memo() is not None:
+        yield current_serialization_memo()
+        return
+    _memo_local.memo = SerializationMemo()
+    try:
+        yield _memo_local.memo
+    finally:
+        _memo_local.memo = None
+
+
+@contextmanager
+def _memo_suspended(suspend=True):
+    # Memoized dicts are shared with other rows, so rows which post
+    # processors are free to mutate are serialized without the memo
+    memo = current_serialization_memo()
+    if suspend:
+        _memo_local.memo = None
+    try:
+        yield
+    finally:
+        _memo_local.memo = memo
+
+
 def serialized_list(olist, rels_to_expand=[]):
     return [o.todict(
             rels_to_expand=rels_to_expand) for o in olist]
@@ -311,6 +380,45 @@ class DictizableMixin(object):
             rels_to_expand=rels_to_expand, rels_to_serialize=rels_to_serialize,
             key_modifications=key_modifications)
 
+    def resolved_dict_struct(self, dict_struct=None):
+        """Returns the dict struct `todict_using_struct` serializes the
+        instance with, filling in the default or autogenerated attrs.
+        """
+        # It is important to assign the passed kwarg to a differently named variable.
+        # A dict is passed by reference and using the same kwarg here results in it
+        # getting mutated - causing unforeseen side effects
+        dict_struct_to_use = (
+            self._dict_struct_ if dict_struct is None
+            else dict_struct)
+        if dict_struct_to_use is None and self._autogenerate_dict_struct_if_none_:
+            dict_struct_to_use = self.autogenerated_dict_structure()
+        elif dict_struct_to_use.get("attrs") is None:
+            rels = dict_struct_to_use.get("rels")
+            dict_struct_to_use = {}
+            dict_struct_to_use["attrs"] = self.autogenerated_dict_structure()["attrs"]
+            if rels is not None:
+                dict_struct_to_use["rels"] = rels
+        return dict_struct_to_use
+
+    def serialized_rel_using_struct(self, rel, rel_dict_struct):
+        rel_obj = getattr(self, rel) if hasattr(self, rel) else None
+        if rel_obj is None:
+            return None
+        memo = current_serialization_memo()
+
+        def serialized(i):
+            if not hasattr(i, 'todict_using_struct'):
+                return i
+            if memo is not None:
+                return memo.serialized(i, rel_dict_struct)
+            return i.todict_using_struct(dict_struct=rel_dict_struct)
+
+        if is_list_like(rel_obj):
+            return [serialized(i) for i in rel_obj]
+        if is_dict_like(rel_obj):
+            return {k: serialized(v) for k, v in six.iteritems(rel_obj)}
+        return serialized(rel_obj)
+
     def todict_using_struct(self, dict_struct=None, dict_post_processors=None):
         """
             dict_struct:
@@ -323,41 +431,29 @@ class DictizableMixin(object):
                 }
             }
         """
-        # It is important to assign the passed kwarg to a differently named variable.
-        # A dict is passed by reference and using the same kwarg here results in it
-        # getting mutated - causing unforeseen side effects
-        dict_struct_to_use = (
-            self._dict_struct_ if dict_struct is None
-            else dict_struct)
-        if dict_struct_to_use is None and self._autogenerate_dict_struct_if_none_:
-            dict_struct_to_use = self.autogenerated_dict_structure()
-        elif dict_struct.get("attrs") is None:
-            dict_struct_to_use = {}
-            dict_struct_to_use["attrs"] = self.autogenerated_dict_structure()["attrs"]
-            if "rels" in dict_struct:
-                dict_struct_to_use["rels"] = dict_struct.get("rels")
-        result = self.serialize_attrs(*dict_struct_to_use.get('attrs', []))
-        for rel, rel_dict_struct in dict_struct_to_use.get('rels', {}).items():
-            rel_obj = getattr(self, rel) if hasattr(self, rel) else None
-            if rel_obj is not None:
-                if is_list_like(rel_obj):
-                    result[rel] = [i.todict_using_struct(dict_struct=rel_dict_struct)
-                                   if hasattr(i, 'todict_using_struct') else i
-                                   for i in rel_obj]
-                elif is_dict_like(rel_obj):
-                    result[rel] = {k: v.todict_using_struct(dict_struct=rel_dict_struct)
-                                   if hasattr(v, 'todict_using_struct') else v
-                                   for k, v in six.iteritems(rel_obj)}
-                else:
-                    result[rel] = rel_obj.todict_using_struct(
-                        dict_struct=rel_dict_struct) if hasattr(
-                        rel_obj, 'todict_using_struct') else rel_obj
-            else:
-                result[rel] = None
+        dict_struct_to_use = self.resolved_dict_struct(dict_struct)
+        profiler = current_serialization_profiler()
+        attrs = dict_struct_to_use.get('attrs', [])
+        if profiler is None:
+            result = self.serialize_attrs(*attrs)
+        else:
+            result = {}
+            for attr in attrs:
+                with profiler.measure(self, 'attr', attr):
+                    result.update(self.serialize_attrs(attr))
+        with _memo_suspended(bool(dict_post_processors)):
+            for rel, rel_dict_struct in dict_struct_to_use.get('rels', {}).items():
+                with measured(profiler, self, 'rel', rel):
+                    result[rel] = self.serialized_rel_using_struct(
+                        rel, rel_dict_struct)
         if isinstance(dict_post_processors, list):
             for dict_post_processor in dict_post_processors:
                 if callable(dict_post_processor):
-                    result = dict_post_processor(result, self)
+                    name = getattr(
+                        dict_post_processor, '__name__',
+                        type(dict_post_processor).__name__)
+                    with measured(profiler, self, 'post_processor', name):
+                        result = dict_post_processor(result, self)
         return result
 
 
@@ -6,7 +6,9 @@ from sqlalchemy.ext.orderinglist import OrderingList
 from sqlalchemy.orm import class_mapper
 import six
 from six.moves import range
-from ..utils import cast_as_column_type
+from ..utils import cast_as_column_type, expanding_in_clause
+from ..full_table_cache import cached_first, cached_lookup
+from ..entity_cache import get_entity, is_entity_cached
 
 
 class QueryableMixin(object):
@@ -341,6 +343,11 @@ class QueryableMixin(object):
             >>> will = User.first(name="Will")
 
         """
+        if not criterion and kwargs and 'limit' not in kwargs and \
+                'reverse' not in kwargs:
+            instance = cached_first(cls, **kwargs)
+            if instance is not None:
+                return instance
         return cls.filter(*criterion, **kwargs).first()
 
     @classmethod
@@ -483,10 +490,15 @@ class QueryableMixin(object):
         """
         if keyval is None:
             return None
+        cached = cached_lookup(cls, [keyval], key=key)
+        if cached is not None:
+            return cached[0]
         if (key in cls.__table__.columns
                 and cls.__table__.columns[key].primary_key):
             # if user_id and hasattr(cls, 'user_id'):
             #     return cls.query.filter_by(id=keyval, user_id=user_id).first()
+            if is_entity_cached(cls):
+                return get_entity(cls, keyval)
             return cls.query.get(keyval)
         else:
             result = cls.query.filter(
@@ -526,13 +538,17 @@ class QueryableMixin(object):
         """
         if len(keyvals) == 0:
             return []
+        cached = cached_lookup(cls, keyvals, key=key)
+        if cached is not None:
+            return cached
         if key is None:
             key = cls.primary_key_name()
         id_attr = getattr(cls, key)
         keyvals = [cast_as_column_type(v, id_attr) for v in keyvals]
         original_keyvals = keyvals
         keyvals_set = list(set(keyvals))
-        resultset = cls.query.filter(id_attr.in_(keyvals_set))
+        resultset = cls.query.filter(
+            expanding_in_clause(id_attr, keyvals_set, session=cls.session))
 
         # We need the results in the same order as the input keyvals
         # So order by field in SQL
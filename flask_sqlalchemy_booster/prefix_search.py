@@ -0,0 +1,94 @@
+"""prefix_search
+The `^` filter operator, a case insensitive prefix match which an index
+can serve (`title^=swi` or `{"k": "title", "op": "^", "v": "swi"}`).
+
+Unlike `~`, which scans every row with `ilike '%value%'`, the prefix match
+is written as a range on `lower(column)`:
+
+    SQLite, others  lower(title) >= 'swi' AND lower(title) < 'swj'
+    PostgreSQL      lower(title) LIKE 'swi%'
+    MySQL           title LIKE 'swi%'
+
+so that autocompletion becomes an index range scan once the model lists
+the column in `_prefix_searchable_`. The booster then creates an index on
+`lower(column)` along with the table (with `text_pattern_ops` on
+PostgreSQL, for `LIKE`). MySQL compares case insensitively by default and
+uses an ordinary index on the column.
+
+"""
+
+from __future__ import absolute_import
+import sys
+
+import six
+from sqlalchemy import DDL, and_, event, func
+
+PREFIX_OPERATOR = '^'
+
+_MAX_CHAR = sys.maxunicode
+
+
+def prefix_searchable_columns(model_cls):
+    return list(getattr(model_cls, '_prefix_searchable_', None) or [])
+
+
+def prefix_index_name(table_name, col_name):
+    return "ix_%s_%s_lower" % (table_name, col_name)
+
+
+def escape_like(value, escape_char='\\'):
+    for special in (escape_char, '%', '_'):
+        value = value.replace(special, escape_char + special)
+    return value
+
+
+def prefix_upper_bound(prefix):
+    """The smallest string greater than every string starting with
+    `prefix`, or None if there is none.
+
+    Examples:
+
+        >>> prefix_upper_bound('swi')
+        'swj'
+
+    """
+    while prefix and ord(prefix[-1]) == _MAX_CHAR:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + six.unichr(ord(prefix[-1]) + 1)
+
+
+def prefix_criterion(col, value, dialect_name=None):
+    """Returns the criterion matching the values of `col` starting with
+    `value`, ignoring case, or None for an empty prefix.
+    """
+    if not value:
+        return None
+    prefix = value.lower()
+    if dialect_name == 'mysql':
+        return col.like(escape_like(prefix) + '%', escape='\\')
+    if dialect_name == 'postgresql':
+        return func.lower(col).like(escape_like(prefix) + '%', escape='\\')
+    lowered = func.lower(col)
+    upper_bound = prefix_upper_bound(prefix)
+    if upper_bound is None:
+        return lowered >= prefix
+    return and_(lowered >= prefix, lowered < upper_bound)
+
+
+def setup_prefix_search(mapper, model_cls):
+    """Registers the DDL creating the `lower(column)` indexes of the
+    columns in `_prefix_searchable_`. Called when a `ModelBooster`
+    subclass declaring it is mapped.
+    """
+    tbl = model_cls.__table__
+    for col_name in prefix_searchable_columns(model_cls):
+        index_name = prefix_index_name(tbl.name, col_name)
+        event.listen(tbl, 'after_create', DDL(
+            "CREATE INDEX IF NOT EXISTS %s ON %s (lower(%s))" % (
+                index_name, tbl.name, col_name)).execute_if(dialect='sqlite'))
+        event.listen(tbl, 'after_create', DDL(
+            "CREATE INDEX IF NOT EXISTS %s ON %s (lower(%s) text_pattern_ops)" % (
+                index_name, tbl.name, col_name)
+        ).execute_if(dialect='postgresql'))
@@ -1,12 +1,23 @@
 from __future__ import absolute_import
-from flask_sqlalchemy import BaseQuery, Pagination
+from flask_sqlalchemy import BaseQuery
+from sqlalchemy.sql.expression import Join
 from six.moves import range
 
+from .utils import expanding_in_clause
+from .query_cache import cached_query_result
+
 
 class QueryBooster(BaseQuery):
 
     cls = None
 
+    # List of (model_class, terms, columns) recorded by full-text filters,
+    # used when the results are ordered by relevance
+    _full_text_searches = None
+
+    # (ttl, key) set by `cached`
+    _cache_options = None
+
     # def __init__(self, *args, **kwargs):
     #     super(QueryBooster, self).__init__(*args, **kwargs)
     #     self.model_class = self._primary_entity.mapper.class_
@@ -35,7 +46,8 @@ class QueryBooster(BaseQuery):
             key = self.mapper_model_class.primary_key_name()
         original_keyvals = keyvals
         keyvals_set = list(set(keyvals))
-        resultset = self.filter(getattr(self.mapper_model_class, key).in_(keyvals_set))
+        resultset = self.filter(expanding_in_clause(
+            getattr(self.mapper_model_class, key), keyvals_set, session=self.session))
         key_result_mapping = {getattr(result, key): result for result in resultset.all()}
         return [key_result_mapping.get(kv) for kv in original_keyvals]
 
@@ -53,6 +65,34 @@ class QueryBooster(BaseQuery):
     #     else:
     #         return self.filter(getattr(self.model_class, key) == keyval).first()
 
+    def with_full_text_search(self, model_class, terms, columns=None):
+        q = self._clone()
+        q._full_text_searches = (self._full_text_searches or []) + [
+            (model_class, terms, columns)]
+        return q
+
+    def cached(self, ttl=None, key=None):
+        """Serves the results of this query from the query cache, see
+        `query_cache`.
+
+        Args:
+
+            ttl (int, optional): Seconds after which the entry expires. The
+                entry is anyway invalidated by writes to the tables read.
+
+            key (str, optional): Namespace for the entry in the store,
+                which is otherwise keyed on the compiled SQL and parameters
+        """
+        q = self._clone()
+        q._cache_options = (ttl, key)
+        return q
+
+    def __iter__(self):
+        if self._cache_options is not None:
+            ttl, key = self._cache_options
+            return iter(cached_query_result(self, ttl=ttl, key=key))
+        return super(QueryBooster, self).__iter__()
+
     def is_joined_with(self, model_class):
         return model_class in [entity.class_ for entity in self._join_entities]
 
@@ -71,14 +111,12 @@ class QueryBooster(BaseQuery):
                 items = self.limit(bucket_size).offset(offset_to_start_from + bucket*bucket_size).all()
                 yield items
 
+    def has_joins(self):
+        return bool(self._join_entities) or any(
+            isinstance(from_obj, Join) for from_obj in self._from_obj)
+
     def paginate(self, *args, **kwargs):
-        pagination = super(QueryBooster, self).paginate(*args, **kwargs)
-        distinct_total = self.order_by(None).distinct().count()
-        items = self.distinct().limit(
-            pagination.per_page).offset(
-            (pagination.page - 1) * pagination.per_page
-            ).all()
-        return Pagination(
-            self, pagination.page, pagination.per_page,
-            distinct_total, items
-        )
+        # Only joins can repeat an instance across rows. Filters on to-many
+        # relationships use EXISTS subqueries and add none.
+        query = self.distinct() if self.has_joins() else self
+        return super(QueryBooster, query).paginate(*args, **kwargs)
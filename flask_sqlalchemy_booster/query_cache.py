@@ -0,0 +1,198 @@
+"""query_cache
+Result caching for `QueryBooster` queries.
+
+    >>> Task.query.filter(Task.user_id == 1).cached(ttl=60).all()
+
+The cache key is derived from the compiled SQL and its bound parameters
+along with the current version of every table the statement reads from.
+Versions are counters bumped whenever a session flushes changes to a
+table (and once more when that session commits), so a cached result is
+never served after its tables have been written through the ORM - stale
+entries simply stop being looked up and age out of the store.
+
+Cached results are detached snapshots (see `snapshots`) which are merged
+into the querying session with `load=False`, without any SQL.
+
+The store is pluggable through `set_query_cache_store` or the
+`SQLALCHEMY_BOOSTER_QUERY_CACHE_STORE` config key. Any object with `get`,
+`set`, `delete` and `incr` methods works, `InMemoryQueryCacheStore` being
+the default.
+
+"""
+
+from __future__ import absolute_import
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+
+from sqlalchemy import event, Table
+from sqlalchemy.orm import Session, object_mapper
+from sqlalchemy.orm.attributes import instance_state
+from sqlalchemy.sql.util import find_tables
+
+from .snapshots import snapshot_rows
+
+QUERY_KEY_PREFIX = 'booster:query:'
+TABLE_VERSION_KEY_PREFIX = 'booster:table_version:'
+
+
+class InMemoryQueryCacheStore(object):
+
+    """Thread safe, process local store evicting the least recently used
+    entries beyond `max_entries`. Counters maintained through `incr` are
+    kept apart and never evicted, since losing a table version would make
+    older entries current again.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.pop(key)
+            self._entries[key] = entry
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (
+                value, time.time() + ttl if ttl is not None else None)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_store = InMemoryQueryCacheStore()
+
+
+def get_query_cache_store():
+    return _store
+
+
+def set_query_cache_store(store):
+    global _store
+    _store = store
+
+
+def table_version(table_name):
+    return _store.get(TABLE_VERSION_KEY_PREFIX + table_name) or 0
+
+
+def bump_table_versions(table_names):
+    for table_name in table_names:
+        _store.incr(TABLE_VERSION_KEY_PREFIX + table_name)
+
+
+def tables_read_by(statement):
+    return sorted(set(
+        t.fullname for t in find_tables(
+            statement, include_aliases=True, include_joins=True)
+        if isinstance(t, Table)))
+
+
+def query_cache_key(query, key=None):
+    """Builds the store key for `query` from its compiled SQL, bound
+    parameters and the versions of the tables it reads, namespaced under
+    the explicit `key` if given.
+    """
+    statement = query.statement
+    bind = query.session.get_bind(mapper=query._bind_mapper())
+    compiled = statement.compile(dialect=bind.dialect)
+    versions = ",".join(
+        "%s:%s" % (t, table_version(t)) for t in tables_read_by(statement))
+    digest = hashlib.sha1(("%s|%r|%s" % (
+        compiled, sorted(compiled.params.items()), versions)).encode('utf-8'))
+    if key is not None:
+        return "%s%s:%s" % (QUERY_KEY_PREFIX, key, digest.hexdigest())
+    return QUERY_KEY_PREFIX + digest.hexdigest()
+
+
+def cached_query_result(query, ttl=None, key=None):
+    """Returns the rows of `query` from the store if present, else runs it
+    and stores snapshots of the rows.
+    """
+    if query._autoflush and not query._populate_existing:
+        # Pending changes must bump the table versions before keying
+        query.session._autoflush()
+    cache_key = query_cache_key(query, key=key)
+    snapshots = _store.get(cache_key)
+    if snapshots is not None:
+        return list(query.merge_result(snapshots, load=False))
+    uncached = query._clone()
+    uncached._cache_options = None
+    rows = list(uncached)
+    _store.set(cache_key, snapshot_rows(rows), ttl=ttl)
+    return rows
+
+
+def _tables_of_instance(session, instance):
+    mapper = object_mapper(instance)
+    table_names = set(t.fullname for t in mapper.tables)
+    for rel in mapper.relationships:
+        if isinstance(rel.secondary, Table) and \
+                instance_state(instance).attrs[rel.key].history.has_changes():
+            table_names.add(rel.secondary.fullname)
+    return table_names
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_versions_of_flushed_tables(session, flush_context):
+    table_names = set()
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        table_names.update(_tables_of_instance(session, instance))
+    if table_names:
+        bump_table_versions(table_names)
+        session.info.setdefault('booster_flushed_tables', set()).update(
+            table_names)
+
+
+def _bump_versions_of_bulk_operation(context):
+    mapper = getattr(context, 'mapper', None)
+    if mapper is not None:
+        table_names = set(t.fullname for t in mapper.tables)
+        bump_table_versions(table_names)
+        context.session.info.setdefault(
+            'booster_flushed_tables', set()).update(table_names)
+
+
+event.listen(Session, 'after_bulk_update', _bump_versions_of_bulk_operation)
+event.listen(Session, 'after_bulk_delete', _bump_versions_of_bulk_operation)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_versions_of_committed_tables(session):
+    # Other sessions may have cached the pre-commit rows between the
+    # flush and the commit
+    bump_table_versions(session.info.pop('booster_flushed_tables', ()))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _bump_versions_of_rolled_back_tables(session):
+    # Results cached within the transaction may hold the discarded rows
+    bump_table_versions(session.info.pop('booster_flushed_tables', ()))
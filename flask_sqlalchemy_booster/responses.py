@@ -14,13 +14,23 @@ from flask_sqlalchemy import Pagination
 import traceback
 from schemalite.core import validate_dict
 from schemalite.validators import is_a_type_of, is_a_list_of_types_of
-from sqlalchemy.orm import class_mapper
+from sqlalchemy.orm import class_mapper, selectin_polymorphic
 from sqlalchemy.orm.query import Query
 from sqlalchemy import or_, and_
 
 from .json_encoder import json_encoder
 from .query_booster import QueryBooster
-from .utils import type_coerce_value
+from .model_booster.dictizable_mixin import serialization_memo
+from . import index_advisor
+from .utils import (
+    type_coerce_value, dialect_name_for_query, expanding_in_clause, is_list_like,
+    is_dict_like)
+from .full_text_search import (
+    FULL_TEXT_SEARCH_KEY, RELEVANCE_ORDERBY_KEY, searchable_columns,
+    full_text_criterion, relevance_order_by)
+from .prefix_search import PREFIX_OPERATOR, prefix_criterion
+from .trigram_search import trigram_criterion
+from .tracing import span, set_span_attributes
 import six
 from six.moves import zip
 
@@ -30,12 +40,30 @@ RESTRICTED = ['limit', 'sort', 'orderby', 'groupby', 'attrs',
 
 PER_PAGE_ITEMS_COUNT = 20
 
-OPERATORS = ['~', '=', '>', '<', '>=', '!', '<=']
+# Values of `_layout` for list responses. The default `rows` layout is a list
+# of dicts, `columnar` gives {"columns": [...], "rows": [[...], ...]} and
+# `column_major` gives {"columns": [...], "values": [[...], ...]} with one
+# list of values per column. `sideloaded` keeps the list of dicts but
+# replaces related objects by references into an `included` section.
+LAYOUT_KEY = '_layout'
+COLUMNAR_LAYOUTS = ['columnar', 'column_major']
+SIDELOADED_LAYOUT = 'sideloaded'
+
+OPERATORS = ['@@', '~', '^', '=', '>', '<', '>=', '!', '<=']
 OPERATOR_FUNC = {
     '~': 'ilike', '=': '__eq__', '>': '__gt__', '<': '__lt__',
     '>=': '__ge__', '<=': '__le__', '!': '__ne__', '!=': '__ne__',
-    'in': 'in_'
+    'in': 'in_', 'not in': 'notin_', 'between': 'between',
+    'is null': 'is_', 'is not null': 'isnot'
+}
+
+# Operators written as a suffix of the key in the query string, eg.
+# `id:in=1,2,3`, `id:notin=4,5`, `created_on:between=2019-01-01,2019-02-01`
+# and `marital_status:isnull=true`
+KEY_SUFFIX_OPERATORS = {
+    'in': 'in', 'notin': 'not in', 'between': 'between', 'isnull': 'is null'
 }
+LIST_VALUED_OPERATORS = ['in', 'not in', 'between']
 
 
 def get_request_json():
@@ -50,13 +78,15 @@ def get_request_args():
 
 
 def json_dump(obj):
-    return _json.dumps(
-        obj,
-        default=json_encoder)
+    with span('encode'):
+        return _json.dumps(
+            obj,
+            default=json_encoder)
 
 
 def json_response(json_string, status=200):
-    return Response(json_string, status, mimetype='application/json')
+    with span('response'):
+        return Response(json_string, status, mimetype='application/json')
 
 
 def serializable_obj(
@@ -102,6 +132,26 @@ def serializable_list(
         key_modifications=None, groupby=None, keyvals_to_merge=None,
         preserve_order=False, dict_struct=None, dict_post_processors=None):
     """
+    Converts a list of model instances to a list of dictionaries, with
+    each related instance shared by several of them serialized once (see
+    `serialization_memo`).
+    """
+    with serialization_memo():
+        return _serializable_list(
+            olist, attrs_to_serialize=attrs_to_serialize,
+            rels_to_expand=rels_to_expand, group_listrels_by=group_listrels_by,
+            rels_to_serialize=rels_to_serialize,
+            key_modifications=key_modifications, groupby=groupby,
+            keyvals_to_merge=keyvals_to_merge, preserve_order=preserve_order,
+            dict_struct=dict_struct, dict_post_processors=dict_post_processors)
+
+
+def _serializable_list(
+        olist, attrs_to_serialize=None, rels_to_expand=None,
+        group_listrels_by=None, rels_to_serialize=None,
+        key_modifications=None, groupby=None, keyvals_to_merge=None,
+        preserve_order=False, dict_struct=None, dict_post_processors=None):
+    """
     Converts a list of model instances to a list of dictionaries
     using their `todict` method.
 
@@ -169,6 +219,172 @@ def serializable_list(
         return result_list
 
 
+def _columnar_plan(obj, dict_struct):
+    cls = type(obj)
+    resolved = obj.resolved_dict_struct(dict_struct)
+    forbidden = cls.attrs_forbidden_for_serialization()
+    attrs = [a for a in resolved.get('attrs', [])
+             if hasattr(cls, a) and a not in forbidden]
+    return attrs, list(resolved.get('rels', {}).items())
+
+
+def _attr_value(obj, attr):
+    val = getattr(obj, attr)
+    return list(val) if is_list_like(val) else val
+
+
+def serializable_columnar(
+        olist, dict_struct=None, dict_post_processors=None, layout='columnar'):
+    """Serializes a list of instances in one of the `COLUMNAR_LAYOUTS`.
+    Values are read straight into the row lists following the serialization
+    plan of each class (the attrs and rels of its resolved dict struct),
+    without building a dict per row. Dict post processors need the dicts,
+    so with them the rows are built from the usual per row dicts.
+    """
+    with serialization_memo():
+        return _serializable_columnar(
+            olist, dict_struct=dict_struct,
+            dict_post_processors=dict_post_processors, layout=layout)
+
+
+def _serializable_columnar(
+        olist, dict_struct=None, dict_post_processors=None, layout='columnar'):
+    plans = {}
+    columns = []
+    for obj in olist:
+        if type(obj) not in plans:
+            plans[type(obj)] = _columnar_plan(obj, dict_struct)
+            attrs, rels = plans[type(obj)]
+            columns.extend(
+                c for c in attrs + [r for r, _ in rels] if c not in columns)
+    if dict_post_processors:
+        dicts = [serialized_obj(
+            o, dict_struct=dict_struct,
+            dict_post_processors=dict_post_processors) for o in olist]
+        for d in dicts:
+            columns.extend(c for c in d if c not in columns)
+        rows = [[d.get(c) for c in columns] for d in dicts]
+    else:
+        positions = {c: i for i, c in enumerate(columns)}
+        rows = []
+        for obj in olist:
+            attrs, rels = plans[type(obj)]
+            row = [None] * len(columns)
+            for attr in attrs:
+                row[positions[attr]] = _attr_value(obj, attr)
+            for rel, rel_dict_struct in rels:
+                row[positions[rel]] = obj.serialized_rel_using_struct(
+                    rel, rel_dict_struct)
+            rows.append(row)
+    if layout == 'column_major':
+        return {"columns": columns,
+                "values": [list(values) for values in zip(*rows)] or [
+                    [] for _ in columns]}
+    return {"columns": columns, "rows": rows}
+
+
+def _dict_struct_rels_from_expand(rels_to_expand):
+    rels = {}
+    for rel in rels_to_expand or []:
+        struct = rels
+        for name in rel.split('.'):
+            struct = struct.setdefault(name, {}).setdefault('rels', {})
+    return rels
+
+
+def serializable_list_with_included(
+        olist, dict_struct=None, rels_to_expand=None,
+        dict_post_processors=None):
+    """Serializes a list of instances with each related instance replaced by
+    a `{"type": <model name>, "id": <primary key>}` reference. Every
+    distinct related instance is serialized once, into the returned
+    `included` dict keyed by model name and primary key. Rels may be given
+    in the dict struct or, failing that, as dotted `rels_to_expand`.
+
+    Returns:
+
+        tuple: The list of row dicts and the `included` dict
+    """
+    if rels_to_expand and not (dict_struct or {}).get('rels'):
+        dict_struct = merge(dict_struct or {}, {
+            'rels': _dict_struct_rels_from_expand(rels_to_expand)})
+    included = {}
+    built = set()
+
+    def reference(obj, rel_dict_struct):
+        if not hasattr(obj, 'todict_using_struct'):
+            return obj
+        type_name = type(obj).__name__
+        pk = obj.primary_key_value()
+        if (type_name, pk, id(rel_dict_struct)) not in built:
+            built.add((type_name, pk, id(rel_dict_struct)))
+            included.setdefault(type_name, {}).setdefault(pk, {}).update(
+                sideloaded_dict(obj, rel_dict_struct))
+        return {"type": type_name, "id": pk}
+
+    def sideloaded_dict(obj, obj_dict_struct):
+        resolved = obj.resolved_dict_struct(obj_dict_struct)
+        result = obj.serialize_attrs(*resolved.get('attrs', []))
+        for rel, rel_dict_struct in resolved.get('rels', {}).items():
+            rel_obj = getattr(obj, rel) if hasattr(obj, rel) else None
+            if rel_obj is None:
+                result[rel] = None
+            elif is_list_like(rel_obj):
+                result[rel] = [reference(i, rel_dict_struct) for i in rel_obj]
+            elif is_dict_like(rel_obj):
+                result[rel] = {k: reference(v, rel_dict_struct)
+                               for k, v in six.iteritems(rel_obj)}
+            else:
+                result[rel] = reference(rel_obj, rel_dict_struct)
+        return result
+
+    rows = []
+    for obj in olist:
+        row = sideloaded_dict(obj, dict_struct)
+        for dict_post_processor in dict_post_processors or []:
+            if callable(dict_post_processor):
+                row = dict_post_processor(row, obj)
+        rows.append(row)
+    return rows, included
+
+
+def dict_struct_with_serialization_params(
+        dict_struct=None, attrs_to_serialize=None, rels_to_expand=None,
+        rels_to_serialize=None):
+    """Folds the `attrs`, `rels` and `expand` serialization params into
+    `dict_struct`, for the layouts which serialize through dict structs
+    only. A rel given as `rel:attr` is serialized with that attr alone.
+    """
+    extra = {}
+    if attrs_to_serialize is not None:
+        extra['attrs'] = list(attrs_to_serialize)
+    rels = dict(
+        (rel, {'attrs': [id_attr]}) for rel, id_attr in rels_to_serialize or [])
+    rels = merge(rels, _dict_struct_rels_from_expand(rels_to_expand))
+    if rels:
+        extra['rels'] = rels
+    if not extra:
+        return dict_struct
+    return merge(dict_struct or {}, extra)
+
+
+def serializable_in_layout(
+        olist, layout, dict_struct=None, rels_to_expand=None,
+        attrs_to_serialize=None, rels_to_serialize=None):
+    """Serializes a list in one of the non default layouts. Returns the
+    structure for the `result` key and a dict of keys to add beside it.
+    """
+    dict_struct = dict_struct_with_serialization_params(
+        dict_struct, attrs_to_serialize=attrs_to_serialize,
+        rels_to_expand=rels_to_expand, rels_to_serialize=rels_to_serialize)
+    if layout == SIDELOADED_LAYOUT:
+        rows, included = serializable_list_with_included(
+            olist, dict_struct=dict_struct)
+        return rows, {'included': included}
+    return serializable_columnar(
+        olist, dict_struct=dict_struct, layout=layout), {}
+
+
 def serialized_list(olist, **kwargs):
     """
     Misnamed. Should be deprecated eventually.
@@ -210,11 +426,11 @@ def jsoned(struct, wrap=True, meta=None, struct_key=None, pre_render_callback=No
         ... '[3, 4, 5]'
 
     """
-    return _json.dumps(
-        structured(
-            struct, wrap=wrap, meta=meta, struct_key=struct_key,
-            pre_render_callback=pre_render_callback),
-        default=json_encoder)
+    output = structured(
+        struct, wrap=wrap, meta=meta, struct_key=struct_key,
+        pre_render_callback=pre_render_callback)
+    with span('encode'):
+        return _json.dumps(output, default=json_encoder)
     # if wrap:
         # output = {'status': 'success', struct_key: struct}
         # if meta:
@@ -238,12 +454,12 @@ def jsoned_list(olist, **kwargs):
 def as_json(
         struct, status=200, wrap=True, meta=None, 
         pre_render_callback=None, struct_key=None):
-    return Response(
-        jsoned(
-            struct, wrap=wrap, meta=meta,
-            pre_render_callback=pre_render_callback,
-            struct_key=struct_key),
-        status, mimetype='application/json')
+    json_string = jsoned(
+        struct, wrap=wrap, meta=meta,
+        pre_render_callback=pre_render_callback,
+        struct_key=struct_key)
+    with span('response'):
+        return Response(json_string, status, mimetype='application/json')
 
 def as_dict(o, attrs_to_serialize=None,
             rels_to_expand=None,
@@ -272,14 +488,16 @@ def as_json_obj(o, attrs_to_serialize=None,
                 groupkeys=None,
                 dict_post_processors=None,
                 meta=None):
-    s_obj = serialized_obj(
-        o, attrs_to_serialize=attrs_to_serialize,
-        rels_to_expand=rels_to_expand,
-        rels_to_serialize=rels_to_serialize,
-        group_listrels_by=group_listrels_by,
-        dict_struct=dict_struct,
-        key_modifications=key_modifications,
-        dict_post_processors=dict_post_processors)
+    with span('serialize') as serialize_span:
+        set_span_attributes(serialize_span, model=type(o), rows=[o])
+        s_obj = serialized_obj(
+            o, attrs_to_serialize=attrs_to_serialize,
+            rels_to_expand=rels_to_expand,
+            rels_to_serialize=rels_to_serialize,
+            group_listrels_by=group_listrels_by,
+            dict_struct=dict_struct,
+            key_modifications=key_modifications,
+            dict_post_processors=dict_post_processors)
     return as_json(s_obj, meta=meta)
 
 
@@ -313,16 +531,32 @@ def as_json_list(olist, attrs_to_serialize=None,
                  preserve_order=False,
                  keyvals_to_merge=None,
                  dict_post_processors=None,
-                 meta=None, pre_render_callback=None):
-    return as_json(serializable_list(
-        olist, attrs_to_serialize=attrs_to_serialize,
-        rels_to_expand=rels_to_expand, rels_to_serialize=rels_to_serialize,
-        group_listrels_by=group_listrels_by,
-        key_modifications=key_modifications,
-        groupby=groupby, keyvals_to_merge=keyvals_to_merge,
-        dict_struct=dict_struct,
-        preserve_order=preserve_order,
-        dict_post_processors=dict_post_processors), meta=meta, pre_render_callback=pre_render_callback)
+                 meta=None, pre_render_callback=None, layout=None):
+    with span('serialize') as serialize_span:
+        set_span_attributes(serialize_span, rows=olist)
+        if layout in COLUMNAR_LAYOUTS and not groupby:
+            struct = serializable_columnar(
+                olist, dict_struct=dict_struct_with_serialization_params(
+                    dict_struct, attrs_to_serialize=attrs_to_serialize,
+                    rels_to_expand=rels_to_expand,
+                    rels_to_serialize=rels_to_serialize),
+                dict_post_processors=dict_post_processors, layout=layout)
+        elif layout == SIDELOADED_LAYOUT and not groupby:
+            struct, included = serializable_list_with_included(
+                olist, dict_struct=dict_struct, rels_to_expand=rels_to_expand,
+                dict_post_processors=dict_post_processors)
+            meta = merge(meta or {}, {'included': included})
+        else:
+            struct = serializable_list(
+                olist, attrs_to_serialize=attrs_to_serialize,
+                rels_to_expand=rels_to_expand, rels_to_serialize=rels_to_serialize,
+                group_listrels_by=group_listrels_by,
+                key_modifications=key_modifications,
+                groupby=groupby, keyvals_to_merge=keyvals_to_merge,
+                dict_struct=dict_struct,
+                preserve_order=preserve_order,
+                dict_post_processors=dict_post_processors)
+    return as_json(struct, meta=meta, pre_render_callback=pre_render_callback)
 
 
 def appropriate_json(olist, **kwargs):
@@ -539,15 +773,103 @@ def return_joined_query_model_class_and_attr_name(query, keyword):
     return (_query, model_class, attr_name)
 
 
+def relationship_path_for_key(model_class, keyword):
+    """Resolves a (possibly dotted) filter key naming relationships and
+    association proxies into the relationship attributes it traverses.
+
+    Returns:
+
+        tuple: The list of relationship attributes, the model class and
+            attr name at the end of the path, or None if the key is not
+            such a path
+    """
+    names = keyword.split('.')
+    attr_name = names.pop()
+    path = []
+
+    def proxy_steps(model_class, proxy_name):
+        assoc_proxy = getattr(model_class, proxy_name)
+        target_rel = getattr(model_class, assoc_proxy.target_collection)
+        return target_rel, target_rel.property.mapper.class_, assoc_proxy.value_attr
+
+    for name in names:
+        if name in model_class.relationship_keys():
+            rel = getattr(model_class, name)
+            path.append(rel)
+            model_class = rel.property.mapper.class_
+        elif name in model_class.association_proxy_keys():
+            target_rel, model_class, value_attr = proxy_steps(model_class, name)
+            if value_attr not in model_class.relationship_keys():
+                return None
+            value_rel = getattr(model_class, value_attr)
+            path.extend([target_rel, value_rel])
+            model_class = value_rel.property.mapper.class_
+        else:
+            return None
+    counter = 0  # to prevent infinite loop by some mistake
+    while attr_name in model_class.association_proxy_keys() and counter < 10:
+        counter += 1
+        target_rel, model_class, attr_name = proxy_steps(model_class, attr_name)
+        path.append(target_rel)
+    if not path:
+        return None
+    return path, model_class, attr_name
+
+
+def exists_clause(path, clause):
+    """Wraps `clause` on the last class of a relationship path into nested
+    `any()` / `has()` (EXISTS) criteria on the first one.
+    """
+    for rel in reversed(path):
+        clause = rel.any(clause) if rel.property.uselist else rel.has(clause)
+    return clause
+
+
+def operator_clause(attr, op, value, session=None):
+    if op in ('in', 'not in'):
+        return expanding_in_clause(
+            attr, value, negate=(op == 'not in'), session=session)
+    if op == 'between':
+        return attr.between(*value)
+    if op in ('is null', 'is not null'):
+        return getattr(attr, OPERATOR_FUNC[op])(None)
+    if op == PREFIX_OPERATOR:
+        return prefix_criterion(attr, value, dialect_name=session.get_bind(
+            mapper=class_mapper(attr.class_)).dialect.name
+            if session is not None else None)
+    return getattr(attr, OPERATOR_FUNC[op])(value)
+
+
 def modify_query_and_get_filter_function(query, keyword, value, op):
     # print(
     #     "in modify_query_and_get_filter_function ",
     #     query, keyword, value, op)
-    _query, model_class, attr_name = return_joined_query_model_class_and_attr_name(query, keyword)
+    # Keys traversing a to-many relationship are filtered with EXISTS
+    # subqueries rather than joins, so the query keeps returning one row
+    # per instance
+    rel_path = None
+    if op != '@@' and getattr(query, 'model_class', None) is not None and \
+            keyword.split('.')[0] in query.model_class.all_keys():
+        rel_path = relationship_path_for_key(query.model_class, keyword)
+        if rel_path is not None and not (
+                any(rel.property.uselist for rel in rel_path[0]) and
+                hasattr(rel_path[1], rel_path[2])):
+            rel_path = None
+    if rel_path is not None:
+        path, model_class, attr_name = rel_path
+        _query = query
+    else:
+        _query, model_class, attr_name = return_joined_query_model_class_and_attr_name(query, keyword)
     # print("in modify query, model_class ", model_class)
     # print("in modify query, attr_name ", attr_name)
     # print("in modify query, count ", _query.count())
 
+    index_advisor.note_filter(model_class, attr_name, op)
+
+    if op == '@@':
+        return modify_query_and_get_full_text_filter(
+            query, _query, model_class, attr_name, value)
+
     columns = getattr(
         getattr(model_class, '__mapper__'),
         'columns')
@@ -555,7 +877,9 @@ def modify_query_and_get_filter_function(query, keyword, value, op):
     if attr_name in columns:
         column_type = type(
             columns[attr_name].type)
+    trigram_filter = None
     if op == '~':
+        trigram_filter = trigram_criterion(model_class, attr_name, value)
         value = "%{0}%".format(value)
     if op in ['=', '>', '<', '>=', '<=', '!', '!=']:
         if attr_name in columns:
@@ -564,14 +888,22 @@ def modify_query_and_get_filter_function(query, keyword, value, op):
                 #     value = None
                 # else:
                 value = type_coerce_value(column_type, value)
-    elif op == 'in':
+    elif op in LIST_VALUED_OPERATORS:
         value = [type_coerce_value(column_type, v) for v in value]
+        if op == 'between' and len(value) != 2:
+            raise ValueError("between needs exactly two values")
 
     # print("in modify_query, value ", value)
 
-    if hasattr(model_class, attr_name):
-        return (_query, getattr(
-            getattr(model_class, attr_name), OPERATOR_FUNC[op])(value))
+    if rel_path is not None or hasattr(model_class, attr_name):
+        clause = operator_clause(
+            getattr(model_class, attr_name), op, value, session=_query.session)
+        if trigram_filter is not None:
+            # The trigrams narrow the rows down, the ilike checks them
+            clause = and_(trigram_filter, clause)
+        if rel_path is not None:
+            clause = exists_clause(path, clause)
+        return (_query, clause)
     else:
         subcls_filters = []
         for subcls in all_subclasses(model_class):
@@ -580,11 +912,9 @@ def modify_query_and_get_filter_function(query, keyword, value, op):
                     if not _query.is_joined_with(subcls):
                         _query = _query.join(subcls)
                 subcls_filters.append(
-                    getattr(
-                        getattr(subcls, attr_name),
-                        OPERATOR_FUNC[op]
-                    )(value)
-                )
+                    operator_clause(
+                        getattr(subcls, attr_name), op, value,
+                        session=_query.session))
             # print "adding filter to subcls filters ", subcls, attr_name, value
         if len(subcls_filters) > 0:
             return (_query, or_(*subcls_filters))
@@ -592,6 +922,25 @@ def modify_query_and_get_filter_function(query, keyword, value, op):
         return (query, None)
 
 
+def modify_query_and_get_full_text_filter(query, _query, model_class, attr_name, value):
+    if attr_name == FULL_TEXT_SEARCH_KEY:
+        columns = searchable_columns(model_class)
+    else:
+        columns = [attr_name]
+    if len(columns) == 0 or not all(hasattr(model_class, c) for c in columns):
+        return (query, None)
+    if all(c in searchable_columns(model_class) for c in columns):
+        dialect_name = dialect_name_for_query(_query, model_class)
+    else:
+        # Columns outside the full-text index can only be scanned
+        dialect_name = None
+    criterion = full_text_criterion(
+        model_class, value, columns=columns, dialect_name=dialect_name)
+    if criterion is None:
+        return (query, None)
+    return (_query.with_full_text_search(model_class, value, columns), criterion)
+
+
 def filter_query_with_key(query, keyword, value, op):
     _query, filter_func = modify_query_and_get_filter_function(
         query, keyword, value, op)
@@ -616,7 +965,7 @@ def convert_filters_to_sqlalchemy_filter(query, filters, connector):
         else:
             # print("calling modify_query")
             query, sqfilter = modify_query_and_get_filter_function(
-                query, f["k"], f["v"], f["op"])
+                query, f["k"], f.get("v"), f["op"])
 
             sqfilters.append(sqfilter)
     # print("found sqfilters list as ", sqfilters)
@@ -628,6 +977,113 @@ def convert_filters_to_sqlalchemy_filter(query, filters, connector):
     return (query, None)
 
 
+def _request_filters_list():
+    if '_f' not in request.args:
+        return []
+    filters = _json.loads(request.args['_f'])
+    if isinstance(filters, str) or isinstance(filters, six.text_type):
+        filters = _json.loads(filters)
+    flattened = []
+    pending = [filters]
+    while pending:
+        f = pending.pop()
+        if 'f' in f:
+            pending.extend(f['f'])
+        elif 'k' in f:
+            flattened.append((f['k'], f.get('op'), f.get('v')))
+    return flattened
+
+
+def _arg_filter_key(kw):
+    """The key a query string filter argument applies to, without its
+    operator.
+    """
+    key, _, suffix = kw.rpartition(':')
+    if not (key and suffix in KEY_SUFFIX_OPERATORS):
+        key = kw.rstrip('=<>!~^@')
+    return key
+
+
+def _request_filter_keys():
+    keys = []
+    for kw in request.args:
+        if kw in RESTRICTED or kw.startswith('_'):
+            continue
+        keys.append(_arg_filter_key(kw))
+    keys.extend(k for k, _, _ in _request_filters_list())
+    if request.args.get('orderby'):
+        keys.append(request.args['orderby'])
+    return keys
+
+
+def _requested_polymorphic_identities(mapper):
+    """Returns the discriminator values the request filters on with `=` or
+    `in`, or None when it does not filter on the discriminator.
+    """
+    key = mapper.get_property_by_column(mapper.polymorphic_on).key
+    identities = None
+    if request.args.get(key):
+        identities = [request.args[key]]
+    elif request.args.get(key + ':in'):
+        identities = request.args[key + ':in'].split(',')
+    for k, op, v in _request_filters_list():
+        if k == key and op == '=':
+            identities = [v]
+        elif k == key and op == 'in':
+            identities = list(v)
+    return identities
+
+
+def _requested_attrs():
+    params = _serializable_params(request.args)
+    if 'attrs_to_serialize' in params:
+        return params['attrs_to_serialize']
+    if 'attrs' in (params.get('dict_struct') or {}):
+        return params['dict_struct']['attrs']
+    return None
+
+
+def polymorphic_query_for_request(model_class):
+    """Builds the query for a polymorphic model, outer joining only the
+    subclass tables whose columns the request filters, sorts or (when it
+    names the attrs to serialize) renders. When the attrs are not named,
+    the columns of the remaining subclasses are loaded with one `IN` query
+    per subclass present in the results (selectin polymorphic loading).
+    A filter on the discriminator limits both to the requested types.
+    """
+    mapper = class_mapper(model_class)
+    subclasses = [
+        m.class_ for m in mapper.self_and_descendants
+        if m is not mapper and m.local_table is not mapper.local_table]
+    identities = _requested_polymorphic_identities(mapper)
+    if identities is not None:
+        identities = [six.text_type(i) for i in identities]
+        subclasses = [
+            c for c in subclasses
+            if six.text_type(class_mapper(c).polymorphic_identity) in identities]
+    base_keys = set(mapper.column_attrs.keys())
+
+    def owners_of(keys):
+        keys = [k for k in keys if k not in base_keys]
+        return [
+            c for c in subclasses
+            if any(k in class_mapper(c).column_attrs for k in keys)]
+
+    joined = owners_of(k.split('.')[0] for k in _request_filter_keys())
+    attrs = _requested_attrs()
+    if attrs is not None:
+        joined += [c for c in owners_of(attrs) if c not in joined]
+        selectin = []
+    else:
+        selectin = [c for c in subclasses if c not in joined]
+    query = model_class.query
+    if joined:
+        query = query.with_polymorphic(joined)
+    if selectin:
+        query = query.options(selectin_polymorphic(model_class, selectin))
+    return query
+
+
 def filter_query_using_filters_list(result, filters_dict):
     """
     filters = {
@@ -664,7 +1120,7 @@ def filter_query_using_filters_list(result, filters_dict):
     if not (isinstance(result, Query) or isinstance(result, QueryBooster)):
         if isinstance(result, DefaultMeta) and class_mapper(
                 result).polymorphic_on is not None:
-            result = result.query.with_polymorphic('*')
+            result = polymorphic_query_for_request(result)
         else:
             result = result.query
     filters = filters_dict['f']
@@ -689,11 +1145,23 @@ def filter_query_using_args(result, args_to_skip=[]):
     if not (isinstance(result, Query) or isinstance(result, QueryBooster)):
         if isinstance(result, DefaultMeta) and class_mapper(
                 result).polymorphic_on is not None:
-            result = result.query.with_polymorphic('*')
+            result = polymorphic_query_for_request(result)
         else:
             result = result.query
     for kw in request.args:
         if kw not in args_to_skip:
+            key, _, suffix = kw.rpartition(':')
+            if key and suffix in KEY_SUFFIX_OPERATORS:
+                op = KEY_SUFFIX_OPERATORS[suffix]
+                value = request.args.get(kw)
+                if op == 'is null':
+                    if not boolify(value):
+                        op = 'is not null'
+                    value = None
+                else:
+                    value = value.split(',') if value else []
+                result = filter_query_with_key(result, key, value, op)
+                continue
             for op in OPERATORS:
                 if kw.endswith(op):
                     result = filter_query_with_key(
@@ -714,9 +1182,49 @@ def filter_query_using_args(result, args_to_skip=[]):
     return result
 
 
+def request_equality_filters(args_to_skip=[]):
+    """Returns the filters of the current request as (key, values) pairs
+    when all of them are plain `key=value` or `key:in=v1,v2` query string
+    filters, or None otherwise.
+    """
+    if '_f' in request.args:
+        return None
+    filters = []
+    for kw in request.args:
+        if kw in RESTRICTED or kw in args_to_skip:
+            continue
+        value = request.args.get(kw)
+        key, _, suffix = kw.rpartition(':')
+        if key and suffix == 'in':
+            filters.append((key, value.split(',') if value else []))
+        elif kw.startswith('_') or ':' in kw or any(
+                kw.endswith(op) or value.startswith(op) for op in OPERATORS):
+            return None
+        elif value.lower() in ('none', 'null') or value.strip() == '':
+            filters.append((kw, [None]))
+        else:
+            filters.append((kw, [value]))
+    return filters
+
+
+def filter_query_using_request(q, args_to_skip=[]):
+    """Applies both the `_f` filters list and the plain query string
+    filters of the current request to `q` (a query or a model class).
+    """
+    with span('filter') as filter_span:
+        set_span_attributes(filter_span, model=q)
+        if '_f' in request.args:
+            filters = _json.loads(request.args['_f'])
+            if isinstance(filters, str) or isinstance(filters, six.text_type):
+                filters = _json.loads(filters)
+            q = filter_query_using_filters_list(q, filters)
+        return filter_query_using_args(q, args_to_skip=args_to_skip)
+
+
 def fetch_results_in_requested_format(
         result, default_limit=None, default_sort=None, default_orderby=None,
-        default_offset=None, default_page=None, default_per_page=None):
+        default_offset=None, default_page=None, default_per_page=None,
+        max_per_page=None):
     limit = request.args.get('limit', default_limit)
     sort = request.args.get('sort', default_sort)
     orderby = request.args.get('orderby') or default_orderby or 'id'
@@ -724,26 +1232,45 @@ def fetch_results_in_requested_format(
     offset = request.args.get('offset', None) or default_offset
     page = request.args.get('page', None) or default_page
     per_page = request.args.get('per_page') or default_per_page or PER_PAGE_ITEMS_COUNT
-
-    if sort:
+    if max_per_page is not None:
+        per_page = min(int(per_page), max_per_page)
+
+    if orderby == RELEVANCE_ORDERBY_KEY:
+        searches = [
+            (terms, columns) for model_class, terms, columns
+            in (getattr(result, '_full_text_searches', None) or [])
+            if model_class is result.model_class]
+        if searches:
+            relevance = relevance_order_by(
+                result.model_class, searches,
+                dialect_name=dialect_name_for_query(result),
+                descending=(sort or 'desc') == 'desc')
+            if relevance is not None:
+                result = result.order_by(relevance)
+    elif sort:
         result, model_class, attr_name = return_joined_query_model_class_and_attr_name(result, orderby)
+        index_advisor.note_sort(model_class, attr_name)
         attr = getattr(model_class, attr_name)
         if sort == 'asc':
             result = result.order_by(attr.asc())
         elif sort == 'desc':
             result = result.order_by(attr.desc())
-    if page:
-        try:
-            pagination = result.paginate(int(page), int(per_page))
-        except:
-            raise Exception("PAGE_NOT_FOUND")
-        return pagination
-    else:
-        if limit:
-            result = result.limit(limit)
-        if offset:
-            result = result.offset(int(offset) - 1)
-        result = result.all()
+    with span('query') as query_span:
+        set_span_attributes(query_span, model=result)
+        if page:
+            try:
+                pagination = result.paginate(int(page), int(per_page))
+            except:
+                raise Exception("PAGE_NOT_FOUND")
+            set_span_attributes(query_span, rows=pagination)
+            return pagination
+        else:
+            if limit:
+                result = result.limit(limit)
+            if offset:
+                result = result.offset(int(offset) - 1)
+            result = result.all()
+        set_span_attributes(query_span, rows=result)
     return result
 
 
@@ -751,7 +1278,8 @@ def convert_result_to_response_structure(
         result, meta={}, attrs_to_serialize=None, rels_to_expand=None,
         rels_to_serialize=None, group_listrels_by=None,
         dict_struct=None,
-        preserve_order=None, groupby=None):
+        preserve_order=None, groupby=None, layout=None):
+    layout = request.args.get(LAYOUT_KEY) or layout
     params_to_be_serialized = params_for_serialization(
         attrs_to_serialize=attrs_to_serialize, rels_to_expand=rels_to_expand,
         rels_to_serialize=rels_to_serialize,
@@ -761,7 +1289,7 @@ def convert_result_to_response_structure(
         check_groupby=True)
     if isinstance(result, Pagination):
         page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', PER_PAGE_ITEMS_COUNT ))
+        per_page = result.per_page
         if result.total != 0 and int(page) > result.pages:
             return {
                 "status": "failure",
@@ -778,9 +1306,28 @@ def convert_result_to_response_structure(
         }
         if isinstance(meta, dict) and len(list(meta.keys())) > 0:
             pages_meta = merge(pages_meta, meta)
+        if layout in COLUMNAR_LAYOUTS + [SIDELOADED_LAYOUT]:
+            struct, extra_meta = serializable_in_layout(
+                result.items, layout,
+                dict_struct=params_to_be_serialized.get('dict_struct'),
+                rels_to_expand=params_to_be_serialized.get('rels_to_expand'),
+                attrs_to_serialize=params_to_be_serialized.get(
+                    'attrs_to_serialize'),
+                rels_to_serialize=params_to_be_serialized.get(
+                    'rels_to_serialize'))
+            return structured(struct, meta=merge(pages_meta, extra_meta))
         return structured(
             serializable_list(result.items, **params_to_be_serialized),
             meta=pages_meta)
+    if layout in COLUMNAR_LAYOUTS + [SIDELOADED_LAYOUT] and \
+            not params_to_be_serialized.get('groupby'):
+        struct, extra_meta = serializable_in_layout(
+            result, layout,
+            dict_struct=params_to_be_serialized.get('dict_struct'),
+            rels_to_expand=params_to_be_serialized.get('rels_to_expand'),
+            attrs_to_serialize=params_to_be_serialized.get('attrs_to_serialize'),
+            rels_to_serialize=params_to_be_serialized.get('rels_to_serialize'))
+        return structured(struct, meta=merge(meta or {}, extra_meta))
     if isinstance(meta, dict) and len(list(meta.keys())) > 0:
         kwargs = merge(params_to_be_serialized, {'meta': meta})
     else:
@@ -799,7 +1346,9 @@ def decide_status_code_for_response(obj):
 
 
 def convert_result_to_response(result, **kwargs):
-    obj = convert_result_to_response_structure(result, **kwargs)
+    with span('serialize') as serialize_span:
+        set_span_attributes(serialize_span, rows=result)
+        obj = convert_result_to_response_structure(result, **kwargs)
     return json_response(json_dump(obj), status=decide_status_code_for_response(obj))
 
 
@@ -830,21 +1379,14 @@ def template_response_from_obj(
 
 def process_args_and_fetch_rows(
         q, default_limit=None, default_sort=None, default_orderby=None,
-        default_offset=None, default_page=None, default_per_page=None):
+        default_offset=None, default_page=None, default_per_page=None,
+        max_per_page=None):
 
     if isinstance(q, Response):
         return q
 
-    if '_f' in request.args:
-        filters = _json.loads(request.args['_f'])
-        if isinstance(filters, str) or isinstance(filters, six.text_type):
-            filters = _json.loads(filters)
-        # print("filters are ", filters)
-        q = filter_query_using_filters_list(q, filters)
-        # print("after applying filters")
-        # print(str(q))
-
-    filtered_query = filter_query_using_args(q)
+    filtered_query = filter_query_using_request(
+        q, args_to_skip=[LAYOUT_KEY])
 
     count_only = boolify(request.args.get('count_only', 'false'))
     if count_only:
@@ -857,7 +1399,8 @@ def process_args_and_fetch_rows(
         default_orderby=default_orderby,
         default_offset=default_offset,
         default_page=default_page,
-        default_per_page=default_per_page
+        default_per_page=default_per_page,
+        max_per_page=max_per_page
     )
     return result
 
@@ -867,13 +1410,8 @@ def process_args_and_render_json_list(q, **kwargs):
     if isinstance(q, Response):
         return q
 
-    if '_f' in request.args:
-        filters = _json.loads(request.args['_f'])
-        if isinstance(filters, str) or isinstance(filters, six.text_type):
-            filters = _json.loads(filters)
-        q = filter_query_using_filters_list(q, filters)
-
-    filtered_query = filter_query_using_args(q)
+    filtered_query = filter_query_using_request(
+        q, args_to_skip=[LAYOUT_KEY])
 
     count_only = boolify(request.args.get('count_only', 'false'))
     if count_only:
@@ -0,0 +1,455 @@
+"""rollups
+Companion tables holding counts (and sums) of a model's rows per group
+and time bucket, kept up to date on every flush.
+
+    class Task(db.Model):
+        _rollups_ = {
+            'per_user_day': {
+                'group': ['user_id'], 'time_col': 'created_on',
+                'bucket': 'day', 'aggs': ['count', 'sum:duration']}
+        }
+
+adds the table `task_rollup_per_user_day` with the columns `user_id`,
+`bucket` (the UTC start of the day, null for rows without `created_on`),
+`count` and `sum_duration`, created along with the model's table. Each
+flush adds the rows it inserts, removes the ones it deletes and moves the
+updated ones across groups and buckets with one `UPDATE` per group and
+bucket touched. The first row of a group and bucket is inserted with the
+dialect's upsert, so that two transactions starting the same group and
+bucket add up rather than fail. Only additive aggregates, `count` and
+`sum`, can be rolled up.
+
+Every write to the model updates the rollup row of its group and bucket,
+which stays locked until the transaction ends. Writes falling in the same
+group and bucket (eg. the current hour of a busy page) hence wait on each
+other, so rollups suit models which are not written to concurrently at a
+high rate within a group.
+
+The `aggregate` and `timeseries` views read a rollup instead of the
+model's table when it can answer the request: every filter is a plain
+`key=value` or `key:in=...` filter on a group column, the requested
+groups are among its group columns and the aggregates among its own, and,
+for time series, the bucket is the rollup's or a coarser one whose
+boundaries (given the requested timezone) fall on the rollup's. The rows
+of mapped subclasses are counted in the rollups of the model, which hence
+only answer requests on the model itself.
+
+Bulk `query.update()` and `query.delete()` bypass the flush and hence the
+rollups. `backfill_rollup`, also available as the `booster-rollup-backfill`
+command, rebuilds a rollup from the model's table, a range of primary keys
+at a time. It is meant to be run while the table is not being written to.
+
+"""
+
+from __future__ import absolute_import
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime
+
+import click
+import dateutil.parser
+from dateutil.tz import tzutc
+import six
+from sqlalchemy import (
+    Column, DateTime, Index, Integer, Table, and_, event, func, or_)
+from sqlalchemy.dialects import mysql, postgresql
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, class_mapper
+from sqlalchemy.orm.base import instance_state
+
+from .query_cache import bump_table_versions
+from .utils import (
+    TIME_BUCKETS, time_bucket, truncate_to_bucket, type_coerce_value)
+
+ROLLUP_AGGREGATES = ('count', 'sum')
+
+ROLLUP_BACKFILL_BUCKET_SIZE = 10000
+
+# The buckets which can be summed up from each rollup bucket
+COARSER_BUCKETS = {
+    'minute': TIME_BUCKETS,
+    'hour': ['hour', 'day', 'week', 'month', 'year'],
+    'day': ['day', 'week', 'month', 'year'],
+    'week': ['week'],
+    'month': ['month', 'year'],
+    'year': ['year']
+}
+
+BUCKET_COLUMN = 'bucket'
+
+# Model class name to its rollups, for the backfill command
+_rollups_by_model_name = {}
+
+
+def _utc_naive(value):
+    if value is None:
+        return None
+    if isinstance(value, six.string_types):
+        value = dateutil.parser.parse(value)
+    elif isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is not None:
+        value = value.astimezone(tzutc()).replace(tzinfo=None)
+    return value
+
+
+class Rollup(object):
+
+    """A rollup of `model_class` declared under `name` in its
+    `_rollups_`, along with its table.
+    """
+
+    def __init__(self, model_class, name, group=None, time_col=None,
+                 bucket='day', aggs=None):
+        self.model_class = model_class
+        self.name = name
+        self.group = list(group or [])
+        self.time_col = time_col
+        self.bucket = bucket
+        if time_col and bucket not in TIME_BUCKETS:
+            raise ValueError("UNKNOWN_TIME_BUCKET: %s" % bucket)
+        self.sum_keys = []
+        for spec in aggs or ['count']:
+            fn_name, _, key = spec.partition(':')
+            if fn_name not in ROLLUP_AGGREGATES:
+                raise ValueError("NON_ADDITIVE_ROLLUP_AGGREGATE: %s" % spec)
+            if fn_name == 'sum':
+                if not key:
+                    raise ValueError("AGGREGATE_COLUMN_MISSING: sum")
+                self.sum_keys.append(key)
+        self.key_columns = self.group + (
+            [BUCKET_COLUMN] if time_col else [])
+        # The count is always kept, to know when a group becomes empty
+        self.measure_columns = ['count'] + [
+            self.sum_column(key) for key in self.sum_keys]
+        self.attr_keys = self.group + (
+            [time_col] if time_col else []) + self.sum_keys
+        self.table = self._build_table()
+
+    @staticmethod
+    def sum_column(key):
+        return "sum_%s" % key
+
+    def _model_column(self, key):
+        return self.model_class.__table__.c[key]
+
+    def _build_table(self):
+        tbl = self.model_class.__table__
+        name = "%s_rollup_%s" % (tbl.name, self.name)
+        columns = [Column('id', Integer, primary_key=True)]
+        columns.extend(
+            Column(key, self._model_column(key).type) for key in self.group)
+        if self.time_col:
+            columns.append(Column(BUCKET_COLUMN, DateTime))
+        columns.append(Column('count', Integer, nullable=False, default=0))
+        columns.extend(
+            Column(self.sum_column(key), self._model_column(key).type,
+                   nullable=False, default=0)
+            for key in self.sum_keys)
+        rollup_table = Table(name, tbl.metadata, *columns)
+        if self.key_columns:
+            Index("uq_%s" % name, *[
+                rollup_table.c[c] for c in self.key_columns], unique=True)
+        return rollup_table
+
+    def key_and_measures(self, values):
+        """Converts the model attribute values of a row to its key in the
+        rollup table and the amounts it contributes there.
+        """
+        key = tuple(values[k] for k in self.group)
+        if self.time_col:
+            moment = _utc_naive(values[self.time_col])
+            key += (truncate_to_bucket(moment, self.bucket)
+                    if moment is not None else None, )
+        return key, [1] + [values[k] or 0 for k in self.sum_keys]
+
+    def _match(self, key):
+        return [
+            self.table.c[col].is_(None) if value is None
+            else self.table.c[col] == value
+            for col, value in zip(self.key_columns, key)]
+
+    def apply_deltas(self, connection, deltas):
+        """Adds the amounts in `deltas`, a dict of rollup keys to lists of
+        amounts in the order of `measure_columns`, to the rollup table.
+        """
+        t = self.table
+        for key, changes in deltas.items():
+            if not any(changes):
+                continue
+            result = self._add(connection, key, changes)
+            if not result.rowcount:
+                self._insert_or_add(connection, key, changes)
+            elif changes[0] < 0:
+                connection.execute(t.delete().where(
+                    and_(t.c.count <= 0, *self._match(key))))
+
+    def _insert_or_add(self, connection, key, changes):
+        """Inserts the row of `key`, or adds `changes` to it when another
+        transaction has inserted it in the meantime.
+        """
+        t = self.table
+        values = dict(
+            zip(self.key_columns, key),
+            **dict(zip(self.measure_columns, changes)))
+        dialect_name = connection.dialect.name
+        if dialect_name == 'postgresql' and self.key_columns:
+            stmt = postgresql.insert(t).values(values)
+            connection.execute(stmt.on_conflict_do_update(
+                index_elements=self.key_columns, set_={
+                    col: t.c[col] + stmt.excluded[col]
+                    for col in self.measure_columns}))
+        elif dialect_name == 'mysql' and self.key_columns:
+            stmt = mysql.insert(t).values(values)
+            connection.execute(stmt.on_duplicate_key_update({
+                col: t.c[col] + stmt.inserted[col]
+                for col in self.measure_columns}))
+        elif dialect_name == 'sqlite':
+            result = connection.execute(
+                t.insert().prefix_with('OR IGNORE').values(values))
+            if not result.rowcount:
+                self._add(connection, key, changes)
+        else:
+            try:
+                with connection.begin_nested():
+                    connection.execute(t.insert().values(values))
+            except IntegrityError:
+                self._add(connection, key, changes)
+
+    def _add(self, connection, key, changes):
+        t = self.table
+        return connection.execute(t.update().where(and_(*self._match(key))).values({
+            col: t.c[col] + change
+            for col, change in zip(self.measure_columns, changes)}))
+
+    def covers(self, group_keys, agg_specs, filter_keys):
+        return set(group_keys) <= set(self.group) and \
+            set(filter_keys) <= set(self.group) and all(
+                (fn_name == 'count' and key is None) or
+                (fn_name == 'sum' and key in self.sum_keys)
+                for fn_name, key in agg_specs)
+
+    def serves_bucket(self, key, bucket, timedelta_mins):
+        if key != self.time_col or bucket not in COARSER_BUCKETS.get(
+                self.bucket, []):
+            return False
+        if self.bucket == 'minute':
+            return True
+        if self.bucket == 'hour':
+            return timedelta_mins % 60 == 0
+        return timedelta_mins == 0
+
+    def measure(self, fn_name, key):
+        """The aggregate over the rollup table equivalent to `fn_name` of
+        `key` over the model's rows.
+        """
+        if fn_name == 'count':
+            return func.coalesce(func.sum(self.table.c['count']), 0)
+        return func.sum(self.table.c[self.sum_column(key)])
+
+    def filter_clauses(self, filters):
+        """Converts (key, values) request filters into clauses on the
+        rollup table.
+        """
+        clauses = []
+        for key, values in filters:
+            col = self.table.c[key]
+            values = [
+                type_coerce_value(type(self._model_column(key).type), v)
+                for v in values]
+            conditions = [col.is_(None)] if None in values else []
+            present = [v for v in values if v is not None]
+            if present:
+                conditions.append(
+                    col == present[0] if len(present) == 1 else col.in_(present))
+            clauses.append(or_(*conditions) if conditions else col.in_([]))
+        return clauses
+
+
+def rollups_of(model_class):
+    """The rollups `model_class` itself declares. They count the rows of
+    its mapped subclasses too, but cannot answer queries on a subclass.
+    """
+    return model_class.__dict__.get('_booster_rollups_') or OrderedDict()
+
+
+def get_rollup(model_class, name):
+    rollups = rollups_of(model_class)
+    if name not in rollups:
+        raise ValueError("UNKNOWN_ROLLUP: %s" % name)
+    return rollups[name]
+
+
+def matching_rollup(model_class, group_keys, agg_specs, filters,
+                    time_key=None, bucket=None, timedelta_mins=0):
+    """Returns a rollup of `model_class` able to answer the aggregation,
+    or None. `filters` are the (key, values) pairs of the request's
+    filters, or None when it has other kinds of filters.
+    """
+    if filters is None:
+        return None
+    filter_keys = [key for key, _ in filters]
+    for rollup in rollups_of(model_class).values():
+        if not rollup.covers(group_keys, agg_specs, filter_keys):
+            continue
+        if time_key is not None and not rollup.serves_bucket(
+                time_key, bucket, timedelta_mins):
+            continue
+        return rollup
+    return None
+
+
+def setup_rollups(mapper, model_cls):
+    """Builds the rollup tables of `model_cls`. Called when a
+    `ModelBooster` subclass declaring `_rollups_` is mapped.
+    """
+    rollups = OrderedDict(
+        (name, Rollup(model_cls, name, **spec))
+        for name, spec in sorted(model_cls.__dict__['_rollups_'].items()))
+    model_cls._booster_rollups_ = rollups
+    _rollups_by_model_name[model_cls.__name__] = model_cls
+    event.listen(mapper, 'mapper_configured', _keep_old_values)
+
+
+def _noop_set(target, value, oldvalue, initiator):
+    pass
+
+
+def _keep_old_values(mapper, model_cls):
+    # Loads the previous value of an expired attribute when it is set, so
+    # that the flush knows which group and bucket the row is moving from
+    for rollup in rollups_of(model_cls).values():
+        for key in rollup.attr_keys:
+            event.listen(
+                getattr(model_cls, key), 'set', _noop_set,
+                active_history=True, propagate=True)
+
+
+def _instance_rollups(instance):
+    # The rows of a mapped subclass are rows of the base class tables
+    return [
+        rollup for cls in type(instance).__mro__
+        for rollup in rollups_of(cls).values()]
+
+
+def _attr_values(instance, keys, old):
+    state = instance_state(instance)
+    values = {}
+    for key in keys:
+        history = state.attrs[key].history
+        if old and history.deleted:
+            values[key] = history.deleted[0]
+        elif not old and history.added:
+            values[key] = history.added[0]
+        elif history.unchanged:
+            values[key] = history.unchanged[0]
+        elif history.added or history.deleted:
+            values[key] = None
+        else:
+            values[key] = getattr(instance, key)
+    return values
+
+
+@event.listens_for(Session, 'before_flush')
+def _load_rollup_attrs_of_deleted(session, flush_context, instances):
+    for instance in session.deleted:
+        for rollup in _instance_rollups(instance):
+            for key in rollup.attr_keys:
+                getattr(instance, key)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_rollups(session, flush_context):
+    deltas = defaultdict(lambda: defaultdict(list))
+
+    def add(rollup, instance, old, sign):
+        key, measures = rollup.key_and_measures(
+            _attr_values(instance, rollup.attr_keys, old))
+        current = deltas[rollup][key]
+        if not current:
+            current.extend([0] * len(measures))
+        for i, amount in enumerate(measures):
+            current[i] += sign * amount
+
+    for instance in session.new:
+        for rollup in _instance_rollups(instance):
+            add(rollup, instance, False, 1)
+    for instance in session.deleted:
+        for rollup in _instance_rollups(instance):
+            add(rollup, instance, True, -1)
+    for instance in session.dirty:
+        for rollup in _instance_rollups(instance):
+            state = instance_state(instance)
+            if any(state.attrs[key].history.has_changes()
+                   for key in rollup.attr_keys):
+                add(rollup, instance, True, -1)
+                add(rollup, instance, False, 1)
+    for rollup, rollup_deltas in deltas.items():
+        rollup.apply_deltas(
+            session.connection(mapper=class_mapper(rollup.model_class)),
+            rollup_deltas)
+    table_names = set(
+        rollup.table.fullname for rollup, rollup_deltas in deltas.items()
+        if any(any(changes) for changes in rollup_deltas.values()))
+    if table_names:
+        bump_table_versions(table_names)
+        session.info.setdefault('booster_flushed_tables', set()).update(
+            table_names)
+
+
+def backfill_rollup(model_class, name, session,
+                    bucket_size=ROLLUP_BACKFILL_BUCKET_SIZE):
+    """Rebuilds the rollup `name` of `model_class` from the model's rows,
+    aggregating `bucket_size` consecutive primary key values at a time.
+    Needs an integer primary key. Commits the session.
+    """
+    rollup = get_rollup(model_class, name)
+    connection = session.connection(mapper=class_mapper(model_class))
+    connection.execute(rollup.table.delete())
+    pk = model_class.primary_key()
+    lowest, highest = session.query(func.min(pk), func.max(pk)).one()
+    group_cols = [getattr(model_class, key) for key in rollup.group]
+    if rollup.time_col:
+        group_cols.append(time_bucket(
+            getattr(model_class, rollup.time_col), rollup.bucket,
+            dialect_name=connection.dialect.name))
+    measures = [func.count(pk)] + [
+        func.coalesce(func.sum(getattr(model_class, key)), 0)
+        for key in rollup.sum_keys]
+    start = lowest
+    while start is not None and start <= highest:
+        query = session.query(*(group_cols + measures)).filter(
+            pk >= start, pk < start + bucket_size)
+        if group_cols:
+            query = query.group_by(*group_cols)
+        deltas = {}
+        for row in query:
+            key = tuple(row[:len(rollup.group)])
+            if rollup.time_col:
+                key += (_utc_naive(row[len(rollup.group)]), )
+            deltas[key] = list(row[len(rollup.key_columns):])
+        rollup.apply_deltas(connection, deltas)
+        start += bucket_size
+    bump_table_versions([rollup.table.fullname])
+    session.commit()
+
+
+def init_rollups(app):
+    """Registers the `booster-rollup-backfill` command on `app`."""
+
+    @app.cli.command('booster-rollup-backfill')
+    @click.argument('model_name')
+    @click.argument('rollup_name', required=False)
+    @click.option('--bucket-size', default=ROLLUP_BACKFILL_BUCKET_SIZE,
+                  help="Primary key values aggregated per query.")
+    def backfill_rollups(model_name, rollup_name, bucket_size):
+        """Rebuilds the rollups of a model from its table."""
+        model_class = _rollups_by_model_name.get(model_name)
+        if model_class is None:
+            raise click.ClickException("No rollups on %s" % model_name)
+        names = [rollup_name] if rollup_name else list(
+            rollups_of(model_class).keys())
+        for name in names:
+            backfill_rollup(
+                model_class, name, model_class.session,
+                bucket_size=bucket_size)
+            click.echo("Backfilled %s.%s" % (model_name, name))
@@ -0,0 +1,169 @@
+"""serialization_profiler
+Attributes the time and the SQL statements spent converting instances to
+dicts to the fields of the dict structs and to the dict post processors.
+
+    >>> with profile_serialization() as profile:
+    ...     Task.query.first().todict_using_struct(
+    ...         {'attrs': ['id', 'title'], 'rels': {'user': {}}})
+    >>> print(format_serialization_profile(profile))
+
+With `SQLALCHEMY_BOOSTER_PROFILE_SERIALIZATION` enabled every request is
+profiled into the app wide `serialization_profile(app)`. Timings are
+aggregated per endpoint, model and field. The field is an attribute
+(columns, properties, association proxies, ...), a relationship (whose
+figures include those of the fields of the related instances) or a post
+processor. `format_serialization_profile` dumps them as a table, slowest
+first.
+
+"""
+
+from __future__ import absolute_import
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+import time
+
+from flask import current_app, has_request_context, request
+
+from .instrumentation import thread_statement_count
+
+EXTENSION_KEY = 'sqlalchemy_booster_serialization_profile'
+
+_profile_local = threading.local()
+
+
+class SerializationProfile(object):
+
+    """Calls, time and statement counts per endpoint, model and field.
+    Thread safe.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, model_name, kind, field, duration, statements):
+        key = (endpoint, model_name, kind, field)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = {
+                    'calls': 0, 'time': 0.0, 'statements': 0}
+            entry['calls'] += 1
+            entry['time'] += duration
+            entry['statements'] += statements
+
+    def rows(self, sort='time'):
+        with self._lock:
+            items = list(self.entries.items())
+        rows = [
+            OrderedDict([
+                ('endpoint', endpoint), ('model', model_name),
+                ('kind', kind), ('field', field),
+                ('calls', entry['calls']), ('time', entry['time']),
+                ('statements', entry['statements'])])
+            for (endpoint, model_name, kind, field), entry in items]
+        return sorted(rows, key=lambda row: -row[sort])
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+
+class _ActiveProfile(object):
+
+    def __init__(self, profile, endpoint):
+        self.profile = profile
+        self.endpoint = endpoint
+
+    @contextmanager
+    def measure(self, instance, kind, field):
+        start = time.time()
+        statements = thread_statement_count()
+        try:
+            yield
+        finally:
+            self.profile.add(
+                self.endpoint, type(instance).__name__, kind, field,
+                time.time() - start, thread_statement_count() - statements)
+
+
+def current_serialization_profiler():
+    return getattr(_profile_local, 'active', None)
+
+
+@contextmanager
+def measured(profiler, instance, kind, field):
+    """`profiler.measure`, or a no-op when `profiler` is None."""
+    if profiler is None:
+        yield
+        return
+    with profiler.measure(instance, kind, field):
+        yield
+
+
+@contextmanager
+def profile_serialization(profile=None, endpoint=None):
+    """Profiles the serializations made on the current thread within the
+    block into `profile` (a new one if None), under `endpoint` (the
+    current request's endpoint by default).
+    """
+    if profile is None:
+        profile = SerializationProfile()
+    if endpoint is None and has_request_context():
+        endpoint = request.endpoint
+    previous = current_serialization_profiler()
+    _profile_local.active = _ActiveProfile(profile, endpoint)
+    try:
+        yield profile
+    finally:
+        _profile_local.active = previous
+
+
+def serialization_profile(app=None):
+    """The profile the requests served by `app` are recorded into."""
+    if app is None:
+        app = current_app._get_current_object()
+    if EXTENSION_KEY not in app.extensions:
+        app.extensions[EXTENSION_KEY] = SerializationProfile()
+    return app.extensions[EXTENSION_KEY]
+
+
+def format_serialization_profile(profile, sort='time', limit=None):
+    headers = ['endpoint', 'model', 'kind', 'field', 'calls',
+               'total ms', 'mean ms', 'statements']
+    lines = []
+    for row in profile.rows(sort=sort)[:limit]:
+        lines.append([
+            row['endpoint'] or '-', row['model'], row['kind'], row['field'],
+            str(row['calls']), "%.3f" % (row['time'] * 1000),
+            "%.3f" % (row['time'] * 1000 / row['calls']),
+            str(row['statements'])])
+    widths = [
+        max([len(h)] + [len(line[i]) for line in lines])
+        for i, h in enumerate(headers)]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(line, widths))
+        .rstrip() for line in [headers] + lines)
+
+
+def init_serialization_profiler(app):
+    """Profiles every request of `app` when
+    `SQLALCHEMY_BOOSTER_PROFILE_SERIALIZATION` is enabled.
+    """
+    if not app.config.get('SQLALCHEMY_BOOSTER_PROFILE_SERIALIZATION'):
+        return
+
+    def start_profiling():
+        _profile_local.request_profiling = profile_serialization(
+            serialization_profile(app))
+        _profile_local.request_profiling.__enter__()
+
+    def stop_profiling(exc):
+        profiling = getattr(_profile_local, 'request_profiling', None)
+        if profiling is not None:
+            _profile_local.request_profiling = None
+            profiling.__exit__(None, None, None)
+
+    app.before_request(start_profiling)
+    app.teardown_request(stop_profiling)
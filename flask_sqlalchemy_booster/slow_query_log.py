@@ -0,0 +1,151 @@
+"""slow_query_log
+Records statements which take longer than a configured threshold, along
+with their bound parameters, the view endpoint which issued them and the
+query plan reported by the database at that moment.
+
+Enable it by setting `SQLALCHEMY_BOOSTER_SLOW_QUERY_THRESHOLD_MS`. Entries
+go to the callable in `SQLALCHEMY_BOOSTER_SLOW_QUERY_SINK` if one is
+configured, else to a rotating file at `SQLALCHEMY_BOOSTER_SLOW_QUERY_LOG_FILE`,
+else to the application logger.
+
+"""
+
+from __future__ import absolute_import
+from datetime import datetime
+import logging
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+from flask.json import _json
+
+from .json_encoder import json_encoder
+
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'mysql': 'EXPLAIN ',
+    'postgresql': 'EXPLAIN '
+}
+
+
+def explain_statement(conn, statement, parameters):
+    """Runs the dialect's EXPLAIN for `statement` on the raw DBAPI
+    connection underlying `conn`, so that the plan query itself does not
+    go through the engine listeners. Returns a list of rows, or None if
+    the statement or dialect can't be explained.
+    """
+    dialect_name = conn.dialect.name
+    prefix = EXPLAIN_PREFIXES.get(dialect_name)
+    if prefix is None or not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    dbapi_cursor = conn.connection.cursor()
+    try:
+        if dialect_name == 'postgresql':
+            # A failing statement aborts the whole transaction in postgres
+            dbapi_cursor.execute("SAVEPOINT booster_explain")
+        try:
+            dbapi_cursor.execute(prefix + statement, parameters)
+            rows = [list(row) for row in dbapi_cursor.fetchall()]
+        except Exception:
+            if dialect_name == 'postgresql':
+                dbapi_cursor.execute("ROLLBACK TO SAVEPOINT booster_explain")
+            return None
+        if dialect_name == 'postgresql':
+            dbapi_cursor.execute("RELEASE SAVEPOINT booster_explain")
+        return rows
+    finally:
+        dbapi_cursor.close()
+
+
+class RotatingFileSink(object):
+
+    """Writes each slow query entry as a line of JSON to a size rotated
+    local file.
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.logger = logging.getLogger(
+            'flask_sqlalchemy_booster.slow_queries.%s' % path)
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            handler = RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+
+    def __call__(self, entry):
+        self.logger.info(_json.dumps(entry, default=json_encoder))
+
+
+class LoggerSink(object):
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def __call__(self, entry):
+        self.logger.warning(
+            "Slow query (%.1f ms) on %s: %s %s",
+            entry['duration_ms'], entry['endpoint'],
+            entry['statement'], entry['parameters'])
+
+
+class SlowQueryLog(object):
+
+    """Statement observer passed to `instrumentation.add_statement_observer`.
+
+    Args:
+
+        threshold_ms (float): Statements taking longer than this are logged
+
+        sink (callable): Receives one dict per slow statement
+
+        explain (bool, optional): Whether to capture the query plan
+    """
+
+    def __init__(self, threshold_ms, sink, explain=True):
+        self.threshold_ms = threshold_ms
+        self.sink = sink
+        self.explain = explain
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany, duration):
+        duration_ms = duration * 1000
+        if duration_ms < self.threshold_ms:
+            return
+        entry = {
+            "timestamp": datetime.utcnow(),
+            "duration_ms": duration_ms,
+            "statement": statement,
+            "parameters": parameters,
+            "endpoint": request.endpoint if has_request_context() else None,
+            "explain": None
+        }
+        if self.explain and not executemany:
+            try:
+                entry['explain'] = explain_statement(conn, statement, parameters)
+            except Exception:
+                entry['explain'] = None
+        self.sink(entry)
+
+
+def slow_query_log_from_config(app):
+    """Builds a `SlowQueryLog` from the app config, or returns None when
+    `SQLALCHEMY_BOOSTER_SLOW_QUERY_THRESHOLD_MS` is not set.
+    """
+    threshold_ms = app.config.get('SQLALCHEMY_BOOSTER_SLOW_QUERY_THRESHOLD_MS')
+    if threshold_ms is None:
+        return None
+    sink = app.config.get('SQLALCHEMY_BOOSTER_SLOW_QUERY_SINK')
+    if not callable(sink):
+        log_file = app.config.get('SQLALCHEMY_BOOSTER_SLOW_QUERY_LOG_FILE')
+        if log_file:
+            sink = RotatingFileSink(
+                log_file,
+                max_bytes=app.config.get(
+                    'SQLALCHEMY_BOOSTER_SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024),
+                backup_count=app.config.get(
+                    'SQLALCHEMY_BOOSTER_SLOW_QUERY_LOG_BACKUP_COUNT', 5))
+        else:
+            sink = LoggerSink(app.logger)
+    return SlowQueryLog(
+        threshold_ms, sink,
+        explain=app.config.get('SQLALCHEMY_BOOSTER_SLOW_QUERY_EXPLAIN', True))
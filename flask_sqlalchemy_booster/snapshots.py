@@ -0,0 +1,52 @@
+"""snapshots
+Detached, session independent copies of loaded instances, used wherever
+the booster keeps ORM results beyond the session which loaded them.
+
+A snapshot carries only the column attributes which were loaded on the
+original instance. It is put back into a session with
+`session.merge(snapshot, load=False)` (or `query.merge_result(...,
+load=False)`), which copies the state onto the session's own instance
+without emitting any SQL, so the same snapshot can be merged any number
+of times into any number of sessions.
+
+"""
+
+from __future__ import absolute_import
+
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import instance_state, set_committed_value
+
+
+def is_instance(value):
+    return hasattr(value, '_sa_instance_state')
+
+
+def snapshot_instance(instance):
+    state = instance_state(instance)
+    mapper = state.mapper
+    snapshot = mapper.class_manager.new_instance()
+    for prop in mapper.column_attrs:
+        if prop.key in state.dict:
+            set_committed_value(snapshot, prop.key, state.dict[prop.key])
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+def snapshot_row(row):
+    """Snapshots a single result row - an instance, a tuple holding
+    instances and column values, or a plain value.
+    """
+    if is_instance(row):
+        return snapshot_instance(row)
+    if isinstance(row, tuple):
+        return tuple(
+            snapshot_instance(v) if is_instance(v) else v for v in row)
+    return row
+
+
+def snapshot_rows(rows):
+    return [snapshot_row(row) for row in rows]
+
+
+def merge_snapshot(session, snapshot):
+    return session.merge(snapshot, load=False)
@@ -0,0 +1,230 @@
+"""statistics
+Summary statistics of a numeric column over the filtered rows of a model,
+served by the `stats` view of `register_crud_routes_for_models`.
+
+    GET /tasks/_stats?col=duration&fn=p50,p95,hist:20,mean&user_id=1
+
+returns `{"col": "duration", "p50": ..., "p95": ..., "hist": {"edges":
+[...], "counts": [...]}, "mean": ...}` for the tasks matching the
+request's filters. The functions are
+
+    count, sum, mean, min, max      computed by the database
+    pNN (0 <= NN <= 100)            computed by the database, which returns
+                                    the two values around the rank
+    std, hist:BINS                  computed in one pass over the column
+                                    values, which are fetched alone,
+                                    `STATS_CHUNK_SIZE` rows at a time, only
+                                    one chunk being held in memory
+
+NumPy is used for the latter when it is installed, plain Python otherwise.
+
+"""
+
+from __future__ import absolute_import
+from collections import OrderedDict
+import math
+
+from flask import request
+from sqlalchemy import func
+
+from .aggregations import column_for_key
+from .responses import as_json, filter_query_using_request
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Query string params of the view, which are not filters
+STATS_PARAMS = ['col', 'fn']
+
+STATS_CHUNK_SIZE = 10000
+
+DEFAULT_HISTOGRAM_BINS = 10
+
+SQL_STAT_FUNCTIONS = OrderedDict([
+    ('count', func.count),
+    ('sum', func.sum),
+    ('mean', func.avg),
+    ('min', func.min),
+    ('max', func.max)
+])
+
+
+def parse_stat_specs(fn_string):
+    """Parses the `fn` query string parameter into (name, argument) pairs.
+
+    Examples:
+
+        >>> parse_stat_specs('p95,hist:20,mean')
+        [('p95', 95.0), ('hist', 20), ('mean', None)]
+
+    """
+    specs = []
+    for spec in (fn_string or 'count,mean,min,max').split(','):
+        spec = spec.strip()
+        if not spec:
+            continue
+        name, _, arg = spec.partition(':')
+        if name in SQL_STAT_FUNCTIONS or name == 'std':
+            specs.append((name, None))
+        elif name == 'hist':
+            bins = int(arg) if arg else DEFAULT_HISTOGRAM_BINS
+            if bins < 1:
+                raise ValueError("INVALID_HISTOGRAM_BINS: %s" % arg)
+            specs.append((name, bins))
+        elif name.startswith('p'):
+            try:
+                q = float(name[1:])
+            except ValueError:
+                raise ValueError("UNKNOWN_STAT_FUNCTION: %s" % name)
+            if not 0 <= q <= 100:
+                raise ValueError("INVALID_PERCENTILE: %s" % name)
+            specs.append((name, q))
+        else:
+            raise ValueError("UNKNOWN_STAT_FUNCTION: %s" % name)
+    return specs
+
+
+def _to_number(value):
+    return float(value) if value is not None else None
+
+
+def sql_stats(query, col, names):
+    """Computes the `SQL_STAT_FUNCTIONS` in `names` in one query."""
+    labelled = [SQL_STAT_FUNCTIONS[name](col).label(name) for name in names]
+    row = query.order_by(None).with_entities(*labelled).one()
+    return OrderedDict(
+        (name, row[i] if name == 'count' else _to_number(row[i]))
+        for i, name in enumerate(names))
+
+
+def _non_null_values(query, col):
+    return query.order_by(None).with_entities(col).filter(col.isnot(None))
+
+
+def sql_percentile(query, col, count, q):
+    """The `q`th percentile of the `count` non null values of `col`,
+    interpolated linearly between the closest ranks as numpy.percentile
+    does. Only the two values around the rank are fetched.
+    """
+    position = (count - 1) * q / 100.0
+    lower = int(math.floor(position))
+    values = [float(value) for (value,) in _non_null_values(
+        query, col).order_by(col).offset(lower).limit(2)]
+    upper = values[1] if len(values) > 1 else values[0]
+    return values[0] + (upper - values[0]) * (position - lower)
+
+
+def column_value_chunks(query, col, chunk_size=STATS_CHUNK_SIZE):
+    """Yields lists of the non null values of `col`, fetched by themselves
+    as tuples, `chunk_size` rows per round trip.
+    """
+    chunk = []
+    for (value,) in _non_null_values(query, col).yield_per(chunk_size):
+        chunk.append(float(value))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def histogram_edges(bins, lo, hi):
+    if lo == hi:
+        lo, hi = lo - 0.5, hi + 0.5
+    width = (hi - lo) / bins
+    return [lo + i * width for i in range(bins + 1)]
+
+
+def _histogram_counts(values, bins, lo, hi):
+    if numpy is not None:
+        counts, _ = numpy.histogram(
+            numpy.asarray(values, dtype=float), bins=bins, range=(lo, hi))
+        return counts.tolist()
+    edges = histogram_edges(bins, lo, hi)
+    lo, width = edges[0], edges[1] - edges[0]
+    counts = [0] * bins
+    for v in values:
+        counts[min(int((v - lo) / width), bins - 1)] += 1
+    return counts
+
+
+def _squared_deviations(values, mean):
+    if numpy is not None:
+        return float(((numpy.asarray(values, dtype=float) - mean) ** 2).sum())
+    return sum((v - mean) ** 2 for v in values)
+
+
+def streamed_stats(query, col, specs, sql_values, chunk_size=STATS_CHUNK_SIZE):
+    """Computes `std` and `hist` in a single pass over the values of `col`,
+    holding one chunk of them at a time. Needs the count, mean, min and
+    max computed by the database as `sql_values`.
+    """
+    n = sql_values['count']
+    deviations = 0.0
+    histograms = dict(
+        (arg, [0] * arg) for name, arg in specs if name == 'hist')
+    for chunk in column_value_chunks(query, col, chunk_size=chunk_size):
+        if any(name == 'std' for name, _ in specs):
+            deviations += _squared_deviations(chunk, sql_values['mean'])
+        for bins, counts in histograms.items():
+            for i, count in enumerate(_histogram_counts(
+                    chunk, bins, sql_values['min'], sql_values['max'])):
+                counts[i] += count
+    stats = {}
+    for name, arg in specs:
+        if name == 'std':
+            stats[name] = math.sqrt(deviations / n)
+        elif name == 'hist':
+            stats[name] = {
+                "edges": histogram_edges(
+                    arg, sql_values['min'], sql_values['max']),
+                "counts": histograms[arg]}
+    return stats
+
+
+def column_stats(query, col, specs, chunk_size=STATS_CHUNK_SIZE):
+    """Computes the statistics in `specs` over `col` for the rows of
+    `query`. The `SQL_STAT_FUNCTIONS` and the percentiles are computed by
+    the database, `std` and `hist` over the streamed values.
+    """
+    names = set(name for name, _ in specs)
+    needed = names & set(SQL_STAT_FUNCTIONS)
+    if names - set(SQL_STAT_FUNCTIONS):
+        needed.add('count')
+    if 'std' in names:
+        needed.add('mean')
+    if 'hist' in names:
+        needed.update(['min', 'max'])
+    sql_values = sql_stats(
+        query, col, [name for name in SQL_STAT_FUNCTIONS if name in needed])
+    n = sql_values.get('count')
+    streamed = {}
+    if n and names & set(['std', 'hist']):
+        streamed = streamed_stats(
+            query, col, [(name, arg) for name, arg in specs
+                         if name in ('std', 'hist')],
+            sql_values, chunk_size=chunk_size)
+    stats = OrderedDict()
+    for name, arg in specs:
+        if name in SQL_STAT_FUNCTIONS:
+            stats[name] = sql_values[name]
+        elif not n:
+            stats[name] = None
+        elif name in streamed:
+            stats[name] = streamed[name]
+        else:
+            stats[name] = sql_percentile(query, col, n, arg)
+    return stats
+
+
+def process_args_and_render_stats(q, default_col=None, default_fn=None):
+    key = request.args.get('col') or default_col
+    if not key:
+        raise ValueError("STATS_COLUMN_MISSING")
+    specs = parse_stat_specs(request.args.get('fn') or default_fn)
+    query, col = column_for_key(
+        filter_query_using_request(q, args_to_skip=STATS_PARAMS), key)
+    return as_json(OrderedDict(
+        [('col', key)] + list(column_stats(query, col, specs).items())))
@@ -0,0 +1,147 @@
+"""timeseries
+Date histograms over the filtered rows of a model, bucketed by the
+database, served by the `timeseries` view of
+`register_crud_routes_for_models`.
+
+    GET /tasks/_timeseries?col=created_on&bucket=day&tz=+05:30&agg=count,max:id
+
+returns one dict per bucket, from the first bucket holding a row to the
+last one, with the bucket start in the requested timezone and the
+aggregates (written as for the `aggregate` view, `count` by default).
+Buckets without rows are included with counts (`count`, `count:col` and
+`count_distinct:col`) of 0 and other aggregates null. The datetime column
+is taken to hold UTC values. Requests a rollup of the model (see
+`rollups`) can answer are served from its table.
+
+"""
+
+from __future__ import absolute_import
+from collections import OrderedDict
+from datetime import datetime
+
+import dateutil.parser
+from flask import request
+from sqlalchemy import func
+from sqlalchemy.orm import class_mapper
+
+from .aggregations import (
+    AGGREGATE_FUNCTIONS, aggregate_label, column_for_key,
+    parse_aggregate_specs)
+from .responses import (
+    as_json, filter_query_using_request, request_equality_filters)
+from .rollups import BUCKET_COLUMN, matching_rollup
+from .utils import (
+    dialect_name_for_query, time_bucket, bucket_starts, parse_tz_offset,
+    tz_str)
+
+# Query string params of the view, which are not filters
+TIMESERIES_PARAMS = ['col', 'bucket', 'tz', 'agg']
+
+MAX_TIMESERIES_BUCKETS = 10000
+
+BUCKET_LABEL = 'bucket'
+
+# Aggregates which are 0, rather than null, over no rows
+COUNTING_AGGREGATES = ('count', 'count_distinct')
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return dateutil.parser.parse(value)
+
+
+def timeseries_query(query, key, bucket, timedelta_mins, agg_specs):
+    """Groups `query` by the time bucket of the column named by `key`.
+
+    Returns:
+
+        tuple: The grouped query and the labels of its aggregate columns
+    """
+    query, col = column_for_key(query, key)
+    bucket_col = time_bucket(
+        col, bucket, timedelta_mins=timedelta_mins,
+        dialect_name=dialect_name_for_query(query)).label(BUCKET_LABEL)
+    labelled = OrderedDict()
+    for fn_name, agg_key in agg_specs:
+        if agg_key is None:
+            expr = func.count(query.model_class.primary_key())
+        else:
+            query, agg_col = column_for_key(query, agg_key)
+            expr = AGGREGATE_FUNCTIONS[fn_name](agg_col)
+        label = aggregate_label(fn_name, agg_key)
+        labelled[label] = expr.label(label)
+    query = query.order_by(None).filter(col.isnot(None)).with_entities(
+        bucket_col, *list(labelled.values())).group_by(
+        bucket_col).order_by(bucket_col)
+    return query, list(labelled.keys())
+
+
+def rollup_timeseries_query(rollup, bucket, timedelta_mins, agg_specs,
+                            filters):
+    """Builds the equivalent of `timeseries_query` over the table of
+    `rollup`, whose buckets are regrouped into `bucket` ones.
+    """
+    t = rollup.table
+    session = rollup.model_class.session
+    bucket_col = time_bucket(
+        t.c[BUCKET_COLUMN], bucket, timedelta_mins=timedelta_mins,
+        dialect_name=session.get_bind(
+            mapper=class_mapper(rollup.model_class)).dialect.name
+    ).label(BUCKET_LABEL)
+    labelled = OrderedDict()
+    for fn_name, agg_key in agg_specs:
+        label = aggregate_label(fn_name, agg_key)
+        labelled[label] = rollup.measure(fn_name, agg_key).label(label)
+    query = session.query(bucket_col, *list(labelled.values())).select_from(
+        t).filter(t.c[BUCKET_COLUMN].isnot(None),
+                  *rollup.filter_clauses(filters)).group_by(
+        bucket_col).order_by(bucket_col)
+    return query, list(labelled.keys())
+
+
+def filled_timeseries(rows, labels, agg_specs, bucket, timedelta_mins):
+    """Converts the grouped rows to dicts, adding the empty buckets.
+    `labels` are those of the aggregates in `agg_specs`.
+    """
+    by_bucket = OrderedDict(
+        (_as_datetime(row[0]), row[1:]) for row in rows)
+    if not by_bucket:
+        return []
+    empty_values = [
+        0 if fn_name in COUNTING_AGGREGATES else None
+        for fn_name, _ in agg_specs]
+    series = []
+    suffix = tz_str(timedelta_mins)
+    for start in bucket_starts(min(by_bucket), max(by_bucket), bucket):
+        if len(series) >= MAX_TIMESERIES_BUCKETS:
+            raise ValueError("TOO_MANY_BUCKETS")
+        values = by_bucket.get(start, empty_values)
+        entry = OrderedDict([(BUCKET_LABEL, start.isoformat() + suffix)])
+        entry.update(zip(labels, values))
+        series.append(entry)
+    return series
+
+
+def process_args_and_render_timeseries(
+        q, default_col=None, default_bucket=None, default_tz=None,
+        default_agg=None):
+    key = request.args.get('col') or default_col
+    if not key:
+        raise ValueError("TIMESERIES_COLUMN_MISSING")
+    bucket = request.args.get('bucket') or default_bucket or 'day'
+    timedelta_mins = parse_tz_offset(request.args.get('tz', default_tz))
+    agg_specs = parse_aggregate_specs(request.args.get('agg') or default_agg)
+    filters = request_equality_filters(args_to_skip=TIMESERIES_PARAMS)
+    rollup = matching_rollup(
+        q, [], agg_specs, filters, time_key=key, bucket=bucket,
+        timedelta_mins=timedelta_mins) if isinstance(q, type) else None
+    if rollup is not None:
+        query, labels = rollup_timeseries_query(
+            rollup, bucket, timedelta_mins, agg_specs, filters)
+    else:
+        query, labels = timeseries_query(
+            filter_query_using_request(q, args_to_skip=TIMESERIES_PARAMS),
+            key, bucket, timedelta_mins, agg_specs)
+    return as_json(filled_timeseries(
+        query.all(), labels, agg_specs, bucket, timedelta_mins))
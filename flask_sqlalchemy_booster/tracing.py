@@ -0,0 +1,298 @@
+"""tracing
+Spans for the stages a request goes through: sanitization of the input,
+filter parsing, query execution, serialization, JSON encoding and
+response building.
+
+Set `SQLALCHEMY_BOOSTER_TRACE_EXPORTER` to a `SpanExporter` (or
+`SQLALCHEMY_BOOSTER_TRACE_FILE` to a path, for a `FileSpanExporter`) and
+every request is traced. The spans of a request are handed to the
+exporter once it is torn down. `InMemorySpanExporter` keeps them in a
+list, `FileSpanExporter` writes them as lines of JSON to a local file and
+`OpenTelemetrySpanExporter` replays them into an OpenTelemetry tracer,
+when `opentelemetry-api` is installed.
+
+Every span carries the endpoint and the number of statements executed
+while it was open, and, where they are known, the model and the row
+count. Outside requests, `trace(exporter)` traces a block of code.
+Without an active trace `span` is a no-op.
+
+"""
+
+from __future__ import absolute_import
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+import threading
+import time
+import uuid
+
+from flask import current_app, has_request_context, request
+
+from .instrumentation import thread_statement_count
+from .slow_query_log import RotatingFileSink
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+EXTENSION_KEY = 'sqlalchemy_booster_trace_exporter'
+
+_trace_local = threading.local()
+
+
+class Span(object):
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = OrderedDict(attributes or {})
+        self.start_time = time.time()
+        self.end_time = None
+        self._start_statement_count = thread_statement_count()
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self):
+        self.end_time = time.time()
+        self.attributes['statement_count'] = \
+            thread_statement_count() - self._start_statement_count
+
+    @property
+    def duration(self):
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    def to_dict(self):
+        return OrderedDict([
+            ('name', self.name), ('trace_id', self.trace_id),
+            ('span_id', self.span_id), ('parent_id', self.parent_id),
+            ('start_time', self.start_time), ('end_time', self.end_time),
+            ('duration_ms', (self.duration or 0) * 1000),
+            ('attributes', dict(self.attributes))])
+
+
+class Trace(object):
+
+    """The spans opened on a thread since the root one."""
+
+    def __init__(self, exporter, endpoint=None):
+        self.exporter = exporter
+        self.trace_id = uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.root = None
+        self.spans = []
+        self.stack = []
+
+    def start_span(self, name, attributes=None):
+        parent_id = self.stack[-1].span_id if self.stack else None
+        new_span = Span(name, self.trace_id, parent_id, attributes)
+        if self.endpoint is not None:
+            new_span.attributes.setdefault('endpoint', self.endpoint)
+        if self.root is None:
+            self.root = new_span
+        self.stack.append(new_span)
+        return new_span
+
+    def end_span(self, ended_span):
+        ended_span.end()
+        if self.stack and self.stack[-1] is ended_span:
+            self.stack.pop()
+        self.spans.append(ended_span)
+
+
+class SpanExporter(object):
+
+    """Receives the finished spans of each trace."""
+
+    def export(self, spans):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        with self._lock:
+            self.spans.extend(spans)
+
+    def finished_spans(self, name=None):
+        with self._lock:
+            return [s for s in self.spans if name is None or s.name == name]
+
+    def clear(self):
+        with self._lock:
+            self.spans = []
+
+
+class FileSpanExporter(SpanExporter):
+
+    """Writes each span as a line of JSON to a size rotated local file."""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.sink = RotatingFileSink(
+            path, max_bytes=max_bytes, backup_count=backup_count)
+
+    def export(self, spans):
+        for exported_span in spans:
+            self.sink(exported_span.to_dict())
+
+
+class OpenTelemetrySpanExporter(SpanExporter):
+
+    """Replays the spans into an OpenTelemetry tracer (the global one by
+    default), keeping their timings and nesting.
+    """
+
+    def __init__(self, tracer=None):
+        if otel_trace is None:
+            raise ImportError(
+                "OpenTelemetrySpanExporter needs opentelemetry-api installed")
+        self.tracer = tracer or otel_trace.get_tracer(
+            'flask_sqlalchemy_booster')
+
+    def export(self, spans):
+        otel_spans = {}
+        for exported_span in sorted(spans, key=lambda s: s.start_time):
+            parent = otel_spans.get(exported_span.parent_id)
+            context = otel_trace.set_span_in_context(parent) \
+                if parent is not None else None
+            otel_span = self.tracer.start_span(
+                exported_span.name, context=context,
+                attributes=dict(
+                    (k, v) for k, v in exported_span.attributes.items()
+                    if v is not None),
+                start_time=int(exported_span.start_time * 1e9))
+            otel_spans[exported_span.span_id] = otel_span
+        for exported_span in spans:
+            otel_spans[exported_span.span_id].end(
+                end_time=int(exported_span.end_time * 1e9))
+
+
+def current_trace():
+    return getattr(_trace_local, 'trace', None)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Times the block as a child of the currently open span. Yields the
+    `Span`, to which attributes can be added, or None when no trace is
+    active.
+    """
+    active_trace = current_trace()
+    if active_trace is None:
+        yield None
+        return
+    opened_span = active_trace.start_span(name, attributes)
+    try:
+        yield opened_span
+    except Exception as e:
+        opened_span.set_attribute('error', type(e).__name__)
+        raise
+    finally:
+        active_trace.end_span(opened_span)
+
+
+def traced(name, func, **attributes):
+    """Wraps `func` so that each call is a span named `name`."""
+    @wraps(func)
+    def traced_func(*args, **kwargs):
+        with span(name, **attributes):
+            return func(*args, **kwargs)
+    return traced_func
+
+
+def _start_trace(exporter, name, attributes):
+    endpoint = request.endpoint if has_request_context() else None
+    _trace_local.trace = Trace(exporter, endpoint=endpoint)
+    return _trace_local.trace.start_span(name, attributes)
+
+
+def _finish_trace():
+    active_trace = current_trace()
+    _trace_local.trace = None
+    if active_trace is None:
+        return
+    while active_trace.stack:
+        active_trace.end_span(active_trace.stack[-1])
+    active_trace.exporter.export(active_trace.spans)
+
+
+@contextmanager
+def trace(exporter, name='trace', **attributes):
+    """Traces the block into `exporter`, under a root span `name`."""
+    previous = current_trace()
+    root_span = _start_trace(exporter, name, attributes)
+    try:
+        yield root_span
+    except Exception as e:
+        root_span.set_attribute('error', type(e).__name__)
+        raise
+    finally:
+        _finish_trace()
+        _trace_local.trace = previous
+
+
+def set_span_attributes(opened_span, model=None, rows=None):
+    """Adds the name of `model` (a model class or a query) and the row
+    count of `rows` (a list or a pagination) to `opened_span`, if any.
+    """
+    if opened_span is None:
+        return
+    model_class = getattr(model, 'model_class', model)
+    if isinstance(model_class, type):
+        opened_span.set_attribute('model', model_class.__name__)
+    if rows is not None:
+        items = getattr(rows, 'items', rows)
+        if isinstance(items, (list, tuple)):
+            opened_span.set_attribute('row_count', len(items))
+            if 'model' not in opened_span.attributes and items:
+                opened_span.set_attribute('model', type(items[0]).__name__)
+
+
+def trace_exporter(app=None):
+    if app is None:
+        app = current_app._get_current_object()
+    return app.extensions.get(EXTENSION_KEY)
+
+
+def init_tracing(app):
+    """Traces every request of `app` when an exporter is configured."""
+    exporter = app.config.get('SQLALCHEMY_BOOSTER_TRACE_EXPORTER')
+    if exporter is None and app.config.get('SQLALCHEMY_BOOSTER_TRACE_FILE'):
+        exporter = FileSpanExporter(app.config['SQLALCHEMY_BOOSTER_TRACE_FILE'])
+    if exporter is None:
+        return
+    app.extensions[EXTENSION_KEY] = exporter
+
+    def start_request_trace():
+        _start_trace(exporter, 'request', OrderedDict([
+            ('http.method', request.method), ('http.path', request.path)]))
+
+    def note_response_status(response):
+        active_trace = current_trace()
+        if active_trace is not None:
+            active_trace.root.set_attribute(
+                'http.status_code', response.status_code)
+        return response
+
+    def finish_request_trace(exc):
+        try:
+            _finish_trace()
+        except Exception:
+            app.logger.exception("Failed to export the request's spans")
+
+    # Ahead of the other hooks, so that the sanitizers are traced too
+    app.before_request_funcs.setdefault(None, []).insert(0, start_request_trace)
+    app.after_request(note_response_status)
+    app.teardown_request(finish_request_trace)
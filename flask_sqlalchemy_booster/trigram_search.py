@@ -0,0 +1,154 @@
+"""trigram_search
+Substring matching backed by a trigram table, for the `~` operator on the
+columns a model lists in `_trigram_searchable_`.
+
+The booster keeps the table `<table>_trigrams` in sync with the model
+through mapper events, holding one `(trigram, col, row_id)` row per
+distinct lower cased three character sequence of each column value. A
+`title~=swimm` filter on such a column first narrows the rows down to
+those having every trigram of `swimm` (an index lookup per trigram),
+and only checks the `ilike '%swimm%'` against those. Values shorter than
+three characters, or holding `LIKE` wildcards, are matched by the plain
+`ilike` scan.
+
+`rebuild_trigram_index` fills the table for rows which existed before
+the column was declared.
+
+"""
+
+from __future__ import absolute_import
+
+from sqlalchemy import (
+    Column, PrimaryKeyConstraint, String, Table, and_, distinct, event,
+    func, select)
+from sqlalchemy.orm import class_mapper
+
+from .full_text_search import _column_values
+
+TRIGRAM_SIZE = 3
+
+
+def trigram_searchable_columns(model_cls):
+    return list(getattr(model_cls, '_trigram_searchable_', None) or [])
+
+
+def trigrams(value):
+    """The distinct lower cased trigrams of `value`.
+
+    Examples:
+
+        >>> sorted(trigrams('Swim'))
+        ['swi', 'wim']
+
+    """
+    value = (value or '').lower()
+    return set(
+        value[i:i + TRIGRAM_SIZE]
+        for i in range(len(value) - TRIGRAM_SIZE + 1))
+
+
+def trigram_table(model_cls):
+    return getattr(model_cls, '_booster_trigram_table_')
+
+
+def _build_trigram_table(model_cls):
+    tbl = model_cls.__table__
+    pk_col = list(tbl.primary_key.columns)[0]
+    return Table(
+        "%s_trigrams" % tbl.name, tbl.metadata,
+        Column('trigram', String(TRIGRAM_SIZE * 4)),
+        Column('col', String(64)),
+        Column('row_id', pk_col.type),
+        PrimaryKeyConstraint('trigram', 'col', 'row_id'))
+
+
+def trigram_criterion(model_cls, attr_name, value):
+    """Returns a criterion narrowing the instances of `model_cls` down to
+    those whose `attr_name` may contain `value`, or None when the
+    trigrams can't tell.
+    """
+    if attr_name not in trigram_searchable_columns(model_cls) or \
+            '%' in (value or '') or '_' in (value or ''):
+        return None
+    grams = sorted(trigrams(value))
+    if not grams:
+        return None
+    t = trigram_table(model_cls)
+    return model_cls.primary_key().in_(
+        select([t.c.row_id]).where(
+            and_(t.c.col == attr_name, t.c.trigram.in_(grams))).group_by(
+            t.c.row_id).having(
+            func.count(distinct(t.c.trigram)) == len(grams)))
+
+
+def _trigram_rows(target, values):
+    row_id = target.primary_key_value()
+    return [
+        {'trigram': gram, 'col': col_name, 'row_id': row_id}
+        for col_name, value in values.items()
+        for gram in sorted(trigrams(value))]
+
+
+def _index_instance(connection, target, col_names):
+    rows = _trigram_rows(
+        target, _column_values(connection, target, col_names))
+    if rows:
+        connection.execute(trigram_table(type(target)).insert(), rows)
+
+
+def _unindex_instance(connection, target, col_names):
+    t = trigram_table(type(target))
+    connection.execute(t.delete().where(and_(
+        t.c.row_id == target.primary_key_value(), t.c.col.in_(col_names))))
+
+
+def _after_insert(mapper, connection, target):
+    _index_instance(
+        connection, target, trigram_searchable_columns(type(target)))
+
+
+def _after_update(mapper, connection, target):
+    state = target._sa_instance_state
+    changed = [
+        c for c in trigram_searchable_columns(type(target))
+        if state.attrs[c].history.has_changes()]
+    if changed:
+        _unindex_instance(connection, target, changed)
+        _index_instance(connection, target, changed)
+
+
+def _after_delete(mapper, connection, target):
+    _unindex_instance(
+        connection, target, trigram_searchable_columns(type(target)))
+
+
+def setup_trigram_search(mapper, model_cls):
+    """Builds the trigram table of `model_cls` and registers the mapper
+    events maintaining it. Called when a `ModelBooster` subclass declaring
+    `_trigram_searchable_` is mapped.
+    """
+    model_cls._booster_trigram_table_ = _build_trigram_table(model_cls)
+    event.listen(mapper, 'after_insert', _after_insert, propagate=True)
+    event.listen(mapper, 'after_update', _after_update, propagate=True)
+    event.listen(mapper, 'after_delete', _after_delete, propagate=True)
+
+
+def rebuild_trigram_index(model_cls, session):
+    """Repopulates the trigram table of `model_cls` from the rows in its
+    table. Commits the session.
+    """
+    connection = session.connection(mapper=class_mapper(model_cls))
+    t = trigram_table(model_cls)
+    connection.execute(t.delete())
+    col_names = trigram_searchable_columns(model_cls)
+    tbl = model_cls.__table__
+    pk_col = tbl.c[model_cls.primary_key_name()]
+    for row in connection.execute(
+            select([pk_col] + [tbl.c[c] for c in col_names])).fetchall():
+        rows = [
+            {'trigram': gram, 'col': col_name, 'row_id': row[0]}
+            for col_name, value in zip(col_names, row[1:])
+            for gram in sorted(trigrams(value))]
+        if rows:
+            connection.execute(t.insert(), rows)
+    session.commit()
@@ -6,11 +6,13 @@ from sqlalchemy.orm.collections import (
 from sqlalchemy.orm import class_mapper
 from toolspy import flatten, all_subclasses, remove_duplicates, boolify
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from datetime import datetime, timedelta
 import uuid
 import os
 from sqlalchemy.sql import sqltypes
-from sqlalchemy import func
+from sqlalchemy import func, bindparam, event, select, Table, Column, MetaData
+from sqlalchemy.orm import Session, class_mapper
+import sqlite3
 import dateutil.parser
 from decimal import Decimal
 import six
@@ -103,6 +105,59 @@ def cast_as_column_type(value, col):
     return type_coerce_value(col_type, value)
 
 
+# Maximum bound parameters a single statement may carry on each dialect.
+# Longer value lists are routed through a temporary table.
+MAX_BIND_PARAMS_PER_STATEMENT = {
+    'sqlite': 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999,
+    'postgresql': 32767,
+    'mssql': 2100
+}
+
+
+def _mapper_for_attr(attr):
+    model_class = getattr(attr, 'class_', None)
+    return class_mapper(model_class) if model_class is not None else None
+
+
+def _values_in_temporary_table(session, attr, values):
+    connection = session.connection(mapper=_mapper_for_attr(attr))
+    column_type = attr.property.columns[0].type if hasattr(
+        attr, 'property') and hasattr(attr.property, 'columns') else sqltypes.String()
+    tmp_table = Table(
+        "booster_in_values_%s" % uuid.uuid4().hex[0:12], MetaData(),
+        Column('value', column_type), prefixes=['TEMPORARY'])
+    tmp_table.create(connection)
+    connection.info.setdefault('booster_temporary_tables', []).append(tmp_table)
+    connection.execute(tmp_table.insert(), [{'value': v} for v in values])
+    return select([tmp_table.c.value])
+
+
+@event.listens_for(Session, 'after_begin')
+def _drop_temporary_value_tables(session, transaction, connection):
+    # Tables created by an earlier transaction on this connection are no
+    # longer referenced by any query
+    tmp_tables = connection.info.pop('booster_temporary_tables', [])
+    for tmp_table in tmp_tables:
+        tmp_table.drop(connection, checkfirst=True)
+
+
+def expanding_in_clause(attr, values, negate=False, session=None):
+    """Builds `attr IN (...)` (or `NOT IN` when `negate` is set) as a single
+    expanding bind parameter, so that the statement text does not vary with
+    the values. Lists exceeding the bind parameter limit of the `session`'s
+    dialect are loaded into a temporary table on its connection instead.
+    """
+    values = list(values)
+    if session is not None:
+        limit = MAX_BIND_PARAMS_PER_STATEMENT.get(
+            session.get_bind(mapper=_mapper_for_attr(attr)).dialect.name)
+        if limit is not None and len(values) > limit:
+            subquery = _values_in_temporary_table(session, attr, values)
+            return attr.notin_(subquery) if negate else attr.in_(subquery)
+    values_param = bindparam(None, values, expanding=True)
+    return attr.notin_(values_param) if negate else attr.in_(values_param)
+
+
 def tz_str(mins):
     prefix = "+" if mins >= 0 else "-"
     return "%s%02d:%02d" % (prefix, abs(mins) / 60, abs(mins) % 60)
@@ -115,6 +170,115 @@ def tz_converted_date(datetime_col, timedelta_mins):
     return func.date(tz_convert(datetime_col, timedelta_mins))
 
 
+def parse_tz_offset(tz):
+    """Converts an offset like `+05:30`, `-0800` or `Z` to minutes. A
+    leading `+` decoded from a query string as a space is accepted.
+    """
+    tz = (tz or '').strip()
+    if tz in ('', 'Z', 'UTC'):
+        return 0
+    sign = -1 if tz.startswith('-') else 1
+    digits = tz.lstrip('+-').replace(':', '')
+    if not digits.isdigit() or len(digits) not in (2, 4):
+        raise ValueError("INVALID_TZ_OFFSET: %s" % tz)
+    return sign * (int(digits[:2]) * 60 + int(digits[2:] or 0))
+
+
+def tz_shifted(datetime_col, timedelta_mins, dialect_name=None):
+    """Shifts a UTC datetime column by `timedelta_mins` in SQL."""
+    if not timedelta_mins:
+        return datetime_col
+    if dialect_name == 'mysql':
+        return tz_convert(datetime_col, timedelta_mins)
+    if dialect_name == 'sqlite':
+        return func.datetime(datetime_col, '%+d minutes' % timedelta_mins)
+    if dialect_name == 'postgresql':
+        return datetime_col + func.make_interval(0, 0, 0, 0, 0, timedelta_mins)
+    return datetime_col + timedelta(minutes=timedelta_mins)
+
+
+TIME_BUCKETS = ['minute', 'hour', 'day', 'week', 'month', 'year']
+
+_STRFTIME_BUCKET_FORMATS = {
+    'minute': '%Y-%m-%d %H:%M:00',
+    'hour': '%Y-%m-%d %H:00:00',
+    'day': '%Y-%m-%d 00:00:00',
+    'month': '%Y-%m-01 00:00:00',
+    'year': '%Y-01-01 00:00:00'
+}
+
+_MYSQL_BUCKET_FORMATS = {
+    'minute': '%Y-%m-%d %H:%i:00',
+    'hour': '%Y-%m-%d %H:00:00',
+    'day': '%Y-%m-%d 00:00:00',
+    'month': '%Y-%m-01 00:00:00',
+    'year': '%Y-01-01 00:00:00'
+}
+
+
+def time_bucket(datetime_col, bucket, timedelta_mins=0, dialect_name=None):
+    """Builds an expression giving the start of the `bucket` (one of
+    `TIME_BUCKETS`, weeks starting on Monday) the UTC datetime column falls
+    in, after shifting it by `timedelta_mins`. Depending on the dialect the
+    expression yields a datetime or its `YYYY-MM-DD HH:MM:SS` string.
+    """
+    if bucket not in TIME_BUCKETS:
+        raise ValueError("UNKNOWN_TIME_BUCKET: %s" % bucket)
+    shifted = tz_shifted(datetime_col, timedelta_mins, dialect_name)
+    if dialect_name == 'postgresql':
+        return func.date_trunc(bucket, shifted)
+    if dialect_name == 'mysql':
+        if bucket == 'week':
+            return func.date_format(
+                func.subdate(func.date(shifted), func.weekday(shifted)),
+                _MYSQL_BUCKET_FORMATS['day'])
+        return func.date_format(shifted, _MYSQL_BUCKET_FORMATS[bucket])
+    if bucket == 'week':
+        # The coming (or current) Sunday less six days
+        return func.strftime(
+            _STRFTIME_BUCKET_FORMATS['day'], shifted, 'weekday 0', '-6 days')
+    return func.strftime(_STRFTIME_BUCKET_FORMATS[bucket], shifted)
+
+
+def truncate_to_bucket(value, bucket):
+    if bucket == 'week':
+        value = value - timedelta(days=value.weekday())
+    fields = ['year', 'month', 'day', 'hour', 'minute']
+    keep = fields.index('day' if bucket == 'week' else bucket) + 1
+    defaults = {'month': 1, 'day': 1, 'hour': 0, 'minute': 0}
+    return value.replace(second=0, microsecond=0, **{
+        f: defaults[f] for f in fields[keep:]})
+
+
+def next_bucket_start(value, bucket):
+    if bucket == 'year':
+        return value.replace(year=value.year + 1)
+    if bucket == 'month':
+        return value.replace(
+            year=value.year + value.month // 12, month=value.month % 12 + 1)
+    return value + {
+        'minute': timedelta(minutes=1), 'hour': timedelta(hours=1),
+        'day': timedelta(days=1), 'week': timedelta(weeks=1)}[bucket]
+
+
+def bucket_starts(first, last, bucket):
+    """Yields the start of every bucket from the one of `first` to the one
+    of `last`, both included.
+    """
+    current = truncate_to_bucket(first, bucket)
+    last = truncate_to_bucket(last, bucket)
+    while current <= last:
+        yield current
+        current = next_bucket_start(current, bucket)
+
+
+def dialect_name_for_query(query, model_class=None):
+    if model_class is None:
+        model_class = query.model_class
+    return query.session.get_bind(
+        mapper=class_mapper(model_class)).dialect.name
+
+
 def get_rel_from_key(parent_class, rel_key):
     return next(
         r for r in class_mapper(parent_class).relationships
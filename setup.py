@@ -15,8 +15,12 @@ setup(
         "Flask-SQLAlchemy>=2.3.2",
         "Schemalite>=0.2.1",
         "bleach",
-        "future"
+        "future",
+        "futures; python_version < '3'"
     ],
+    extras_require={
+        "stats": ["numpy"]
+    },
     tests_require=[
         "pytest"
     ],
@@ -28,4 +28,32 @@ def todolist_with_users_tasks(todolist_app):
                 "user_email": "tintin@cn.com"
             }]
         )
-        return todolist_app
\ No newline at end of file
+        return todolist_app
+
+@pytest.fixture
+def seeded_tables(todolist_with_users_tasks):
+    """Creates the tables of models declared by a test module, seeded with
+    the given rows, for the test alone. The tables (and `extra_tables`,
+    eg. index tables maintained on flush) are dropped once it is done.
+
+        seeded_tables((Plan, [{"code": "free"}]), (Subscription, []))
+    """
+    app = todolist_with_users_tasks
+    tables = []
+
+    def seed(*models_and_rows, **kwargs):
+        with app.test_request_context():
+            new_tables = [model_class.__table__
+                          for model_class, _ in models_and_rows]
+            new_tables += list(kwargs.get('extra_tables') or [])
+            db.metadata.drop_all(bind=db.engine, tables=new_tables)
+            db.metadata.create_all(bind=db.engine, tables=new_tables)
+            tables.extend(new_tables)
+            for model_class, rows in models_and_rows:
+                model_class.create_all(rows)
+        return app
+
+    yield seed
+    with app.test_request_context():
+        db.session.remove()
+        db.metadata.drop_all(bind=db.engine, tables=tables)
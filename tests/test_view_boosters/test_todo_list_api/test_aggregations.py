@@ -0,0 +1,66 @@
+import pytest
+
+from flask_sqlalchemy_booster.aggregations import (
+    AGGREGATE_PARAMS, parse_aggregate_specs)
+from flask_sqlalchemy_booster.responses import (
+    filter_query_using_request, request_equality_filters)
+from .todo_list_api.app import db
+
+
+class Badge(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    group = db.Column(db.String(20))
+
+
+def test_parse_aggregate_specs():
+    assert parse_aggregate_specs('count,max:created_on') == [
+        ('count', None), ('max', 'created_on')]
+    assert parse_aggregate_specs(None) == [('count', None)]
+
+
+def test_aggregate_groups_in_database(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_client() as client:
+        client.jpost('/tasks', {"title": "Fly", "user_id": 1})
+        client.jpost('/tasks', {"title": "Quack", "user_id": 1})
+        resp = client.jget(
+            '/tasks/_aggregate?group=user_id&agg=count,max:id'
+            '&orderby=count&sort=desc&limit=1')
+        assert resp['status'] == 'success'
+        assert len(resp['result']) == 1
+        top = resp['result'][0]
+        assert top['user_id'] == 1
+        assert set(top.keys()) == {'user_id', 'count', 'max_id'}
+
+        total = client.jget('/tasks/_aggregate')['result'][0]['count']
+        assert total == len(client.jget('/tasks')['result'])
+
+
+def test_aggregate_applies_filters_and_dotted_groups(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_client() as client:
+        resp = client.jget(
+            '/tasks/_aggregate?group=user.email&agg=count&user_id=2')
+        assert resp['result'] == [{'user.email': 'tintin@cn.com',
+                                   'count': resp['result'][0]['count']}]
+        assert client.jget('/tasks/_aggregate?agg=median:id')['status'] == 'failure'
+
+
+def test_aggregate_is_opt_in(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_client() as client:
+        assert client.get('/users/_aggregate').status_code != 200
+
+
+@pytest.fixture
+def badges(seeded_tables):
+    return seeded_tables(
+        (Badge, [{"group": group} for group in ['gold', 'gold', 'silver']]))
+
+
+def test_aggregate_params_stay_filters_elsewhere(badges):
+    app = badges
+    with app.test_request_context('/badges?group=gold'):
+        assert filter_query_using_request(Badge).count() == 2
+        assert filter_query_using_request(
+            Badge, args_to_skip=AGGREGATE_PARAMS).count() == 3
+    with app.test_request_context('/x?group=user_id&agg=count&user_id=2'):
+        assert request_equality_filters(args_to_skip=AGGREGATE_PARAMS) == [
+            ('user_id', ['2'])]
@@ -0,0 +1,32 @@
+import asyncio
+import json
+
+from flask_sqlalchemy_booster.aio import (
+    AsyncExecutor, AsyncModelOperations, construct_async_index_view_function)
+from .todo_list_api.app import Task, User
+
+
+def test_async_model_operations(todolist_with_users_tasks):
+    executor = AsyncExecutor(todolist_with_users_tasks, max_workers=4)
+    tasks = AsyncModelOperations(Task, executor=executor)
+
+    async def scenario():
+        created = await tasks.create(title="Water plants", user_id=1)
+        fetched = await asyncio.gather(*[tasks.get(created.id) for _ in range(12)])
+        matching = await tasks.all(title="Water plants")
+        return created, fetched, matching
+
+    created, fetched, matching = asyncio.run(scenario())
+    assert created.id is not None and created.title == "Water plants"
+    assert all(t.id == created.id for t in fetched)
+    assert [t.id for t in matching] == [created.id]
+    executor.shutdown()
+
+
+def test_async_index_view_reuses_filters(todolist_with_users_tasks):
+    executor = AsyncExecutor(todolist_with_users_tasks, max_workers=2)
+    index = construct_async_index_view_function(User, executor=executor)
+    with todolist_with_users_tasks.test_request_context('/users?id=2'):
+        response = asyncio.run(index())
+    assert [u['id'] for u in json.loads(response.get_data())['result']] == [2]
+    executor.shutdown()
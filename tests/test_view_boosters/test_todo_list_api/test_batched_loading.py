@@ -0,0 +1,56 @@
+import pytest
+
+from flask_sqlalchemy_booster.instrumentation import record_queries
+from .todo_list_api.app import db
+
+
+class Shelf(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    label = db.Column(db.String(50))
+    jars = db.relationship("Jar", lazy="batched", order_by="Jar.id")
+
+
+class Jar(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    contents = db.Column(db.String(50))
+    shelf_id = db.Column(db.Integer, db.ForeignKey('shelf.id'))
+    shelf = db.relationship("Shelf", lazy="batched")
+
+
+@pytest.fixture
+def shelves(seeded_tables):
+    labels = ["Top", "Middle", "Bottom"]
+    return seeded_tables(
+        (Shelf, [{"label": label} for label in labels]),
+        (Jar, [{"contents": "%s %s" % (label, i), "shelf_id": shelf_id}
+               for shelf_id, label in enumerate(labels, 1)
+               for i in range(3)]))
+
+
+def test_many_to_one_loads_for_all_siblings_at_once(shelves):
+    with shelves.test_request_context():
+        jars = Jar.query.order_by(Jar.id).all()
+        with record_queries() as stats:
+            labels = [jar.shelf.label for jar in jars]
+        assert labels == ["Top"] * 3 + ["Middle"] * 3 + ["Bottom"] * 3
+        assert stats.statement_count == 1
+
+
+def test_one_to_many_loads_for_all_siblings_at_once(shelves):
+    with shelves.test_request_context():
+        shelves = Shelf.query.order_by(Shelf.id).all()
+        with record_queries() as stats:
+            contents = [[j.contents for j in s.jars] for s in shelves]
+        assert contents[1] == ["Middle 0", "Middle 1", "Middle 2"]
+        assert stats.statement_count == 1
+
+
+def test_instances_outside_a_result_load_alone(shelves):
+    with shelves.test_request_context():
+        shelf = Shelf.get(1)
+        assert len(shelf.jars) == 3
+        jar = Jar(contents="Loose", shelf_id=2)
+        db.session.add(jar)
+        db.session.flush()
+        assert jar.shelf.label == "Middle"
+        db.session.rollback()
@@ -0,0 +1,36 @@
+def test_columnar_layout_matches_row_layout(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_client() as client:
+        rows = client.jget('/users?sort=asc')['result']
+        columnar = client.jget('/users?sort=asc&_layout=columnar')['result']
+        assert set(columnar['columns']) == set(rows[0].keys())
+        assert [dict(zip(columnar['columns'], r)) for r in columnar['rows']] == rows
+
+
+def test_column_major_layout_with_rels_and_pages(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_client() as client:
+        resp = client.jget(
+            '/tasks?_layout=column_major&page=1&per_page=2'
+            '&_ds={"attrs":["id","title"],"rels":{"user":{"attrs":["name"]}}}')
+        assert resp['per_page'] == 2
+        result = resp['result']
+        assert result['columns'] == ['id', 'title', 'user']
+        assert len(result['values']) == 3
+        assert len(result['values'][0]) == 2
+        assert result['values'][2][0] == {'name': 'Donald Duck'}
+
+
+def test_columnar_layout_honours_attrs_and_expand(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_client() as client:
+        rows = client.jget('/tasks?sort=asc&_ds={"attrs":["id","title"]}')[
+            'result']
+        result = client.jget(
+            '/tasks?sort=asc&attrs=id,title&_layout=columnar')['result']
+        assert result['columns'] == ['id', 'title']
+        assert result['rows'] == [[r['id'], r['title']] for r in rows]
+        rows = client.jget('/tasks?sort=asc&_ds={"attrs":["id"],"rels":{"user":{}}}')[
+            'result']
+        result = client.jget(
+            '/tasks?sort=asc&attrs=id&expand=user&_layout=column_major'
+        )['result']
+        assert result['columns'] == ['id', 'user']
+        assert result['values'][1] == [r['user'] for r in rows]
@@ -0,0 +1,91 @@
+import json
+
+from flask_sqlalchemy_booster.cost_governor import request_cost
+from flask_sqlalchemy_booster.crud_api_view import construct_index_view_function
+from .todo_list_api.app import Task
+
+
+def _call(app, view, url):
+    with app.test_request_context(url):
+        resp = view()
+        return resp.status_code, json.loads(resp.get_data(as_text=True))
+
+
+def test_request_cost_measures(todolist_with_users_tasks):
+    url = ('/tasks?user.name=Tin%20Tin&title~=R%25&page=1&per_page=10'
+           '&_ds={"attrs":["id"],"rels":{"user":{"attrs":["id","name"],'
+           '"rels":{"tasks":{"attrs":["id"]}}}}}')
+    with todolist_with_users_tasks.test_request_context(url):
+        cost = request_cost(model_class=Task)
+    assert cost['joins'] == 1
+    assert cost['filter_nodes'] == 2
+    assert cost['rows'] == 10 and cost['paginated']
+    assert cost['dict_struct_depth'] == 2
+    assert cost['dict_struct_rels'] == 2
+    assert cost['dict_struct_attrs'] == 4
+
+    url = ('/tasks?title=Fly&count_only=false&preserve_order=true'
+           '&grouprelby=user&user_id:in=1,2')
+    with todolist_with_users_tasks.test_request_context(url):
+        assert request_cost(model_class=Task)['filter_nodes'] == 2
+
+
+def test_over_budget_request_is_rejected(todolist_with_users_tasks):
+    view = construct_index_view_function(
+        Task, cost_budget={'max_dict_struct_depth': 1})
+    status, body = _call(
+        todolist_with_users_tasks, view,
+        '/tasks?_ds={"rels":{"user":{"rels":{"tasks":{}}}}}')
+    assert status == 400
+    assert body['error'] == 'REQUEST_COST_EXCEEDED'
+    assert body['exceeded'] == ['max_dict_struct_depth']
+    status, body = _call(
+        todolist_with_users_tasks, view, '/tasks?_ds={"rels":{"user":{}}}')
+    assert status == 200
+
+
+def test_expand_and_rels_params_are_scored(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context(
+            '/tasks?attrs=id,title&expand=user.tasks'):
+        cost = request_cost(model_class=Task)
+    assert cost['dict_struct_depth'] == 2
+    assert cost['dict_struct_rels'] == 2
+    assert cost['dict_struct_attrs'] == 2
+    with todolist_with_users_tasks.test_request_context(
+            '/tasks?attrs=id,title&rels=user:name'):
+        cost = request_cost(model_class=Task)
+    assert cost['dict_struct_depth'] == 1
+    assert cost['dict_struct_rels'] == 1
+    assert cost['dict_struct_attrs'] == 3
+
+
+def test_expand_cannot_bypass_the_budget_in_any_layout(
+        todolist_with_users_tasks):
+    view = construct_index_view_function(
+        Task, cost_budget={'max_dict_struct_depth': 1})
+    for layout in ['rows', 'sideloaded', 'columnar', 'column_major']:
+        status, body = _call(
+            todolist_with_users_tasks, view,
+            '/tasks?_layout=%s&expand=user.tasks.user' % layout)
+        assert status == 400, layout
+        assert body['exceeded'] == ['max_dict_struct_depth']
+        status, body = _call(
+            todolist_with_users_tasks, view,
+            '/tasks?_layout=%s&expand=user' % layout)
+        assert status == 200, layout
+
+
+def test_unpaginated_request_is_degraded_to_pages(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        for title in ["Page filler 1", "Page filler 2", "Page filler 3"]:
+            Task.create(title=title, user_id=1)
+    view = construct_index_view_function(
+        Task, cost_budget={'max_rows': 2, 'on_exceed': 'paginate'})
+    status, body = _call(todolist_with_users_tasks, view, '/tasks')
+    assert status == 200
+    assert body['page'] == 1
+    assert body['per_page'] == 2
+    assert len(body['result']) == 2
+    status, body = _call(
+        todolist_with_users_tasks, view, '/tasks?page=2&per_page=50')
+    assert body['page'] == 2 and body['per_page'] == 2
@@ -0,0 +1,52 @@
+import threading
+
+from flask_sqlalchemy_booster.crud_api_view import construct_delete_view_function
+from flask_sqlalchemy_booster.deferred_processors import (
+    deferred, run_post_processor, runner_for_app, deferred_processor_metrics)
+from .todo_list_api.app import Task, User
+
+
+def test_deferred_post_processor_runs_after_response_is_closed(
+        todolist_with_users_tasks):
+    app = todolist_with_users_tasks
+    calls = []
+
+    @deferred
+    def remember_deleted(obj_data):
+        calls.append((obj_data['title'], threading.current_thread().name))
+
+    view = construct_delete_view_function(
+        Task, registration_dict={}, post_processors=[remember_deleted])
+    with app.test_request_context():
+        task = Task.create(title="Forget me", user_id=1)
+        task_id = task.id
+    with app.test_request_context('/tasks/%s' % task_id, method='DELETE'):
+        response = app.process_response(view(task_id))
+        assert response.status_code == 200
+        assert calls == []
+    response.close()
+    runner_for_app(app).wait()
+    assert calls[0][0] == "Forget me"
+    assert calls[0][1] != threading.current_thread().name
+
+
+def test_instances_are_reloaded_and_failures_counted(todolist_with_users_tasks):
+    app = todolist_with_users_tasks
+    seen = []
+
+    @deferred
+    def note_user(user, data):
+        seen.append((user.name, data))
+        raise ValueError("audit store down")
+
+    before = deferred_processor_metrics(app)
+    with app.test_request_context():
+        user = User.get(2)
+        assert run_post_processor(note_user, user, {"k": 1}) is None
+        response = app.process_response(app.response_class("ok"))
+    response.close()
+    runner_for_app(app).wait()
+    after = deferred_processor_metrics(app)
+    assert seen == [("Tin Tin", {"k": 1})]
+    assert after['failed'] == before['failed'] + 1
+    assert after['queued'] == before['queued'] + 1
@@ -0,0 +1,79 @@
+import pytest
+
+from flask_sqlalchemy_booster.instrumentation import record_queries
+from flask_sqlalchemy_booster.query_cache import get_query_cache_store
+from .todo_list_api.app import db
+
+
+class Customer(db.Model):
+    _entity_cache_ttl_ = 60
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50))
+
+
+class Invoice(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'))
+    customer = db.relationship("Customer")
+
+
+@pytest.fixture
+def customers(seeded_tables):
+    app = seeded_tables(
+        (Customer, [{"name": name} for name in ["Acme", "Globex"]]),
+        (Invoice, [{"customer_id": customer_id}
+                   for customer_id in [1, 2, 1]]))
+    get_query_cache_store().clear()
+    yield app
+    get_query_cache_store().clear()
+
+
+def test_get_is_served_across_sessions(customers):
+    with customers.test_request_context():
+        with record_queries() as stats:
+            assert Customer.get(1).name == "Acme"
+        assert stats.statement_count == 1
+    db.session.remove()
+    with customers.test_request_context():
+        with record_queries() as stats:
+            assert Customer.get("1").name == "Acme"
+            assert Customer.get(1) is Customer.get(1)
+        assert stats.statement_count == 0
+
+
+def test_many_to_one_loads_go_through_cache(customers):
+    with customers.test_request_context():
+        invoices = Invoice.query.order_by(Invoice.id).all()
+        assert [i.customer.name for i in invoices] == ["Acme", "Globex", "Acme"]
+        db.session.expunge_all()
+        invoices = Invoice.query.order_by(Invoice.id).all()
+        with record_queries() as stats:
+            names = [i.customer.name for i in invoices]
+        assert names == ["Acme", "Globex", "Acme"]
+        assert stats.statement_count == 0
+
+
+def test_flushes_invalidate_entries(customers):
+    with customers.test_request_context():
+        Customer.get(2).name = "Globex Corp"
+        db.session.flush()
+        db.session.expunge_all()
+        with record_queries() as stats:
+            assert Customer.get(2).name == "Globex Corp"
+        assert stats.statement_count == 1
+        db.session.expunge_all()
+        # Not cached from within the writing transaction
+        with record_queries() as stats:
+            Customer.get(2)
+        assert stats.statement_count == 1
+        db.session.commit()
+        Customer.get(2)
+        db.session.expunge_all()
+        with record_queries() as stats:
+            assert Customer.get(2).name == "Globex Corp"
+        assert stats.statement_count == 0
+
+        Customer.query.filter(Customer.id == 2).update({"name": "Globex"})
+        db.session.commit()
+        db.session.expunge_all()
+        assert Customer.get(2).name == "Globex"
@@ -0,0 +1,53 @@
+from sqlalchemy.ext.associationproxy import association_proxy
+
+from flask_sqlalchemy_booster.instrumentation import record_queries
+from flask_sqlalchemy_booster.responses import process_args_and_fetch_rows
+from .todo_list_api.app import db
+
+
+class Author(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50))
+    books = db.relationship("Book")
+    book_titles = association_proxy("books", "title")
+
+
+class Book(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(100))
+    author_id = db.Column(db.Integer, db.ForeignKey('author.id'))
+
+
+def _fetch(app, url):
+    with app.test_request_context(url):
+        with record_queries() as stats:
+            rows = process_args_and_fetch_rows(Author)
+            names = sorted(a.name for a in getattr(rows, 'items', rows))
+        return names, [s['statement'] for s in stats.statements]
+
+
+def test_to_many_filters_use_exists(todolist_with_users_tasks):
+    app = todolist_with_users_tasks
+    with app.test_request_context():
+        Author.create(name="Tolkien", books=[
+            Book(title="The Hobbit"), Book(title="The Silmarillion")])
+        Author.create(name="Adams", books=[Book(title="Mostly Harmless")])
+
+    names, statements = _fetch(app, '/authors?books.title~=The')
+    assert names == ["Tolkien"]
+    assert 'EXISTS' in statements[0] and 'JOIN' not in statements[0]
+
+    names, _ = _fetch(app, '/authors?book_titles=Mostly%20Harmless')
+    assert names == ["Adams"]
+
+    names, _ = _fetch(
+        app, '/authors?_f={"f":[{"k":"books.title","op":"~","v":"Harm"}]}')
+    assert names == ["Adams"]
+
+
+def test_pagination_without_joins_is_not_distinct(todolist_with_users_tasks):
+    names, statements = _fetch(
+        todolist_with_users_tasks, '/authors?books.title~=The&page=1&per_page=1')
+    assert names == ["Tolkien"]
+    assert len(statements) == 2
+    assert not any('DISTINCT' in s for s in statements)
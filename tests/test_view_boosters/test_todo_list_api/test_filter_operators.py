@@ -0,0 +1,48 @@
+from flask_sqlalchemy_booster import utils
+from flask_sqlalchemy_booster.instrumentation import record_queries
+from .todo_list_api.app import User
+
+
+def test_in_and_notin_key_suffix(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_client() as client:
+        resp = client.jget('/users?id:in=1,2&sort=asc')
+        assert [u['id'] for u in resp['result']] == [1, 2]
+        resp = client.jget('/users?id:notin=1')
+        assert 1 not in [u['id'] for u in resp['result']]
+        assert 2 in [u['id'] for u in resp['result']]
+
+
+def test_isnull_and_between_operators(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_client() as client:
+        resp = client.jget('/users?marital_status:isnull=true&id:in=1,2')
+        assert len(resp['result']) == 2
+        resp = client.jget('/users?marital_status:isnull=false&id:in=1,2')
+        assert resp['result'] == []
+        resp = client.jget(
+            '/users?_f={"f":[{"k":"id","op":"between","v":[2,2]}]}')
+        assert [u['id'] for u in resp['result']] == [2]
+        resp = client.jget(
+            '/users?_f={"f":[{"k":"id","op":"not in","v":[1]},'
+            '{"k":"marital_status","op":"is null"}]}')
+        assert 1 not in [u['id'] for u in resp['result']]
+
+
+def test_in_clause_statement_shape_does_not_vary(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        shapes = set(
+            str(utils.expanding_in_clause(User.id, values, session=User.session))
+            for values in ([1], [1, 2], list(range(1, 1200))))
+        assert len(shapes) == 1
+        with record_queries() as stats:
+            User.get_all([1])
+            User.get_all(list(range(1, 1200)))
+        for entry in stats.statements:
+            assert entry["statement"].count(" IN (") == 1
+            assert " OR " not in entry["statement"]
+
+
+def test_long_value_lists_use_temporary_table(todolist_with_users_tasks, monkeypatch):
+    monkeypatch.setitem(utils.MAX_BIND_PARAMS_PER_STATEMENT, 'sqlite', 10)
+    with todolist_with_users_tasks.test_request_context():
+        users = User.get_all(list(range(1, 30)))
+        assert [u.id for u in users[:2]] == [1, 2]
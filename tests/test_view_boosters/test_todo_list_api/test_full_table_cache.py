@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy.ext.associationproxy import association_proxy
+
+from flask_sqlalchemy_booster.full_table_cache import full_table_cache
+from flask_sqlalchemy_booster.instrumentation import record_queries
+from .todo_list_api.app import db
+
+
+class Plan(db.Model):
+    _cache_fully_ = True
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(20), unique=True)
+    price = db.Column(db.Integer)
+
+
+class Subscription(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    plan_id = db.Column(db.Integer, db.ForeignKey('plan.id'))
+    plan = db.relationship("Plan")
+    plan_code = association_proxy('plan', 'code')
+
+
+@pytest.fixture
+def plans(seeded_tables):
+    app = seeded_tables(
+        (Plan, [{"code": code, "price": price}
+                for code, price in [("free", 0), ("pro", 10), ("team", 50)]]),
+        (Subscription, [{"plan_id": plan_id} for plan_id in [1, 2, 3, 2]]))
+    full_table_cache(Plan).invalidate()
+    yield app
+    full_table_cache(Plan).invalidate()
+
+
+def test_lookups_are_served_from_memory(plans):
+    with plans.test_request_context():
+        Plan.get(1)
+        db.session.expunge_all()
+        with record_queries() as stats:
+            assert Plan.get(2).code == "pro"
+            assert [p.code for p in Plan.get_all([3, 1])] == ["team", "free"]
+            assert Plan.get("team", key="code").price == 50
+            assert Plan.first(price=10).code == "pro"
+        assert stats.statement_count == 0
+        assert Plan.get(2) is Plan.get(2)
+
+
+def test_many_to_one_loads_are_served_from_memory(plans):
+    with plans.test_request_context():
+        Plan.get(1)
+        subscriptions = Subscription.query.order_by(Subscription.id).all()
+        db.session.expunge_all()
+        subscriptions = Subscription.query.order_by(Subscription.id).all()
+        with record_queries() as stats:
+            codes = [s.plan_code for s in subscriptions]
+        assert codes == ["free", "pro", "team", "pro"]
+        assert stats.statement_count == 0
+
+
+def test_session_with_uncommitted_writes_reads_the_table(plans):
+    with plans.test_request_context():
+        assert Plan.get(2).price == 10
+        Plan.get(2).price = 15
+        db.session.flush()
+        db.session.expunge_all()
+        with record_queries() as stats:
+            assert Plan.first(code="pro").price == 15
+            assert Plan.get(2).price == 15
+        assert stats.statement_count == 2
+        db.session.rollback()
+        assert Plan.get(2).price == 10
+
+
+def test_writes_refresh_the_cache(plans):
+    with plans.test_request_context():
+        assert Plan.get(3).price == 50
+        Plan.get(3).price = 60
+        db.session.flush()
+        db.session.expunge_all()
+        with record_queries() as stats:
+            assert Plan.first(code="team").price == 60
+        assert stats.statement_count == 1
+        db.session.commit()
+        db.session.expunge_all()
+        assert Plan.get(3).price == 60
+        Plan.create(code="enterprise", price=500)
+        db.session.expunge_all()
+        assert Plan.get("enterprise", key="code").price == 500
+        with record_queries() as stats:
+            assert Plan.get("enterprise", key="code").price == 500
+        assert stats.statement_count == 0
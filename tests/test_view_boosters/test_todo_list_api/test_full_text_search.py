@@ -0,0 +1,33 @@
+from flask_sqlalchemy_booster.full_text_search import fts5_match_expression
+
+
+def test_fts5_match_expression_quotes_client_input():
+    assert fts5_match_expression('swim" OR fast*', columns=['title']) == \
+        '{title} : ("swim" "OR" "fast"*)'
+
+
+def test_full_text_filter_on_column(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_client() as client:
+        resp = client.jget('/tasks?title@@=mysteries')
+        assert resp['status'] == 'success'
+        assert [t['title'] for t in resp['result']] == ['Solve Mysteries']
+
+
+def test_full_text_filter_in_filters_list_with_relevance(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_client() as client:
+        client.jpost('/tasks', {"title": "Solve solve solve", "user_id": 1})
+        resp = client.jget(
+            '/tasks?_f={"f":[{"k":"_search","op":"@@","v":"solve"}]}'
+            '&orderby=_relevance')
+        assert resp['status'] == 'success'
+        titles = [t['title'] for t in resp['result']]
+        assert titles[0] == "Solve solve solve"
+        assert "Swim" not in titles
+
+
+def test_full_text_index_follows_updates(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_client() as client:
+        task = client.jpost('/tasks', {"title": "Paint fence", "user_id": 1})
+        client.jput('/tasks/%s' % task['result']['id'], {"title": "Mow lawn"})
+        assert client.jget('/tasks?title@@=fence')['result'] == []
+        assert len(client.jget('/tasks?title@@=lawn')['result']) == 1
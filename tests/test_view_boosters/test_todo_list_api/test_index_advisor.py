@@ -0,0 +1,82 @@
+from flask_sqlalchemy_booster import index_advisor
+from flask_sqlalchemy_booster.responses import process_args_and_fetch_rows
+from .todo_list_api.app import db, Task
+
+
+class Listing(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    city = db.Column(db.String(50))
+    kind = db.Column(db.String(20))
+    price = db.Column(db.Integer)
+    __table_args__ = (db.Index('ix_listing_kind_city', 'kind', 'city'), )
+
+
+def _record(app, recorder, url):
+    with app.test_request_context(url):
+        index_advisor.start_request_index_usage()
+        process_args_and_fetch_rows(Task)
+        index_advisor.finish_request_index_usage(recorder)
+
+
+def test_candidate_columns_put_equality_before_range():
+    freq = {'user_id': 3, 'created_on': 2, 'title': 1}
+    assert index_advisor.candidate_columns(
+        ['user_id'], ['created_on'], 'created_on', freq) == ['user_id', 'created_on']
+    assert index_advisor.candidate_columns(
+        ['user_id'], ['created_on'], 'title', freq) == ['user_id', 'created_on']
+    assert index_advisor.candidate_columns(
+        ['title', 'user_id'], [], 'id', freq) == ['user_id', 'title', 'id']
+
+
+def test_index_report_suggests_missing_composite_index(todolist_with_users_tasks):
+    recorder = index_advisor.IndexUsageRecorder()
+    _record(todolist_with_users_tasks, recorder,
+            '/tasks?user_id=1&created_on>=2000-01-01&sort=desc&orderby=created_on')
+    _record(todolist_with_users_tasks, recorder, '/tasks?user_id=2')
+    _record(todolist_with_users_tasks, recorder, '/tasks?id:in=1,2')
+    _record(todolist_with_users_tasks, recorder, '/tasks?user.email=duck@disney.com')
+    _record(todolist_with_users_tasks, recorder, '/tasks?title@@=swim')
+    with todolist_with_users_tasks.app_context():
+        report = index_advisor.index_report(db.engine, recorder.shapes)
+    by_table = {t['table']: t for t in report}
+    task_suggestions = by_table['task']['suggestions']
+    assert [s['columns'] for s in task_suggestions] == [['user_id', 'created_on']]
+    assert task_suggestions[0]['uses'] == 2
+    assert task_suggestions[0]['ddl'] == \
+        "CREATE INDEX ix_task_user_id_created_on ON task (user_id, created_on)"
+    # user.email is unique and so already indexed
+    assert by_table['user']['suggestions'] == []
+    assert 'CREATE INDEX' in index_advisor.format_index_report(report)
+
+
+def test_equality_columns_match_indexes_in_any_order(seeded_tables):
+    app = seeded_tables((Listing, []))
+    assert index_advisor.is_served_by(
+        ['city', 'kind'], [['kind', 'city', 'id']], eq_count=2)
+    assert not index_advisor.is_served_by(
+        ['city', 'price'], [['price', 'city']], eq_count=1)
+    shapes = {'listing|city,kind||': 1, 'listing|city||': 2,
+              'listing|city|price|': 1}
+    with app.app_context():
+        report = index_advisor.index_report(db.engine, shapes)
+    assert [s['columns'] for s in report[0]['suggestions']] == [
+        ['city', 'price']]
+
+
+def test_index_report_command(todolist_with_users_tasks, monkeypatch):
+    recorder = index_advisor.IndexUsageRecorder()
+    _record(todolist_with_users_tasks, recorder,
+            '/tasks?user_id=1&created_on>=2000-01-01')
+    _record(todolist_with_users_tasks, recorder, '/tasks?user_id=2')
+    monkeypatch.setattr(index_advisor, 'index_usage', recorder)
+    debug = todolist_with_users_tasks.debug
+    runner = todolist_with_users_tasks.test_cli_runner()
+    result = runner.invoke(args=['booster-index-report'])
+    # Loading the app through the cli resets debug from the environment
+    todolist_with_users_tasks.debug = debug
+    assert result.exit_code == 0
+    assert result.output.splitlines() == [
+        "Table task",
+        "  Column usage: user_id (2), created_on (1)",
+        "  CREATE INDEX ix_task_user_id_created_on ON task "
+        "(user_id, created_on);  -- 2 uses"]
@@ -0,0 +1,43 @@
+from flask_sqlalchemy_booster.instrumentation import (
+    fingerprint_statement, add_statement_observer)
+from flask_sqlalchemy_booster.slow_query_log import SlowQueryLog
+from .todo_list_api.app import db, Task
+
+
+def test_fingerprint_collapses_literals_and_in_lists():
+    assert fingerprint_statement(
+        "SELECT * FROM task WHERE id IN (?, ?, ?) AND title = 'x'"
+    ) == "SELECT * FROM task WHERE id IN (?) AND title = ?"
+
+
+def test_query_stats_headers_in_debug_mode(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_client() as client:
+        resp = client.get('/tasks')
+        assert int(resp.headers['X-SQL-Statement-Count']) >= 1
+        assert 'X-SQL-Total-Time-Ms' in resp.headers
+
+
+def test_record_queries_detects_n_plus_one(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        db.session.expunge_all()
+        with db.record_queries(n_plus_one_threshold=1) as stats:
+            for task in Task.all():
+                task.user
+        assert stats.statement_count >= 3
+        assert len(stats.n_plus_one_suspects()) == 1
+
+
+def test_slow_query_log_captures_endpoint_and_plan(todolist_with_users_tasks):
+    entries = []
+    slow_query_log = SlowQueryLog(0, entries.append)
+    with todolist_with_users_tasks.test_request_context():
+        engine = db.get_engine()
+        add_statement_observer(engine, slow_query_log)
+        try:
+            with todolist_with_users_tasks.test_client() as client:
+                client.get('/tasks?title=Swim')
+        finally:
+            engine._booster_statement_observers.remove(slow_query_log)
+    entry = next(e for e in entries if e['endpoint'] == 'index_task')
+    assert 'Swim' in entry['parameters']
+    assert entry['explain']
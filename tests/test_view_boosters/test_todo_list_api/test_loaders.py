@@ -0,0 +1,62 @@
+import json
+
+from flask_sqlalchemy_booster.crud_api_view import (
+    construct_batch_save_view_function)
+from flask_sqlalchemy_booster.instrumentation import record_queries
+from flask_sqlalchemy_booster.loaders import loader, expect_related_keys
+from .todo_list_api.app import Task, User
+
+
+def test_expected_keys_are_fetched_in_one_query(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        with record_queries() as stats:
+            loader(User).expect(1, 2, 999)
+            assert loader(User).load(1).name == "Donald Duck"
+            assert loader(User).load(2).name == "Tin Tin"
+            assert loader(User).load(999) is None
+            assert [u.id for u in loader(User).load_many([2, 1])] == [2, 1]
+        assert stats.statement_count == 1
+        assert loader(User) is loader(User)
+        assert loader(User, key='email').load('tintin@cn.com').id == 2
+
+
+def test_loaders_are_request_scoped(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        first = loader(User)
+    with todolist_with_users_tasks.test_request_context():
+        assert loader(User) is not first
+
+
+def test_foreign_keys_of_input_rows_are_expected(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        expect_related_keys(Task, [
+            {"title": "Fly", "user_id": 1}, {"title": "Sail", "user_id": 2},
+            {"title": "Nap"}])
+        with record_queries() as stats:
+            users = [loader(User).load(uid) for uid in [1, 2, 1]]
+        assert [u.id for u in users] == [1, 2, 1]
+        assert stats.statement_count == 1
+
+
+def test_rows_created_in_a_batch_are_found_by_later_rows(
+        todolist_with_users_tasks):
+    app = todolist_with_users_tasks
+    seen = []
+
+    def note_first_user(data=None, existing_instance=None, extra_params=None):
+        first = loader(User, key='email').load('one@batch.com')
+        seen.append((data['email'], first.name if first else None))
+
+    view = construct_batch_save_view_function(
+        User, User.input_data_schema(),
+        pre_processors_for_post=[note_first_user])
+    with app.test_request_context(
+            '/users', method='POST', json=[
+                {"name": "Batch One", "email": "one@batch.com",
+                 "gender": "male"},
+                {"name": "Batch Two", "email": "two@batch.com",
+                 "gender": "male"}]):
+        result = json.loads(view().get_data(as_text=True))
+    assert [row['result']['email'] for row in result['result']] == [
+        'one@batch.com', 'two@batch.com']
+    assert seen == [('one@batch.com', None), ('two@batch.com', 'Batch One')]
@@ -0,0 +1,74 @@
+import pytest
+
+from flask_sqlalchemy_booster.instrumentation import record_queries
+from flask_sqlalchemy_booster.responses import (
+    polymorphic_query_for_request, process_args_and_fetch_rows)
+from .todo_list_api.app import db
+
+
+class Vehicle(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20))
+    name = db.Column(db.String(50))
+    __mapper_args__ = {'polymorphic_on': kind, 'polymorphic_identity': 'vehicle'}
+
+
+class Car(Vehicle):
+    id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), primary_key=True)
+    wheels = db.Column(db.Integer)
+    __mapper_args__ = {'polymorphic_identity': 'car'}
+
+
+class Boat(Vehicle):
+    id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), primary_key=True)
+    draft = db.Column(db.Float)
+    __mapper_args__ = {'polymorphic_identity': 'boat'}
+
+
+@pytest.fixture
+def vehicles(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        for vehicle in Vehicle.query.all():
+            db.session.delete(vehicle)
+        db.session.commit()
+        Car.create(name="Herbie", wheels=4)
+        Boat.create(name="Nautilus", draft=7.5)
+    return todolist_with_users_tasks
+
+
+def _joined_tables(app, url):
+    with app.test_request_context(url):
+        sql = str(polymorphic_query_for_request(Vehicle))
+    return [t for t in ('car', 'boat') if 'JOIN %s' % t in sql]
+
+
+def test_only_filtered_subclass_tables_are_joined(todolist_with_users_tasks):
+    app = todolist_with_users_tasks
+    assert _joined_tables(app, '/vehicles?name=Herbie') == []
+    assert _joined_tables(app, '/vehicles?wheels>=4') == ['car']
+    assert _joined_tables(
+        app, '/vehicles?_f={"f":[{"k":"draft","op":"<","v":2}]}') == ['boat']
+    assert _joined_tables(app, '/vehicles?attrs=id,draft') == ['boat']
+
+
+def test_discriminator_filter_limits_subclasses(vehicles):
+    with vehicles.test_request_context('/vehicles?kind=car'):
+        with record_queries() as stats:
+            rows = process_args_and_fetch_rows(Vehicle)
+            assert [(v.name, v.wheels) for v in rows] == [("Herbie", 4)]
+        assert not any('boat' in s['statement'] for s in stats.statements)
+
+
+def test_unrequested_subclass_columns_load_in_batches(vehicles):
+    with vehicles.test_request_context('/vehicles'):
+        db.session.expunge_all()
+        with record_queries() as stats:
+            rows = process_args_and_fetch_rows(Vehicle)
+            assert sorted(v.kind for v in rows) == ['boat', 'car']
+            [getattr(v, 'wheels', None) or getattr(v, 'draft', None) for v in rows]
+        assert stats.statement_count == 3
+
+
+def test_subclass_column_filter(vehicles):
+    with vehicles.test_request_context('/vehicles?wheels>=3'):
+        assert [v.name for v in process_args_and_fetch_rows(Vehicle)] == ["Herbie"]
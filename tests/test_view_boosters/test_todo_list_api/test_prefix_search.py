@@ -0,0 +1,84 @@
+import pytest
+
+from flask_sqlalchemy_booster.instrumentation import record_queries
+from flask_sqlalchemy_booster.prefix_search import prefix_upper_bound
+from flask_sqlalchemy_booster.responses import filter_query_with_key
+from flask_sqlalchemy_booster.trigram_search import (
+    rebuild_trigram_index, trigram_table, trigrams)
+from .todo_list_api.app import Task, db
+
+
+class Song(db.Model):
+    _prefix_searchable_ = ['name']
+    _trigram_searchable_ = ['name']
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100))
+
+
+@pytest.fixture
+def songs(seeded_tables):
+    return seeded_tables(
+        (Song, [{"name": name} for name in [
+            "Joy Ride", "jolene", "Journey Home", "Banjo",
+            "Enjoy the silence", "50% off"]]),
+        extra_tables=[trigram_table(Song)])
+
+
+def _names(query):
+    return sorted(s.name for s in query.all())
+
+
+def test_prefix_upper_bound_and_trigrams():
+    assert prefix_upper_bound('jo') == 'jp'
+    assert sorted(trigrams('Banjo')) == ['anj', 'ban', 'njo']
+
+
+def test_prefix_operator_uses_lower_index(songs):
+    with songs.test_request_context():
+        query = filter_query_with_key(Song.query, 'name', 'Jo', '^')
+        assert _names(query) == ["Journey Home", "Joy Ride", "jolene"]
+        assert _names(filter_query_with_key(
+            Song.query, 'name', '50%', '^')) == ["50% off"]
+        sql = query.statement.compile(
+            dialect=db.engine.dialect,
+            compile_kwargs={"literal_binds": True})
+        plan = " ".join(str(row) for row in db.session.execute(
+            "EXPLAIN QUERY PLAN %s" % sql))
+        assert "ix_song_name_lower" in plan
+
+
+def test_prefix_operator_in_query_string(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        Task.create(title="Prefix Match", user_id=1)
+        Task.create(title="prefixed too", user_id=2)
+    with todolist_with_users_tasks.test_client() as client:
+        resp = client.jget('/tasks?title^=PREFIX')
+        assert sorted(t['title'] for t in resp['result']) == [
+            "Prefix Match", "prefixed too"]
+        resp = client.jget(
+            '/tasks?_f={"f":[{"k":"title","op":"^","v":"prefix m"}]}')
+        assert [t['title'] for t in resp['result']] == ["Prefix Match"]
+
+
+def test_substring_filter_narrows_with_trigrams(songs):
+    with songs.test_request_context():
+        with record_queries() as stats:
+            names = _names(filter_query_with_key(Song.query, 'name', 'NJO', '~'))
+        assert names == ["Banjo", "Enjoy the silence"]
+        assert "song_trigrams" in stats.statements[0]["statement"]
+        assert _names(filter_query_with_key(
+            Song.query, 'name', 'jo', '~')) == [
+            "Banjo", "Enjoy the silence", "Journey Home", "Joy Ride", "jolene"]
+
+        song = Song.query.filter(Song.name == "Banjo").one()
+        song.update(name="Banjolele")
+        assert _names(filter_query_with_key(
+            Song.query, 'name', 'lele', '~')) == ["Banjolele"]
+        song.update(name="Banjo")
+
+        db.session.execute(trigram_table(Song).delete())
+        assert _names(filter_query_with_key(
+            Song.query, 'name', 'enjoy', '~')) == []
+        rebuild_trigram_index(Song, db.session)
+        assert _names(filter_query_with_key(
+            Song.query, 'name', 'enjoy', '~')) == ["Enjoy the silence"]
@@ -0,0 +1,34 @@
+from flask_sqlalchemy_booster.instrumentation import record_queries
+from .todo_list_api.app import db, Task, User
+
+
+def test_cached_query_is_served_without_sql(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        query = Task.query.filter(Task.user_id == 2).cached(ttl=60)
+        first = query.all()
+        db.session.remove()
+        with record_queries() as stats:
+            second = Task.query.filter(Task.user_id == 2).cached(ttl=60).all()
+        assert stats.statement_count == 0
+        assert [t.title for t in second] == [t.title for t in first]
+        assert second[0] in db.session
+
+
+def test_cached_query_invalidated_by_writes(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        count = len(Task.query.filter(Task.user_id == 2).cached().all())
+        users = User.query.cached().all()
+        Task.create(title="Find Snowy", user_id=2)
+        assert len(Task.query.filter(Task.user_id == 2).cached().all()) == count + 1
+        with record_queries() as stats:
+            assert len(User.query.cached().all()) == len(users)
+        assert stats.statement_count == 0
+
+
+def test_cached_count_and_explicit_key(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        total = Task.query.cached(key='all-tasks').count()
+        with record_queries() as stats:
+            assert Task.query.cached(key='all-tasks').count() == total
+        assert stats.statement_count == 0
+        assert len(Task.query.cached(key='all-tasks').all()) == total
@@ -0,0 +1,172 @@
+from datetime import datetime, timedelta
+import json
+
+from flask_sqlalchemy_booster.aggregations import (
+    process_args_and_render_aggregates)
+from flask_sqlalchemy_booster.instrumentation import record_queries
+from flask_sqlalchemy_booster.rollups import backfill_rollup, get_rollup
+from flask_sqlalchemy_booster.timeseries import (
+    process_args_and_render_timeseries)
+from .todo_list_api.app import db
+
+
+class PageVisit(db.Model):
+    _rollups_ = {
+        'per_page_hour': {
+            'group': ['page'], 'time_col': 'visited_on', 'bucket': 'hour',
+            'aggs': ['count', 'sum:duration']}
+    }
+    id = db.Column(db.Integer, primary_key=True)
+    page = db.Column(db.String(50))
+    visited_on = db.Column(db.DateTime)
+    duration = db.Column(db.Integer)
+
+
+class Visit(db.Model):
+    _rollups_ = {
+        'per_page': {'group': ['page'], 'aggs': ['count']}
+    }
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20))
+    page = db.Column(db.String(50))
+    __mapper_args__ = {'polymorphic_on': kind, 'polymorphic_identity': 'visit'}
+
+
+class BotVisit(Visit):
+    __mapper_args__ = {'polymorphic_identity': 'bot'}
+
+
+def _clear_visits():
+    # Bulk deletes bypass the flush, and hence the rollups
+    PageVisit.query.delete()
+    db.session.execute(get_rollup(PageVisit, 'per_page_hour').table.delete())
+    db.session.commit()
+
+
+def _rollup_rows():
+    t = get_rollup(PageVisit, 'per_page_hour').table
+    return sorted(
+        (row.page, row.bucket, row.count, row.sum_duration)
+        for row in db.session.execute(t.select()))
+
+
+def _render(app, render, url):
+    with app.test_request_context(url):
+        with record_queries() as stats:
+            resp = render(PageVisit)
+        sql = " ".join(s["statement"] for s in stats.statements)
+        return json.loads(resp.get_data(as_text=True))["result"], sql
+
+
+def test_rollup_follows_inserts_updates_and_deletes(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        _clear_visits()
+        home = PageVisit.create(
+            page="home", visited_on=datetime(2021, 5, 1, 10, 15), duration=3)
+        PageVisit.create(
+            page="home", visited_on=datetime(2021, 5, 1, 10, 45), duration=4)
+        about = PageVisit.create(
+            page="about", visited_on=datetime(2021, 5, 1, 11, 5), duration=1)
+        assert _rollup_rows() == [
+            ("about", datetime(2021, 5, 1, 11), 1, 1),
+            ("home", datetime(2021, 5, 1, 10), 2, 7)]
+
+        db.session.expire_all()
+        home.update(page="about", visited_on=datetime(2021, 5, 1, 11, 30))
+        about.delete()
+        assert _rollup_rows() == [
+            ("about", datetime(2021, 5, 1, 11), 1, 3),
+            ("home", datetime(2021, 5, 1, 10), 1, 4)]
+
+
+def test_backfill_rebuilds_rollup_in_pk_buckets(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        _clear_visits()
+        for minute in range(0, 50, 10):
+            PageVisit.create(
+                page="docs", visited_on=datetime(2021, 6, 2, 9, minute),
+                duration=minute)
+        expected = _rollup_rows()
+        t = get_rollup(PageVisit, 'per_page_hour').table
+        db.session.execute(t.delete())
+        db.session.commit()
+        backfill_rollup(PageVisit, 'per_page_hour', db.session, bucket_size=2)
+        assert _rollup_rows() == expected == [
+            ("docs", datetime(2021, 6, 2, 9), 5, 100)]
+
+
+def test_matching_aggregates_read_rollup(todolist_with_users_tasks):
+    app = todolist_with_users_tasks
+    with app.test_request_context():
+        _clear_visits()
+        for page, hour, duration in [("home", 1, 2), ("home", 2, 3),
+                                     ("blog", 1, 5), ("blog", 30, 1)]:
+            PageVisit.create(
+                page=page, duration=duration,
+                visited_on=datetime(2021, 7, 1) + timedelta(hours=hour))
+
+    result, sql = _render(
+        app, process_args_and_render_aggregates,
+        '/?group=page&agg=count,sum:duration&page:in=home,blog')
+    assert result == [
+        {"page": "blog", "count": 2, "sum_duration": 6},
+        {"page": "home", "count": 2, "sum_duration": 5}]
+    assert "page_visit_rollup_per_page_hour" in sql
+    assert "FROM page_visit " not in sql
+
+    result, sql = _render(
+        app, process_args_and_render_timeseries,
+        '/?col=visited_on&bucket=day&agg=count,sum:duration')
+    assert [(b["bucket"], b["count"], b["sum_duration"]) for b in result] == [
+        ("2021-07-01T00:00:00+00:00", 3, 10),
+        ("2021-07-02T00:00:00+00:00", 1, 1)]
+    assert "page_visit_rollup_per_page_hour" in sql
+
+    result, sql = _render(
+        app, process_args_and_render_aggregates,
+        '/?group=page&agg=max:duration')
+    assert "page_visit_rollup_per_page_hour" not in sql
+    assert result == [
+        {"page": "blog", "max_duration": 5},
+        {"page": "home", "max_duration": 3}]
+
+
+def test_concurrently_inserted_rollup_row_is_added_to(todolist_with_users_tasks):
+    rollup = get_rollup(PageVisit, 'per_page_hour')
+    key = ("pricing", datetime(2021, 7, 1, 9))
+    with todolist_with_users_tasks.test_request_context():
+        _clear_visits()
+        connection = db.session.connection()
+        # As if another transaction inserted the row after our UPDATE missed
+        connection.execute(rollup.table.insert().values(
+            page="pricing", bucket=key[1], count=1, sum_duration=2))
+        rollup._insert_or_add(connection, key, [2, 5])
+        assert _rollup_rows() == [("pricing", key[1], 3, 7)]
+        _clear_visits()
+
+
+def test_subclass_rows_are_counted_in_base_rollup(todolist_with_users_tasks):
+    app = todolist_with_users_tasks
+    with app.test_request_context():
+        Visit.query.delete()
+        db.session.execute(get_rollup(Visit, 'per_page').table.delete())
+        db.session.commit()
+        Visit.create(page="home")
+        bot_visit = BotVisit.create(page="home")
+        BotVisit.create(page="blog")
+        db.session.expire_all()
+        bot_visit.update(page="blog")
+
+    with app.test_request_context('/?group=page&agg=count'):
+        with record_queries() as stats:
+            resp = process_args_and_render_aggregates(Visit)
+        assert "visit_rollup_per_page" in stats.statements[0]["statement"]
+    assert json.loads(resp.get_data(as_text=True))["result"] == [
+        {"page": "blog", "count": 2}, {"page": "home", "count": 1}]
+
+    with app.test_request_context('/?group=page&agg=count'):
+        with record_queries() as stats:
+            resp = process_args_and_render_aggregates(BotVisit)
+        assert "visit_rollup_per_page" not in stats.statements[0]["statement"]
+    assert json.loads(resp.get_data(as_text=True))["result"] == [
+        {"page": "blog", "count": 2}]
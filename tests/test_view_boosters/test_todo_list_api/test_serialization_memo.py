@@ -0,0 +1,56 @@
+from flask_sqlalchemy_booster.responses import serializable_list
+from flask_sqlalchemy_booster.model_booster.dictizable_mixin import (
+    serialization_memo)
+from .todo_list_api.app import User, Task
+
+
+def test_shared_user_is_serialized_once_per_response(
+        todolist_with_users_tasks, monkeypatch):
+    calls = []
+    todict_using_struct = User.todict_using_struct
+
+    def counting_todict_using_struct(self, *args, **kwargs):
+        calls.append(self.id)
+        return todict_using_struct(self, *args, **kwargs)
+
+    monkeypatch.setattr(
+        User, 'todict_using_struct', counting_todict_using_struct)
+    with todolist_with_users_tasks.test_client() as client:
+        client.jpost('/tasks', {"title": "Run", "user_id": 2})
+        client.jpost('/tasks', {"title": "Read", "user_id": 2})
+        resp = client.jget(
+            '/tasks?user_id=2'
+            '&_ds={"attrs":["id"],"rels":{"user":{"attrs":["id","name"]}}}')
+        assert len(resp['result']) >= 2
+        assert all(t['user'] == {'id': 2, 'name': 'Tin Tin'}
+                   for t in resp['result'])
+        assert calls == [2]
+
+
+def test_post_processors_get_their_own_copy_of_memoized_dicts(
+        todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        tasks = Task.query.filter(Task.user_id == 2).all()
+        assert len(tasks) >= 2
+
+        def tag_user(d, task):
+            d['user']['task_id'] = task.id
+            return d
+
+        result = serializable_list(
+            tasks, dict_struct={"attrs": ["id"], "rels": {"user": {"attrs": ["id"]}}},
+            dict_post_processors=[tag_user])
+        assert [d['user']['task_id'] for d in result] == [t.id for t in tasks]
+
+
+def test_rows_with_post_processors_bypass_the_memo(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        tasks = Task.query.filter(Task.user_id == 2).all()
+        dict_struct = {"attrs": ["id"], "rels": {"user": {"attrs": ["id"]}}}
+        with serialization_memo() as memo:
+            serializable_list(
+                tasks, dict_struct=dict_struct,
+                dict_post_processors=[lambda d, task: d])
+            assert memo._dicts == {}
+            serializable_list(tasks, dict_struct=dict_struct)
+            assert len(memo._dicts) == 1
@@ -0,0 +1,65 @@
+from flask import Flask
+
+from flask_sqlalchemy_booster.serialization_profiler import (
+    current_serialization_profiler, format_serialization_profile,
+    init_serialization_profiler, profile_serialization,
+    serialization_profile)
+from .todo_list_api.app import Task, db
+
+
+def _shout(result, task):
+    result['title'] = result['title'].upper()
+    return result
+
+
+def test_profile_attributes_time_and_queries_to_fields(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context('/tasks'):
+        task_ids = [t.id for t in Task.query.limit(2).all()]
+        db.session.expire_all()
+        tasks = Task.query.filter(Task.id.in_(task_ids)).all()
+        dict_struct = {
+            'attrs': ['id', 'title', 'user_email'],
+            'rels': {'user': {'attrs': ['first_name']}}}
+        with profile_serialization() as profile:
+            dicts = [
+                t.todict_using_struct(dict_struct, [_shout]) for t in tasks]
+        assert dicts[0]['title'] == dicts[0]['title'].upper()
+
+        rows = dict(
+            ((r['model'], r['kind'], r['field']), r) for r in profile.rows())
+        assert rows[('Task', 'attr', 'id')]['calls'] == 2
+        assert rows[('Task', 'attr', 'id')]['statements'] == 0
+        assert rows[('Task', 'post_processor', '_shout')]['calls'] == 2
+        assert rows[('User', 'attr', 'first_name')]['calls'] == 2
+        # Loading the users is done by whichever field needs them first
+        assert rows[('Task', 'attr', 'user_email')]['statements'] > 0
+        assert rows[('Task', 'rel', 'user')]['statements'] == 0
+        assert set(r['endpoint'] for r in profile.rows()) == set([
+            todolist_with_users_tasks.url_map.bind('').match('/tasks')[0]])
+
+        table = format_serialization_profile(profile)
+        assert table.splitlines()[0].split()[:4] == [
+            'endpoint', 'model', 'kind', 'field']
+        assert '_shout' in table and 'first_name' in table
+        assert len(format_serialization_profile(
+            profile, limit=2).splitlines()) == 3
+
+
+def test_profiling_every_request():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_BOOSTER_PROFILE_SERIALIZATION'] = True
+    init_serialization_profiler(app)
+
+    @app.route('/things')
+    def list_things():
+        with current_serialization_profiler().measure(Task(), 'attr', 'title'):
+            pass
+        return 'ok'
+
+    client = app.test_client()
+    client.get('/things')
+    client.get('/things')
+    [row] = serialization_profile(app).rows()
+    assert (row['endpoint'], row['model'], row['calls']) == (
+        'list_things', 'Task', 2)
+    assert current_serialization_profiler() is None
@@ -0,0 +1,20 @@
+def test_sideloaded_layout_includes_each_user_once(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_client() as client:
+        client.jpost('/tasks', {"title": "Dive", "user_id": 1})
+        resp = client.jget('/tasks?_layout=sideloaded&expand=user&user_id=1')
+        assert resp['status'] == 'success'
+        assert len(resp['result']) >= 2
+        assert all(t['user'] == {'type': 'User', 'id': 1} for t in resp['result'])
+        assert list(resp['included']['User'].keys()) == ['1']
+        assert resp['included']['User']['1']['name'] == 'Donald Duck'
+
+
+def test_sideloaded_layout_with_dict_struct_and_pages(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_client() as client:
+        resp = client.jget(
+            '/tasks?_layout=sideloaded&page=1&per_page=5'
+            '&_ds={"attrs":["id"],"rels":{"user":{"attrs":["email"]}}}')
+        assert resp['page'] == 1
+        assert set(resp['result'][0].keys()) == {'id', 'user'}
+        users = resp['included']['User']
+        assert all(set(u.keys()) == {'email'} for u in users.values())
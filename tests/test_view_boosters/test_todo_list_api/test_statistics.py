@@ -0,0 +1,83 @@
+import pytest
+
+from flask_sqlalchemy_booster import statistics
+from flask_sqlalchemy_booster.instrumentation import record_queries
+from flask_sqlalchemy_booster.statistics import parse_stat_specs
+from .todo_list_api.app import Task
+
+
+def test_parse_stat_specs():
+    assert parse_stat_specs('p95,hist:20,mean') == [
+        ('p95', 95.0), ('hist', 20), ('mean', None)]
+    with pytest.raises(ValueError):
+        parse_stat_specs('p101')
+
+
+def test_stats_over_filtered_rows(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_client() as client:
+        ids = sorted(t['id'] for t in client.jget('/tasks?user_id=1')['result'])
+        resp = client.jget(
+            '/tasks/_stats?col=id&fn=count,p50,hist:2,min,max&user_id=1')
+        assert resp['status'] == 'success'
+        stats = resp['result']
+        assert stats['col'] == 'id'
+        assert stats['count'] == len(ids)
+        assert (stats['min'], stats['max']) == (ids[0], ids[-1])
+        assert sum(stats['hist']['counts']) == len(ids)
+        assert len(stats['hist']['edges']) == 3
+        assert client.jget('/tasks/_stats?fn=p50')['status'] == 'failure'
+
+
+def test_sql_only_stats_run_in_database(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context(
+            '/tasks/_stats?col=id&fn=count,mean'):
+        with record_queries() as stats:
+            statistics.process_args_and_render_stats(Task)
+        assert stats.statement_count == 1
+        assert 'avg(' in stats.statements[0]['statement'].lower()
+
+
+def test_mixed_stats_split_between_database_and_stream(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context(
+            '/tasks/_stats?col=id&fn=count,mean,p50'):
+        with record_queries() as stats:
+            statistics.process_args_and_render_stats(Task)
+        statements = [s['statement'].lower() for s in stats.statements]
+        # The aggregates, then the two values around the median
+        assert len(statements) == 2
+        assert 'avg(' in statements[0] and 'count(' in statements[0]
+        assert 'limit' in statements[1]
+
+
+def _reference_stats(values):
+    values = sorted(values)
+    n = len(values)
+    mean = sum(values) / n
+    position = (n - 1) * 0.5
+    lower = int(position)
+    upper = min(lower + 1, n - 1)
+    return {
+        'count': n, 'mean': mean, 'min': values[0], 'max': values[-1],
+        'std': (sum((v - mean) ** 2 for v in values) / n) ** 0.5,
+        'p50': values[lower] + (values[upper] - values[lower]) * (
+            position - lower)}
+
+
+def test_streamed_stats_with_and_without_numpy(todolist_with_users_tasks, monkeypatch):
+    pytest.importorskip('numpy')
+    specs = parse_stat_specs('count,mean,min,max,std,p50,hist:3')
+    with todolist_with_users_tasks.test_request_context():
+        ids = [float(t.id) for t in Task.query.all()]
+        with_numpy = statistics.column_stats(
+            Task.query, Task.id, specs, chunk_size=1)
+        monkeypatch.setattr(statistics, 'numpy', None)
+        without_numpy = statistics.column_stats(
+            Task.query, Task.id, specs, chunk_size=1)
+    expected = _reference_stats(ids)
+    for name in expected:
+        assert with_numpy[name] == pytest.approx(expected[name])
+        assert without_numpy[name] == pytest.approx(expected[name])
+    assert with_numpy['hist']['counts'] == without_numpy['hist']['counts']
+    assert sum(with_numpy['hist']['counts']) == len(ids)
+    assert with_numpy['hist']['edges'] == pytest.approx(
+        without_numpy['hist']['edges'])
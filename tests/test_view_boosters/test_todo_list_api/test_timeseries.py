@@ -0,0 +1,68 @@
+from datetime import datetime
+
+from flask_sqlalchemy_booster.utils import (
+    parse_tz_offset, bucket_starts, time_bucket)
+from .todo_list_api.app import Task, db
+
+
+def test_tz_offsets_and_bucket_starts():
+    assert parse_tz_offset('+05:30') == 330
+    assert parse_tz_offset(' 05:30') == 330
+    assert parse_tz_offset('-0800') == -480
+    assert list(bucket_starts(
+        datetime(2020, 11, 15, 3), datetime(2020, 11, 30), 'week')) == [
+        datetime(2020, 11, 9), datetime(2020, 11, 16),
+        datetime(2020, 11, 23), datetime(2020, 11, 30)]
+
+
+def test_sqlite_week_bucket_starts_on_monday(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        for day, monday in [(15, '2020-11-09'), (16, '2020-11-16'),
+                            (21, '2020-11-16')]:
+            bucket = db.session.query(time_bucket(
+                db.literal(datetime(2020, 11, day, 12)), 'week',
+                dialect_name='sqlite')).scalar()
+            assert bucket == monday + ' 00:00:00'
+
+
+def test_timeseries_buckets_in_requested_tz(todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        for created_on in [datetime(2021, 3, 1, 20, 0),
+                           datetime(2021, 3, 1, 17, 0),
+                           datetime(2021, 3, 3, 10, 0)]:
+            Task.create(title="Chart", user_id=2, created_on=created_on)
+    with todolist_with_users_tasks.test_client() as client:
+        resp = client.jget(
+            '/tasks/_timeseries?col=created_on&bucket=day&tz=%2B05:30'
+            '&title=Chart&agg=count,max:id')
+        assert resp['status'] == 'success'
+        assert [(b['bucket'], b['count']) for b in resp['result']] == [
+            ('2021-03-01T00:00:00+05:30', 1),
+            ('2021-03-02T00:00:00+05:30', 1),
+            ('2021-03-03T00:00:00+05:30', 1)]
+        utc = client.jget(
+            '/tasks/_timeseries?col=created_on&bucket=day&title=Chart')
+        assert [(b['bucket'], b['count']) for b in utc['result']] == [
+            ('2021-03-01T00:00:00+00:00', 2),
+            ('2021-03-02T00:00:00+00:00', 0),
+            ('2021-03-03T00:00:00+00:00', 1)]
+        assert utc['result'][1].keys() == {'bucket', 'count'}
+
+
+def test_timeseries_fills_empty_buckets_with_zero_counts(
+        todolist_with_users_tasks):
+    with todolist_with_users_tasks.test_request_context():
+        for created_on in [datetime(2021, 4, 1, 9, 0),
+                           datetime(2021, 4, 3, 9, 0)]:
+            Task.create(title="Gap", user_id=2, created_on=created_on)
+    with todolist_with_users_tasks.test_client() as client:
+        resp = client.jget(
+            '/tasks/_timeseries?col=created_on&bucket=day&title=Gap'
+            '&agg=count,count:id,count_distinct:user_id,max:id')
+        assert resp['status'] == 'success'
+        empty = resp['result'][1]
+        assert empty['bucket'] == '2021-04-02T00:00:00+00:00'
+        assert empty['count'] == 0
+        assert empty['count_id'] == 0
+        assert empty['count_distinct_user_id'] == 0
+        assert empty['max_id'] is None
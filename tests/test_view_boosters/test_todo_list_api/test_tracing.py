@@ -0,0 +1,68 @@
+import json
+
+from flask_sqlalchemy_booster import FlaskBooster
+from flask_sqlalchemy_booster.responses import (
+    convert_result_to_response, json_dump, json_response,
+    process_args_and_fetch_rows)
+from flask_sqlalchemy_booster.tracing import (
+    FileSpanExporter, InMemorySpanExporter, init_tracing, span, trace)
+from .todo_list_api.app import Task
+
+
+def test_stages_of_a_list_rendering_are_spans(todolist_with_users_tasks):
+    exporter = InMemorySpanExporter()
+    with todolist_with_users_tasks.test_request_context('/tasks?expand=user'):
+        with trace(exporter, 'render') as root:
+            rows = process_args_and_fetch_rows(Task)
+            convert_result_to_response(rows)
+    spans = dict((s.name, s) for s in exporter.finished_spans())
+    assert [s.name for s in exporter.finished_spans()] == [
+        'filter', 'query', 'serialize', 'encode', 'response', 'render']
+    assert spans['query'].attributes['model'] == 'Task'
+    assert spans['query'].attributes['row_count'] == len(rows)
+    assert spans['query'].attributes['statement_count'] == 1
+    assert spans['serialize'].attributes['row_count'] == len(rows)
+    assert spans['serialize'].attributes['model'] == 'Task'
+    assert spans['encode'].attributes['statement_count'] == 0
+    assert all(
+        s.parent_id == root.span_id and s.trace_id == root.trace_id
+        for s in exporter.finished_spans() if s is not root)
+    assert root.attributes['statement_count'] >= 1
+    assert all(s.attributes.get('endpoint') for s in exporter.finished_spans())
+
+
+def test_span_outside_a_trace_is_a_noop():
+    with span('query') as opened_span:
+        assert opened_span is None
+
+
+def test_every_request_is_traced(tmpdir):
+    exporter = InMemorySpanExporter()
+    app = FlaskBooster(__name__)
+    app.config['SQLALCHEMY_BOOSTER_TRACE_EXPORTER'] = exporter
+    init_tracing(app)
+
+    @app.route('/things')
+    def list_things():
+        with span('query', model='Thing') as query_span:
+            query_span.set_attribute('row_count', 1)
+        return json_response(json_dump({'things': [1]}))
+
+    app.test_client().get('/things?name=x')
+    names = [s.name for s in exporter.finished_spans()]
+    assert names == [
+        'sanitize', 'sanitize', 'sanitize', 'query', 'encode', 'response',
+        'request']
+    [root] = exporter.finished_spans('request')
+    assert root.attributes['endpoint'] == 'list_things'
+    assert root.attributes['http.status_code'] == 200
+    assert [s.attributes['input'] for s in exporter.finished_spans(
+        'sanitize')] == ['json', 'args', 'form']
+
+    path = str(tmpdir.join('spans.jsonl'))
+    FileSpanExporter(path).export(exporter.finished_spans())
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert [line['name'] for line in lines] == names
+    assert lines[-1]['attributes']['http.status_code'] == 200
+    assert lines[0]['parent_id'] == lines[-1]['span_id']